@@ -1,10 +1,36 @@
 """
 Bank application for SecurePay System
 Transaction verification and monitoring system
+
+Attributes are imported lazily (PEP 562) so that service processes using
+TransactionManager never pull in Tkinter through BankMonitorGUI.
 """
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'TransactionManager': '.transaction_manager',
+    'CardVerifier': '.card_verifier',
+    'CardTable': '.card_table',
+    'BankService': '.bank_service',
+    'HistoryStore': '.history_store',
+    'IdempotencyCache': '.idempotency',
+    'FairQueue': '.scheduler',
+    'SettlementJob': '.settlement',
+    'Rollups': '.rollups',
+    'BankReplica': '.replica',
+    'BankMonitorGUI': '.bank_gui',
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value  # Later lookups skip __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from .transaction_manager import TransactionManager
-from .card_verifier import CardVerifier
-from .bank_gui import BankMonitorGUI
 
-__all__ = ['TransactionManager', 'CardVerifier', 'BankMonitorGUI']
\ No newline at end of file
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,4 +1,5 @@
 import tkinter as tk
+import argparse
 import sys
 import os
 
@@ -6,9 +7,23 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Now import the modules
+from shared.config import Config
+from shared.tracing import tracer
+from shared.metrics import metrics, MetricsExporter
+from bank.bank_service import BankService
 from bank.bank_gui import BankMonitorGUI
 
 def main():
+    parser = argparse.ArgumentParser(description="SecurePay bank monitor")
+    parser.add_argument("--workers", type=int, default=Config.BANK_WORKERS,
+                        help="number of transaction worker threads")
+    parser.add_argument("--metrics-port", type=int, default=Config.BANK_METRICS_PORT,
+                        help="port of the local metrics exporter (0 disables it)")
+    args = parser.parse_args()
+    
+    tracer.configure("bank", enabled=Config.TRACE_ENABLED,
+                     sample_rate=Config.TRACE_SAMPLE_RATE, trace_dir=Config.TRACE_DIR)
+    
     # Create necessary directories
     os.makedirs("bank/data", exist_ok=True)
     os.makedirs("shared", exist_ok=True)
@@ -16,9 +31,20 @@ def main():
     print("🏦 Starting SecurePay Bank System...")
     print("📁 Working directory:", os.getcwd())
     
+    exporter = None
+    if args.metrics_port:
+        exporter = MetricsExporter(metrics, port=args.metrics_port)
+        exporter.start()
+    
+    service = BankService(workers=args.workers)
     root = tk.Tk()
-    app = BankMonitorGUI(root)
-    root.mainloop()
+    app = BankMonitorGUI(root, service=service)
+    try:
+        root.mainloop()
+    finally:
+        service.stop()
+        if exporter:
+            exporter.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
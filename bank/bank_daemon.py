@@ -0,0 +1,71 @@
+import argparse
+import sys
+import os
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.config import Config
+from shared.tracing import tracer
+from shared.profiler import profiler
+from shared.metrics import metrics, MetricsExporter
+from communication.routing import configure_instance
+from bank.bank_service import BankService
+from bank.primary_lease import LeaseHeldError
+
+def main():
+    parser = argparse.ArgumentParser(description="SecurePay headless bank daemon")
+    parser.add_argument("--workers", type=int, default=Config.BANK_WORKERS,
+                        help="number of transaction worker threads")
+    parser.add_argument("--metrics-port", type=int, default=Config.BANK_METRICS_PORT,
+                        help="port of the local metrics exporter (0 disables it)")
+    parser.add_argument("--instance",
+                        help="run as this bank instance of the routing table (own bus and card partition)")
+    parser.add_argument("--ledger", action="store_true", default=Config.LEDGER_ENABLED,
+                        help="write the replication ledger for a hot-standby follower (bank_replica.py)")
+    parser.add_argument("--bus", choices=["file", "shm"], default=Config.BUS_TRANSPORT,
+                        help="transport to the vendor on this host: queue files or shared-memory rings")
+    parser.add_argument("--fraud-seed", type=int, default=Config.FRAUD_SEED,
+                        help="seed the simulated fraud draws per transaction (deterministic replays)")
+    parser.add_argument("--trace", action="store_true", default=Config.TRACE_ENABLED,
+                        help="write per-stage span traces to the traces/ directory")
+    parser.add_argument("--trace-sample", type=float, default=Config.TRACE_SAMPLE_RATE,
+                        help="fraction of transactions to trace (0.0-1.0)")
+    args = parser.parse_args()
+    if args.instance:
+        configure_instance(args.instance)
+    Config.LEDGER_ENABLED = args.ledger
+    Config.BUS_TRANSPORT = args.bus
+    Config.FRAUD_SEED = args.fraud_seed
+
+    tracer.configure("bank", enabled=args.trace, sample_rate=args.trace_sample,
+                     trace_dir=Config.TRACE_DIR)
+    profiler.configure("bank")
+
+    # Create necessary directories
+    os.makedirs("bank/data", exist_ok=True)
+    os.makedirs("shared", exist_ok=True)
+
+    print("🏦 Starting SecurePay Bank daemon (headless)...")
+    print("📁 Working directory:", os.getcwd())
+    if args.instance:
+        print(f"🧭 Bank instance {args.instance}: bus {Config.COMM_DIR}, data {Config.BANK_DATA_DIR}")
+
+    exporter = None
+    if args.metrics_port:
+        exporter = MetricsExporter(metrics, port=args.metrics_port)
+        exporter.start()
+
+    service = BankService(workers=args.workers)
+    service.add_observer(lambda event, data: print(data) if event == 'log' else None)
+    try:
+        service.run_forever()
+    except LeaseHeldError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        if exporter:
+            exporter.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
+from collections import deque
+from datetime import datetime, timedelta
+import queue
 import threading
 import time
 import sys
@@ -8,7 +11,11 @@ import os
 # Add the parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from bank.transaction_manager import TransactionManager
+from shared.config import Config
+from shared.metrics import metrics
+from bank.bank_service import BankService
+from bank.primary_lease import LeaseHeldError
+from bank.history_store import HistoryStore
 
 class ModernButton(tk.Canvas):
     def __init__(self, parent, text, command, bg_color='#00d9ff', width=200, height=50):
@@ -84,16 +91,246 @@ class ModernButton(tk.Canvas):
             self.command()
 
 
+class GuiUpdateQueue:
+    """
+    Collects GUI events from worker threads and hands them to the Tk thread
+    in one batch per frame. Buffers are bounded ring buffers, so a burst of
+    transactions costs at most one frame's worth of widget work.
+    """
+    
+    def __init__(self, root, flush_callback, interval_ms=33, max_log_lines=500, max_rows=15):
+        self.root = root
+        self.flush_callback = flush_callback
+        self.interval_ms = interval_ms
+        
+        # deque.append/popleft are thread-safe, no extra locking needed
+        self.log_lines = deque(maxlen=max_log_lines)
+        self.transactions = deque(maxlen=max_rows)
+        self.dropped_log_lines = 0
+        self._running = False
+    
+    def put_log(self, line):
+        if len(self.log_lines) == self.log_lines.maxlen:
+            self.dropped_log_lines += 1
+        self.log_lines.append(line)
+    
+    def put_transaction(self, result):
+        self.transactions.append(result)
+    
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.root.after(self.interval_ms, self._tick)
+    
+    def stop(self):
+        self._running = False
+    
+    def _drain(self, buffer):
+        items = []
+        for _ in range(len(buffer)):
+            try:
+                items.append(buffer.popleft())
+            except IndexError:
+                break
+        return items
+    
+    def _tick(self):
+        if not self._running:
+            return
+        try:
+            log_lines = self._drain(self.log_lines)
+            transactions = self._drain(self.transactions)
+            dropped, self.dropped_log_lines = self.dropped_log_lines, 0
+            if log_lines or transactions or dropped:
+                self.flush_callback(log_lines, transactions, dropped)
+        finally:
+            self.root.after(self.interval_ms, self._tick)
+
+
+class HistoryBrowser:
+    """
+    Filterable view over the indexed transaction history. Only one page is
+    held in the Treeview at a time; pages are fetched off the Tk thread.
+    """
+    
+    PERIODS = ("Last hour", "Last 24 hours", "Yesterday", "Last 7 days", "All time")
+    STATUSES = ("All", "APPROVED", "DECLINED", "FRAUD", "ERROR")
+    
+    def __init__(self, parent, store: HistoryStore):
+        self.store = store
+        self.pages = None
+        self.page_number = 0
+        self.generation = 0
+        
+        self.window = tk.Toplevel(parent)
+        self.window.title("🔎 Transaction History")
+        self.window.geometry("950x550")
+        self.window.configure(bg='#0a1628')
+        
+        self.create_filters()
+        self.create_results()
+        self.search()
+    
+    def create_filters(self):
+        filters = tk.Frame(self.window, bg='#1a2942', highlightbackground='#2d3e5f',
+                           highlightthickness=1)
+        filters.pack(fill=tk.X, padx=15, pady=15)
+        
+        def label(text):
+            tk.Label(filters, text=text, font=('Segoe UI', 10),
+                     fg='#8a9ab0', bg='#1a2942').pack(side=tk.LEFT, padx=(10, 4), pady=10)
+        
+        label("Card ****")
+        self.last4_var = tk.StringVar()
+        tk.Entry(filters, textvariable=self.last4_var, width=6).pack(side=tk.LEFT)
+        
+        label("Status")
+        self.status_var = tk.StringVar(value="All")
+        ttk.Combobox(filters, textvariable=self.status_var, values=self.STATUSES,
+                     state="readonly", width=10).pack(side=tk.LEFT)
+        
+        label("Merchant")
+        self.merchant_var = tk.StringVar()
+        tk.Entry(filters, textvariable=self.merchant_var, width=12).pack(side=tk.LEFT)
+        
+        label("Period")
+        self.period_var = tk.StringVar(value="Last 24 hours")
+        ttk.Combobox(filters, textvariable=self.period_var, values=self.PERIODS,
+                     state="readonly", width=13).pack(side=tk.LEFT)
+        
+        ModernButton(filters, "Next ▶", self.next_page, bg_color="#2d3e5f",
+                     width=90, height=34).pack(side=tk.RIGHT, padx=(5, 10))
+        ModernButton(filters, "🔎 Search", self.search, width=110,
+                     height=34).pack(side=tk.RIGHT, padx=5)
+    
+    def create_results(self):
+        container = tk.Frame(self.window, bg='#1a2942')
+        container.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 5))
+        
+        columns = ('Time', 'Transaction ID', 'Card', 'Amount', 'Status', 'Merchant', 'Reason')
+        self.tree = ttk.Treeview(container, columns=columns, show='headings',
+                                 style="Custom.Treeview")
+        widths = (150, 110, 80, 90, 90, 100, 250)
+        for col, width in zip(columns, widths):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width)
+        
+        scrollbar = ttk.Scrollbar(container, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscroll=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.status_label = tk.Label(self.window, text="", font=('Segoe UI', 9),
+                                     fg='#6c7a8f', bg='#0a1628', anchor='w')
+        self.status_label.pack(fill=tk.X, padx=15, pady=(0, 10))
+    
+    def period_range(self):
+        """(since, until) for the selected period"""
+        now = datetime.now()
+        period = self.period_var.get()
+        if period == "Last hour":
+            return now - timedelta(hours=1), None
+        if period == "Last 24 hours":
+            return now - timedelta(days=1), None
+        if period == "Yesterday":
+            today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            return today - timedelta(days=1), today
+        if period == "Last 7 days":
+            return now - timedelta(days=7), None
+        return None, None
+    
+    def search(self):
+        since, until = self.period_range()
+        status = self.status_var.get()
+        self.generation += 1  # Results of an earlier search still in flight are ignored
+        self.pages = self.store.query(
+            since=since, until=until,
+            card_last4=self.last4_var.get().strip() or None,
+            status=None if status == "All" else status,
+            merchant_id=self.merchant_var.get().strip() or None)
+        self.page_number = 0
+        self.next_page()
+    
+    def next_page(self):
+        """Fetch the next page in a worker thread; the generator is never shared concurrently"""
+        if self.pages is None:
+            return
+        pages, self.pages = self.pages, None
+        results = queue.Queue(maxsize=1)
+        self.status_label.config(text="Loading...")
+        
+        def fetch():
+            try:
+                results.put((next(pages, None), None))
+            except Exception as e:
+                results.put((None, e))
+        
+        threading.Thread(target=fetch, daemon=True).start()
+        self.window.after(20, self._poll_results, results, pages, self.generation)
+    
+    def _poll_results(self, results, pages, generation):
+        try:
+            page, error = results.get_nowait()
+        except queue.Empty:
+            self.window.after(20, self._poll_results, results, pages, generation)
+            return
+        
+        if generation != self.generation:
+            return
+        if error is not None:
+            self.status_label.config(text=f"❌ Query failed: {error}")
+            return
+        if page is None:
+            self.status_label.config(text=f"Page {self.page_number} - no more results"
+                                     if self.page_number else "No matching transactions")
+            if not self.page_number:
+                self.tree.delete(*self.tree.get_children())
+            return
+        
+        self.pages = pages
+        self.page_number += 1
+        self.tree.delete(*self.tree.get_children())
+        for record in page:
+            self.tree.insert('', tk.END, values=(
+                record['timestamp'][:19].replace('T', ' '),
+                record['transaction_id'][:8] + '...',
+                f"****{record.get('card_last4', '????')}",
+                f"${record.get('amount', 0):.2f}",
+                record['status'],
+                record.get('merchant_id') or '-',
+                record.get('reason', '')
+            ))
+        self.status_label.config(text=f"Page {self.page_number} - {len(page)} transactions")
+
+
 class BankMonitorGUI:
-    def __init__(self, root):
+    REFRESH_INTERVAL_MS = 33  # ~30 Hz batched refresh
+    MAX_LOG_LINES = 500  # Log widget is a ring buffer of this many lines
+    MAX_TREE_ROWS = 15
+    
+    def __init__(self, root, service: BankService = None):
         self.root = root
         self.root.title("🏦 Bank Payment Processor")
-        self.root.geometry("900x700")
+        self.root.geometry("900x800")
         self.root.configure(bg='#0a1628')
         
-        self.transaction_manager = TransactionManager()
+        # The GUI is only an observer: it attaches to an existing service
+        # (or creates one) and never drives transaction processing itself
+        self.service = service or BankService()
+        self.transaction_manager = self.service.transaction_manager
+        
+        self.updates = GuiUpdateQueue(root, self._flush_updates,
+                                      interval_ms=self.REFRESH_INTERVAL_MS,
+                                      max_log_lines=self.MAX_LOG_LINES,
+                                      max_rows=self.MAX_TREE_ROWS)
+        self.tree_items = deque()
+        self.log_line_count = 0
+        self.last_stats = None
+        
         self.setup_styles()
         self.setup_gui()
+        self.updates.start()
+        self.refresh_performance()
         self.start_transaction_monitor()
         self.update_log("🟢 Bank System Started - Ready for Transactions")
     
@@ -143,6 +380,9 @@ class BankMonitorGUI:
         # Statistics Frame
         self.create_stats_frame(main_container)
         
+        # Throughput / latency Frame
+        self.create_performance_frame(main_container)
+        
         # Transactions Frame
         self.create_transactions_frame(main_container)
         
@@ -189,6 +429,59 @@ class BankMonitorGUI:
         elif index == 3:
             self.fraud_label = value_label
     
+    def create_performance_frame(self, parent):
+        perf_frame = tk.Frame(parent, bg='#0a1628')
+        perf_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        window = Config.METRICS_WINDOW_SECONDS
+        panels = [
+            ('tps', f"TPS ({window}s)", "#00d9ff"),
+            ('p50', f"p50 Latency ({window}s)", "#00ff88"),
+            ('p99', f"p99 Latency ({window}s)", "#ffd93d"),
+            ('queue', "Queue Depth", "#ff6b6b"),
+            ('fraud_rate', "Fraud Rate (1h)", "#c084fc")
+        ]
+        
+        self.perf_labels = {}
+        for key, label_text, color in panels:
+            card = tk.Frame(perf_frame, bg='#1a2942', highlightbackground='#2d3e5f',
+                           highlightthickness=1)
+            card.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
+            
+            value_label = tk.Label(card, text="-", font=('Segoe UI', 16, 'bold'),
+                                  fg=color, bg='#1a2942')
+            value_label.pack(pady=(8, 2))
+            tk.Label(card, text=label_text, font=('Segoe UI', 9),
+                    fg='#8a9ab0', bg='#1a2942').pack(pady=(0, 8))
+            self.perf_labels[key] = value_label
+    
+    def refresh_performance(self):
+        """Refresh the TPS / latency panels from the metrics registry (once per second)"""
+        window = metrics.histogram('bank_transaction_us').window(Config.METRICS_WINDOW_SECONDS)
+        # Waiting on the bus plus admitted but not yet picked up by a worker
+        depth = ((metrics.gauge('bus_queue_depth', {'queue': 'vendor_to_bank'}).value or 0) +
+                 (metrics.gauge('bank_intake_queue_depth').value or 0))
+        
+        self.perf_labels['tps'].config(text=f"{window['rate']:.1f}")
+        self.perf_labels['p50'].config(text=self._format_latency(window['p50']))
+        self.perf_labels['p99'].config(text=self._format_latency(window['p99']))
+        self.perf_labels['queue'].config(text=str(depth if depth is not None else '-'))
+        # Last 60 minute buckets of the reporting rollups
+        last_hour = self.transaction_manager.rollups.totals(
+            since=datetime.now() - timedelta(minutes=59), resolution='minute').get('')
+        self.perf_labels['fraud_rate'].config(
+            text=f"{last_hour['fraud_rate']:.1%}" if last_hour else "-")
+        
+        self.root.after(1000, self.refresh_performance)
+    
+    @staticmethod
+    def _format_latency(micros):
+        if micros is None:
+            return "-"
+        if micros >= 1000:
+            return f"{micros / 1000:.1f} ms"
+        return f"{micros} µs"
+    
     def create_transactions_frame(self, parent):
         trans_frame = tk.Frame(parent, bg='#1a2942', highlightbackground='#2d3e5f',
                               highlightthickness=1)
@@ -202,6 +495,10 @@ class BankMonitorGUI:
                 font=('Segoe UI', 13, 'bold'),
                 fg='#00d9ff', bg='#1a2942').pack(side=tk.LEFT)
         
+        history_btn = ModernButton(header, "🔎 Search History", self.open_history,
+                                   width=170, height=36)
+        history_btn.pack(side=tk.RIGHT)
+        
         # Treeview for transactions
         tree_container = tk.Frame(trans_frame, bg='#1a2942')
         tree_container.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 15))
@@ -228,6 +525,10 @@ class BankMonitorGUI:
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
     
+    def open_history(self):
+        """Open the history browser over the bank's history index"""
+        HistoryBrowser(self.root, self.transaction_manager.history_store)
+    
     def create_log_frame(self, parent):
         log_frame = tk.Frame(parent, bg='#1a2942', highlightbackground='#2d3e5f',
                             highlightthickness=1)
@@ -255,89 +556,89 @@ class BankMonitorGUI:
         self.log_text.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 15))
     
     def start_transaction_monitor(self):
-        def monitor():
-            self.update_log("🔄 Transaction monitor started - Listening for payments...")
-            message_count = 0
-            
-            while True:
-                try:
-                    # Check for new messages
-                    encrypted_message = self.transaction_manager.message_bus.receive_from_vendor()
-                    if encrypted_message:
-                        message_count += 1
-                        self.update_log(f"📥 Received payment request #{message_count}")
-                        self.process_transaction(encrypted_message)
-                    
-                    # Update statistics every 2 seconds
-                    if message_count == 0 or message_count % 5 == 0:
-                        self.update_statistics()
-                    
-                    # Small delay
-                    time.sleep(0.5)  # Check every 500ms
-                    
-                except Exception as e:
-                    self.update_log(f"❌ Monitor error: {str(e)}")
-                    time.sleep(2)  # Wait longer on error
-        
-        # Start the monitor in a separate thread
-        monitor_thread = threading.Thread(target=monitor, daemon=True)
-        monitor_thread.start()
-        self.update_log("✅ Monitor thread started successfully")
-    
-    def process_transaction(self, encrypted_message):
-        try:
-            # Process the transaction
-            result = self.transaction_manager.process_transaction(encrypted_message)
-            
-            if result:
-                # Update GUI in main thread
-                self.root.after(0, lambda: self._update_gui_with_transaction(result))
-                self.update_log(f"✅ Processed: {result['card_last4']} - ${result['amount']} - {result['status']}")
-            else:
-                self.update_log("❌ Failed to process transaction")
-                
-        except Exception as e:
-            self.update_log(f"❌ Transaction processing error: {str(e)}")
-    
-    def _update_gui_with_transaction(self, result):
-        """Update GUI with new transaction (called in main thread)"""
-        # Add to transactions table
-        self.tree.insert('', 0, values=(
-            result['timestamp'][11:19],  # Time only
-            result['transaction_id'][:8] + '...',
-            f"****{result['card_last4']}",
-            f"${result['amount']:.2f}",
-            result['status']
-        ))
-        
-        # Keep only last 15 transactions
-        if len(self.tree.get_children()) > 15:
-            self.tree.delete(self.tree.get_children()[-1])
-        
-        # Update statistics
-        self.update_statistics()
+        """Attach to the bank service as an observer and start it if needed"""
+        self.service.add_observer(self.on_service_event)
+        self.root.bind("<Destroy>", self._on_destroy, add="+")
+        
+        if not self.service.running:
+            try:
+                self.service.start()
+            except LeaseHeldError as e:
+                self.update_log(f"❌ {e}")
+                return
+        self.update_log("✅ Monitor attached to bank service")
+    
+    def on_service_event(self, event, data):
+        """Called from service worker threads - only queues, never touches Tk"""
+        if event == 'log':
+            self.update_log(data)
+        elif event == 'processed':
+            self.updates.put_transaction(data)
+    
+    def _on_destroy(self, event):
+        if event.widget is self.root:
+            self.updates.stop()
+            self.service.remove_observer(self.on_service_event)
+    
+    def _flush_updates(self, log_lines, transactions, dropped):
+        """Apply one frame's worth of queued events (called in main thread)"""
+        if transactions:
+            self._update_gui_with_transactions(transactions)
+            self.update_statistics()
+        
+        if dropped:
+            log_lines.insert(0, f"[{time.strftime('%H:%M:%S')}] ⚠️ {dropped} log lines skipped (high load)")
+        if log_lines:
+            self._append_log_lines(log_lines)
+    
+    def _update_gui_with_transactions(self, results):
+        """Insert a batch of transactions, keeping only the newest rows"""
+        for result in results:
+            item = self.tree.insert('', 0, values=(
+                result['timestamp'][11:19],  # Time only
+                result['transaction_id'][:8] + '...',
+                f"****{result['card_last4']}",
+                f"${result['amount']:.2f}",
+                result['status']
+            ))
+            self.tree_items.append(item)
+        
+        # Keep only the last MAX_TREE_ROWS transactions
+        excess = len(self.tree_items) - self.MAX_TREE_ROWS
+        if excess > 0:
+            self.tree.delete(*[self.tree_items.popleft() for _ in range(excess)])
+    
+    def _append_log_lines(self, lines):
+        """Append lines in one insert and trim the widget to MAX_LOG_LINES"""
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        self.log_line_count += len(lines)
+        
+        excess = self.log_line_count - self.MAX_LOG_LINES
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_line_count -= excess
+        self.log_text.see(tk.END)
     
     def update_statistics(self):
-        """Update statistics display"""
+        """Update statistics display (skipped when nothing changed)"""
         stats = self.transaction_manager.get_statistics()
+        if stats == self.last_stats:
+            return
+        self.last_stats = stats
         self.total_label.config(text=str(stats['total']))
         self.approved_label.config(text=str(stats['approved']))
         self.declined_label.config(text=str(stats['declined']))
         self.fraud_label.config(text=str(stats['fraud']))
     
     def update_log(self, message):
-        """Update log display (thread-safe)"""
-        def _update():
-            timestamp = time.strftime("%H:%M:%S")
-            self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-            self.log_text.see(tk.END)
-            self.log_text.update()
-        
-        self.root.after(0, _update)
+        """Queue a log line; safe to call from any thread"""
+        timestamp = time.strftime("%H:%M:%S")
+        self.updates.put_log(f"[{timestamp}] {message}")
     
     def clear_log(self):
         """Clear the log display"""
         self.log_text.delete(1.0, tk.END)
+        self.log_line_count = 0
         self.update_log("📋 Log cleared")
 
 
@@ -0,0 +1,56 @@
+import argparse
+import sys
+import os
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.config import Config
+from shared.metrics import metrics, MetricsExporter
+from communication.routing import configure_instance
+from bank.replica import BankReplica
+
+def main():
+    parser = argparse.ArgumentParser(description="SecurePay hot-standby bank replica")
+    parser.add_argument("--instance",
+                        help="follow this bank instance of the routing table (its bus and data)")
+    parser.add_argument("--primary-data", default=None,
+                        help="data directory of the primary bank (default: Config.BANK_DATA_DIR)")
+    parser.add_argument("--data-dir", default=None,
+                        help="replica's own cards and history (default: Config.REPLICA_DATA_DIR)")
+    parser.add_argument("--host", default=Config.REPLICA_API_HOST)
+    parser.add_argument("--port", type=int, default=Config.REPLICA_API_PORT,
+                        help="port of the read-only query API")
+    parser.add_argument("--workers", type=int, default=Config.BANK_WORKERS,
+                        help="bank worker threads once promoted")
+    parser.add_argument("--auto-promote-after", type=float, default=0,
+                        help="promote once the primary process has been gone this many seconds (0: never)")
+    parser.add_argument("--ledger", action="store_true", default=Config.LEDGER_ENABLED,
+                        help="write a ledger of our own once promoted, for the next follower")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="port of the local metrics exporter (0 disables it)")
+    args = parser.parse_args()
+    data_dir = args.data_dir
+    if args.instance:
+        configure_instance(args.instance)
+        data_dir = data_dir or os.path.join(Config.BANK_DATA_DIR, "replica")
+    Config.LEDGER_ENABLED = args.ledger
+
+    print("🪞 Starting SecurePay Bank replica...")
+    print("📁 Working directory:", os.getcwd())
+
+    exporter = None
+    if args.metrics_port:
+        exporter = MetricsExporter(metrics, port=args.metrics_port)
+        exporter.start()
+
+    replica = BankReplica(primary_dir=args.primary_data, data_dir=data_dir, workers=args.workers,
+                          auto_promote_after=args.auto_promote_after)
+    try:
+        replica.run_forever(args.host, args.port)
+    finally:
+        if exporter:
+            exporter.stop()
+
+if __name__ == "__main__":
+    main()
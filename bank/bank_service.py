@@ -0,0 +1,445 @@
+"""
+Headless bank service
+Runs the transaction processing loop without any GUI attached
+"""
+import queue
+import threading
+import signal
+import time
+from datetime import datetime
+
+from shared.config import Config
+from shared.metrics import metrics
+from shared.tracing import tracer
+from shared.checkpoint import Checkpointer
+from shared.profiler import profiler
+from communication.message_bus import MessageBus
+from communication.routing import BankRouter
+from bank.transaction_manager import TransactionManager
+from bank.primary_lease import claim_primary
+from bank.scheduler import FairQueue, INTERACTIVE, BULK
+
+
+class BankService:
+    """
+    Owns a TransactionManager, an intake thread that takes requests off the
+    message bus and a pool of worker threads that process them. GUIs (or
+    anything else) attach as observers and are notified of every event;
+    the service never depends on them.
+
+    The intake queue is bounded. A request that would wait longer than
+    BANK_LATENCY_SLO_MS (time already spent on the bus plus the expected
+    queueing delay) is answered RETRY_LATER straight away, so overload
+    costs the vendor a fast retry instead of a timeout.
+
+    Admitted requests are queued per merchant and handed to the workers by
+    weighted deficit round-robin (bank.scheduler), interactive payments
+    ahead of bulk work.
+
+    STATUS_CHECK probes are answered by the intake thread itself from a
+    cached, pre-encrypted health snapshot: they never queue behind payments.
+
+    Hot state (statistics, recent history, the duplicate-transaction cache
+    and the service-time estimate) is checkpointed every CHECKPOINT_SECONDS
+    and at shutdown, so a restarted service starts warm. Payments only
+    journal their balances; the card store itself is rewritten every
+    CARDS_SAVE_SECONDS and at shutdown. The SQLite history index catches up
+    every HISTORY_SYNC_SECONDS, off the request path.
+
+    As one of several routed instances (Config.BANK_INSTANCE), the intake
+    thread follows the routing file. When it changes, cards this instance
+    no longer owns are sent to their new owner as a card_transfer message
+    and requests for them are answered RETRY_LATER with the new owner, so
+    the vendor re-routes. A new owner asks for retries on cards it does not
+    hold yet for ROUTING_HANDOFF_SECONDS after a change.
+    """
+
+    def __init__(self, workers: int = None, transaction_manager: TransactionManager = None):
+        self.transaction_manager = transaction_manager or TransactionManager()
+        self.workers = workers or Config.BANK_WORKERS
+        self.poll_interval = Config.POLL_INTERVAL
+
+        self.observers = []
+        self.message_count = 0
+        self._count_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._intake_done = threading.Event()
+        self._threads = []
+        self.lease = None
+        self.checkpointer = None
+        self.rollup_checkpointer = None
+
+        # Admission control
+        self.intake = FairQueue(Config.BANK_INTAKE_QUEUE_SIZE, Config.MERCHANTS,
+                                Config.DEFAULT_MERCHANT_WEIGHT, Config.BULK_SHARE)
+        self.latency_slo = Config.BANK_LATENCY_SLO_MS / 1000
+        self.service_time = None  # Moving average of seconds per transaction
+        restored = self.transaction_manager.restored_state
+        if restored and 'service' in restored:
+            self.service_time = restored['service']['service_time']
+        self.admitted = metrics.counter('bank_admission_total', {'decision': 'admitted'})
+        self.shed_queue_full = metrics.counter('bank_admission_total', {'decision': 'shed_queue_full'})
+        self.shed_slo = metrics.counter('bank_admission_total', {'decision': 'shed_slo'})
+        self.queue_wait = metrics.histogram('bank_queue_wait_us')
+        metrics.gauge('bank_intake_queue_depth').set_function(self.intake.qsize)
+        self.status_checks = metrics.counter('bank_status_checks_total')
+        self._health = None  # (health dict, encrypted answer)
+        self._health_at = 0.0
+        for merchant_id in Config.MERCHANTS:
+            metrics.gauge('bank_merchant_queue_depth', {'merchant': merchant_id}).set_function(
+                lambda merchant_id=merchant_id: self.intake.depths().get(merchant_id, 0))
+
+        # Card ownership when routed (see communication.routing)
+        self.instance = Config.BANK_INSTANCE
+        self.router = None
+        self._routing_changed_at = 0.0
+        if self.instance:
+            self.router = BankRouter()
+            self._routing_changed_at = time.monotonic()  # Cards may still be on their way here
+            self.transaction_manager.routing_check = self._routing_check
+            self.cards_moved_out = metrics.counter('bank_cards_transferred_total', {'direction': 'out'})
+            self.cards_moved_in = metrics.counter('bank_cards_transferred_total', {'direction': 'in'})
+            self.moved_requests = metrics.counter('bank_moved_requests_total')
+            metrics.gauge('bank_routing_version').set_function(lambda: self.router.version)
+
+        # Sizes reported with every memory snapshot (shared.profiler)
+        manager = self.transaction_manager
+        profiler.add_probe('bank.valid_cards', lambda: len(manager.valid_cards))
+        profiler.add_probe('bank.transaction_history', lambda: len(manager.transaction_history))
+        profiler.add_probe('bank.idempotency_responses', lambda: len(manager.idempotency.responses))
+        profiler.add_probe('bank.intake_queue_depth', self.intake.qsize)
+
+    def add_observer(self, observer):
+        """Register a callable observer(event, data)"""
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        if observer in self.observers:
+            self.observers.remove(observer)
+
+    def notify(self, event: str, data=None):
+        """Notify all observers; a failing observer never stops processing"""
+        for observer in list(self.observers):
+            try:
+                observer(event, data)
+            except Exception as e:
+                print(f"⚠️  Observer error ({event}): {e}")
+
+    def log(self, message: str):
+        self.notify('log', message)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stop_event.is_set()
+
+    def start(self):
+        """Start the worker threads"""
+        if self.running:
+            return
+
+        # Never two banks on one bus (e.g. an old primary next to a promoted replica)
+        self.lease = claim_primary()
+        self._stop_event.clear()
+        self._intake_done.clear()
+        intake = threading.Thread(target=self._intake_loop, name="bank-intake", daemon=True)
+        intake.start()
+        self._threads = [intake]
+        for i in range(self.workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"bank-worker-{i + 1}",
+                                      daemon=True)
+            worker.start()
+            self._threads.append(worker)
+        self._every(Config.CARDS_SAVE_SECONDS, self.transaction_manager.save_changed_cards,
+                    "bank-cards-save")
+        self._every(Config.HISTORY_SYNC_SECONDS, self.transaction_manager.history_store.sync,
+                    "bank-history-sync")
+        self.checkpointer = Checkpointer(self.transaction_manager.checkpoint_file,
+                                         self.checkpoint_sections, Config.CHECKPOINT_SECONDS,
+                                         "bank").start()
+        self.rollup_checkpointer = Checkpointer(self.transaction_manager.rollups.path,
+                                                self.transaction_manager.rollup_sections,
+                                                Config.CHECKPOINT_SECONDS, "rollups").start()
+
+        self.log(f"🔄 Transaction monitor started - {self.workers} worker(s) listening for payments...")
+        self.notify('started', {'workers': self.workers})
+
+    def _every(self, interval: float, task, name: str):
+        """Run task on its own thread every interval seconds until the service stops"""
+        if not interval or interval <= 0:
+            return
+
+        def run():
+            while not self._stop_event.wait(interval):
+                try:
+                    task()
+                except Exception as e:
+                    print(f"⚠️  {name} failed: {e}")
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """Stop accepting messages and wait for in-flight transactions to finish"""
+        if not self._threads:
+            return
+
+        self._stop_event.set()
+        for worker in self._threads:
+            worker.join(timeout)
+        self._threads = []
+        self.checkpointer.stop()  # Final snapshot: the next start is warm
+        self.rollup_checkpointer.stop()
+        self.transaction_manager.close()
+
+        self.log("🛑 Transaction monitor stopped")
+        self.notify('stopped', self.transaction_manager.get_statistics())
+
+    def run_forever(self):
+        """Run until SIGINT/SIGTERM, then shut down gracefully"""
+        def _handle_signal(signum, frame):
+            print(f"\n🛑 Received signal {signum}, shutting down...")
+            self._stop_event.set()
+
+        signal.signal(signal.SIGINT, _handle_signal)
+        signal.signal(signal.SIGTERM, _handle_signal)
+        profiler.install_signal_handlers()
+
+        self.start()
+        while not self._stop_event.is_set():
+            self._stop_event.wait(1)
+        self.stop()
+
+    def checkpoint_sections(self) -> dict:
+        """Hot state of the manager plus the admission controller's service time"""
+        sections = self.transaction_manager.checkpoint_sections()
+        sections['service'] = {'service_time': self.service_time}
+        return sections
+
+    def expected_wait(self, traffic_class: str = BULK) -> float:
+        """Seconds a newly admitted request is expected to queue before a worker takes it"""
+        if self.service_time is None:
+            return 0.0
+        # Interactive requests only queue behind other interactive requests
+        ahead = self.intake.qsize(INTERACTIVE) if traffic_class == INTERACTIVE else self.intake.qsize()
+        return (ahead + 1) * self.service_time / self.workers
+
+    @staticmethod
+    def merchant_label(merchant_id) -> str:
+        """Metric label for a merchant; unlisted ids share one label"""
+        return merchant_id if merchant_id in Config.MERCHANTS else 'other'
+
+    def _merchant_latency(self, merchant_id, traffic_class: str):
+        return metrics.histogram('bank_merchant_latency_us', {'merchant': self.merchant_label(merchant_id),
+                                                              'class': traffic_class})
+
+    def _shed(self, encrypted_message: str, reason: str, rejections: list,
+              traffic_class: str = BULK):
+        retry_after_ms = int(Config.RETRY_AFTER_MS + self.expected_wait(traffic_class) * 1000)
+        try:
+            response, encrypted_response = self.transaction_manager.reject(
+                encrypted_message, reason, retry_after_ms, send=False)
+            rejections.append((encrypted_response, response['transaction_id']))
+        except Exception as e:
+            self.log(f"❌ Could not shed request: {str(e)}")
+
+    def _admit(self, envelope: dict, rejections: list):
+        """Queue a request for the workers, or shed it if it cannot meet the SLO"""
+        encrypted_message = envelope['message']
+        sent_at = envelope.get('timestamp', time.time())
+        merchant_id = envelope.get('merchant_id')
+        traffic_class = BULK if envelope.get('message_type') == 'bulk_payment_request' else INTERACTIVE
+
+        waited = max(0.0, time.time() - sent_at)
+        if waited + self.expected_wait(traffic_class) > self.latency_slo:
+            self.shed_slo.inc()
+            self._shed(encrypted_message, "Bank overloaded - latency target exceeded", rejections,
+                       traffic_class)
+            return
+        try:
+            self.intake.put_nowait((encrypted_message, sent_at, time.perf_counter_ns(), merchant_id,
+                                    traffic_class), merchant_id, traffic_class)
+            self.admitted.inc()
+        except queue.Full:
+            self.shed_queue_full.inc()
+            self._shed(encrypted_message, "Bank overloaded - intake queue full", rejections,
+                       traffic_class)
+
+    def health(self):
+        """
+        (health dict, encrypted answer) for STATUS_CHECK probes, recomputed
+        at most every STATUS_CACHE_SECONDS (intake thread only)
+        """
+        now = time.monotonic()
+        if self._health is None or now - self._health_at >= Config.STATUS_CACHE_SECONDS:
+            expected_wait_ms = int(self.expected_wait(INTERACTIVE) * 1000)
+            health = {
+                'message_type': 'status_check',
+                'status': 'UP' if expected_wait_ms < Config.BANK_LATENCY_SLO_MS else 'DEGRADED',
+                'instance': self.instance,
+                'routing_version': self.router.version if self.router else None,
+                'cards': len(self.transaction_manager.valid_cards),
+                'workers': self.workers,
+                'queue_depth': self.intake.qsize(),
+                'expected_wait_ms': expected_wait_ms,
+                'timestamp': datetime.now().isoformat()
+            }
+            self._health = (health, self.transaction_manager.encryption.encrypt_data(health))
+            self._health_at = now
+        return self._health
+
+    def _answer_status_check(self, envelope: dict, replies: list):
+        self.status_checks.inc()
+        _, encrypted_health = self.health()
+        replies.append((encrypted_health, envelope['message']))  # The probe id is the message
+
+    def _answer_profile_control(self, envelope: dict, replies: list):
+        """profile_control from `python -m shared.profiler bank ...`; dumps are written off this thread"""
+        encryption = self.transaction_manager.encryption
+        request = encryption.decrypt_data(envelope['message'])
+        try:
+            answer = profiler.control(request.get('action'), request.get('interval'))
+        except ValueError as e:
+            answer = {'error': str(e)}
+        self.log(f"🔬 Profiler {request.get('action')}: {answer}")
+        replies.append((encryption.encrypt_data(answer), request['request_id']))
+
+    def _routing_check(self, card_number: str):
+        """TransactionManager hook (under its lock): None if this instance should authorize"""
+        owner = self.router.table.owner(card_number)
+        if owner != self.instance:
+            self.moved_requests.inc()
+            return {'reason': f"Card moved to bank instance {owner}", 'retry_after_ms': 0,
+                    'moved_to': owner}
+        if (card_number not in self.transaction_manager.valid_cards and
+                time.monotonic() - self._routing_changed_at < Config.ROUTING_HANDOFF_SECONDS):
+            return {'reason': "Card in transfer to this bank instance",
+                    'retry_after_ms': Config.RETRY_AFTER_MS}
+        return None
+
+    def _follow_routing(self):
+        """Pick up a changed routing file and hand off the cards this instance lost"""
+        if not self.router.maybe_reload():
+            return
+        self._routing_changed_at = time.monotonic()
+        self._hand_off(list(self.transaction_manager.valid_cards))
+
+    def _hand_off(self, card_numbers):
+        """
+        Send those of these cards another instance owns to it (one
+        card_transfer per owner). The records are copied under the manager's
+        lock; the routing check already refuses payments on them, so they
+        cannot change. Sending happens outside the lock, and a card is only
+        removed here once its transfer has been sent.
+        """
+        manager = self.transaction_manager
+        with manager.lock:
+            leaving = {}
+            for card_number in card_numbers:
+                owner = self.router.table.owner(card_number)
+                if owner != self.instance and card_number in manager.valid_cards:
+                    leaving.setdefault(owner, {})[card_number] = dict(
+                        manager.valid_cards[card_number].items())
+            version = self.router.version
+        for owner, cards in leaving.items():
+            transfer = {'from': self.instance, 'routing_version': version, 'cards': cards}
+            try:
+                MessageBus(self.router.comm_dir(owner)).send_to_bank(
+                    manager.encryption.encrypt_data(transfer), message_type='card_transfer')
+            except Exception as e:
+                self.log(f"⚠️  Could not hand {len(cards)} card(s) to bank instance {owner}, "
+                         f"keeping them: {e}")
+                continue
+            manager.remove_cards(list(cards))
+            self.cards_moved_out.inc(len(cards))
+            self.log(f"🧭 Handed {len(cards)} card(s) to bank instance {owner}")
+
+    def _accept_cards(self, envelope: dict):
+        """card_transfer from the previous owner of some cards"""
+        if self.router is None:
+            self.log("⚠️  card_transfer ignored - this bank is not a routed instance")
+            return
+        manager = self.transaction_manager
+        transfer = manager.encryption.decrypt_data(envelope['message'])
+        manager.add_cards(transfer['cards'])
+        self.cards_moved_in.inc(len(transfer['cards']))
+        self.log(f"🧭 Received {len(transfer['cards'])} card(s) from bank instance {transfer['from']}")
+        # Routing may have moved on since the sender looked
+        self._hand_off(list(transfer['cards']))
+
+    def _intake_loop(self):
+        """Drain the bus in batches and apply admission control"""
+        bus = self.transaction_manager.message_bus
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    if self.router:
+                        self._follow_routing()
+                    batch = bus.receive_envelopes_from_vendor(Config.BANK_INTAKE_BATCH)
+                    if not batch:
+                        bus.wait_for_vendor(self.poll_interval, self._stop_event)
+                        continue
+                    # Shedding must stay cheaper than processing: one bus write per batch
+                    replies = []
+                    for envelope in batch:
+                        if envelope.get('message_type') == 'status_check':
+                            self._answer_status_check(envelope, replies)
+                        elif envelope.get('message_type') == 'card_transfer':
+                            self._accept_cards(envelope)
+                        elif envelope.get('message_type') == 'profile_control':
+                            self._answer_profile_control(envelope, replies)
+                        else:
+                            self._admit(envelope, replies)
+                    bus.send_batch_to_vendor(replies)
+                except Exception as e:
+                    self.log(f"❌ Bus error: {str(e)}")
+                    self._stop_event.wait(2)
+        finally:
+            self._intake_done.set()
+
+    def _record_service_time(self, seconds: float):
+        # Benign race between workers: the average only steers admission
+        if self.service_time is None:
+            self.service_time = seconds
+        else:
+            self.service_time += 0.1 * (seconds - self.service_time)
+
+    def _worker_loop(self):
+        manager = self.transaction_manager
+
+        # Keep draining admitted requests after stop() until intake has finished
+        while not (self._intake_done.is_set() and self.intake.empty()):
+            try:
+                (encrypted_message, sent_at, admitted_ns, merchant_id,
+                 traffic_class) = self.intake.get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+
+            try:
+                dequeued_ns = time.perf_counter_ns()
+                self.queue_wait.record((dequeued_ns - admitted_ns) / 1000)
+
+                # Backdate the trace so the time spent in the intake queue is included
+                trace = tracer.start_trace(start_ns=admitted_ns)
+                if trace is not None:
+                    trace.add_span('intake_queue', admitted_ns, dequeued_ns)
+
+                with self._count_lock:
+                    self.message_count += 1
+                    count = self.message_count
+                self.log(f"📥 Received payment request #{count}")
+
+                try:
+                    result = manager.process_transaction(encrypted_message)
+                finally:
+                    tracer.finish_trace()
+                self._record_service_time((time.perf_counter_ns() - dequeued_ns) / 1e9)
+                # Bus wait + intake queue + processing, as seen by this merchant
+                self._merchant_latency(merchant_id, traffic_class).record((time.time() - sent_at) * 1e6)
+                self.log(f"✅ Processed: {result['card_last4']} - ${result['amount']} - {result['status']}")
+                self.notify('processed', result)
+
+            except Exception as e:
+                self.log(f"❌ Transaction processing error: {str(e)}")
+                self.notify('error', str(e))
+                time.sleep(2)  # Wait longer on error
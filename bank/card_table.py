@@ -0,0 +1,445 @@
+"""
+Compact card table
+A stand-in for the valid_cards dict that keeps every card in parallel
+typed arrays instead of a dict of Python objects per card:
+
+    keys / lengths    PAN digits as uint64 (+ length, so leading zeros survive)
+    expiry            MM/YY packed as YY * 100 + MM (uint16)
+    balance           int64 minor units - no float drift
+    types             uint8 index into a short list of card type names
+    holders           cardholder names in one UTF-8 blob (start + length)
+
+An open-addressing index (linear probing, power-of-two size) maps a PAN to
+its row. Lookups return CardRecord views that read and write the columns
+in place, so existing code such as card_info['balance'] -= amount works
+unchanged.
+
+    python -m bench table --cards 10000000
+"""
+import json
+import os
+import re
+from array import array
+from functools import lru_cache
+
+GOLDEN = 0x9E3779B97F4A7C15  # Fibonacci hashing multiplier
+MASK64 = (1 << 64) - 1
+MAX_LOAD = 0.7
+EMPTY = -1
+NO_HOLDER = 0xFFFF  # Holder length meaning "no cardholder field"
+MAX_PAN_DIGITS = 19
+
+WHITESPACE = re.compile(r"\s*")
+
+
+def pack_expiry(expiry: str) -> int:
+    month, year = expiry.split("/")
+    if len(year) != 2 or not 1 <= int(month) <= 12:
+        raise ValueError(f"Expiry must be MM/YY, got {expiry!r}")
+    return int(year) * 100 + int(month)
+
+
+@lru_cache(maxsize=None)  # At most 10,000 distinct values
+def unpack_expiry(packed: int) -> str:
+    return f"{packed % 100:02d}/{packed // 100:02d}"
+
+
+def to_minor_units(amount) -> int:
+    return int(round(float(amount) * 100))
+
+
+def iter_json_items(path: str, chunk_size: int = 1 << 20):
+    """Yield the (key, value) pairs of a top-level JSON object without loading it whole"""
+    decoder = json.JSONDecoder()
+    with open(path) as f:
+        buffer, pos, eof = "", 0, False
+
+        def fill():
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def peek() -> str:
+            """Next non-whitespace character (not consumed)"""
+            nonlocal pos
+            while True:
+                pos = WHITESPACE.match(buffer, pos).end()
+                if pos < len(buffer):
+                    return buffer[pos]
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of JSON")
+                fill()
+
+        def value():
+            nonlocal pos
+            while True:
+                try:
+                    result, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer) or eof:  # A number at the end of the buffer may continue
+                        pos = end
+                        return result
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        fill()
+        if peek() != "{":
+            raise ValueError(f"{path}: expected a JSON object")
+        pos += 1
+        if peek() == "}":
+            return
+        while True:
+            peek()
+            key = value()
+            if peek() != ":":
+                raise ValueError(f"{path}: expected ':' after {key!r}")
+            pos += 1
+            peek()
+            yield key, value()
+            separator = peek()
+            pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"{path}: expected ',' or '}}' after {key!r}")
+
+
+class CardRecord:
+    """View of one card; reads and writes go straight to the table's columns"""
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row: int):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, field: str):
+        value = self.table.get_field(self.row, field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __setitem__(self, field: str, value):
+        self.table.set_field(self.row, field, value)
+
+    def __contains__(self, field: str) -> bool:
+        return self.table.get_field(self.row, field) is not None
+
+    def get(self, field: str, default=None):
+        value = self.table.get_field(self.row, field)
+        return default if value is None else value
+
+    @property
+    def balance_cents(self) -> int:
+        return self.table.balances[self.row]
+
+    def to_dict(self) -> dict:
+        return self.table.row_dict(self.row)
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __repr__(self):
+        return f"CardRecord({self.to_dict()!r})"
+
+
+class CardTable:
+    def __init__(self, capacity: int = 1024):
+        self.keys = array('Q')
+        self.lengths = array('B')
+        self.expiry = array('H')
+        self.balances = array('q')
+        self.types = array('B')
+        self.holder_starts = array('Q')
+        self.holder_lengths = array('H')
+        self.holder_blob = bytearray()
+        self.type_names = [None]  # Code 0 = no type field
+        self.type_codes = {None: 0}
+        self.extras = {}  # row -> fields without a column (rare)
+
+        size = 8
+        while size * MAX_LOAD < capacity:
+            size *= 2
+        self._resize(size)
+
+    # --- index ---
+
+    def _resize(self, size: int):
+        self.size = size
+        self.mask = size - 1
+        self.shift = 64 - size.bit_length() + 1
+        self.grow_at = int(size * MAX_LOAD)
+        self.index = array('i', [EMPTY]) * size
+        index, mask, shift, keys = self.index, self.mask, self.shift, self.keys
+        for row in range(len(keys)):
+            slot = ((keys[row] * GOLDEN) & MASK64) >> shift
+            while index[slot] != EMPTY:
+                slot = (slot + 1) & mask
+            index[slot] = row
+
+    def _probe(self, pan: str):
+        """(slot, row) for a PAN: its row, or EMPTY and the free slot where it would go"""
+        value, length = int(pan), len(pan)
+        index, keys, lengths, mask = self.index, self.keys, self.lengths, self.mask
+        slot = ((value * GOLDEN) & MASK64) >> self.shift
+        while True:
+            row = index[slot]
+            if row == EMPTY or (keys[row] == value and lengths[row] == length):
+                return slot, row
+            slot = (slot + 1) & mask
+
+    def _unindex(self, slot: int):
+        """Free an index slot, shifting later entries of its probe run back (no tombstones)"""
+        index, keys, mask, shift = self.index, self.keys, self.mask, self.shift
+        index[slot] = EMPTY
+        hole = slot
+        slot = (slot + 1) & mask
+        while index[slot] != EMPTY:
+            home = ((keys[index[slot]] * GOLDEN) & MASK64) >> shift
+            if (slot - home) & mask >= (slot - hole) & mask:
+                index[hole], index[slot] = index[slot], EMPTY
+                hole = slot
+            slot = (slot + 1) & mask
+
+    def row_of(self, pan) -> int:
+        """Row number of a PAN, or EMPTY"""
+        if not isinstance(pan, str) or not pan.isdigit() or len(pan) > MAX_PAN_DIGITS:
+            return EMPTY
+        return self._probe(pan)[1]
+
+    # --- columns ---
+
+    def _type_code(self, name) -> int:
+        code = self.type_codes.get(name)
+        if code is None:
+            if len(self.type_names) > 255:
+                raise ValueError("CardTable supports at most 255 card types")
+            code = self.type_codes[name] = len(self.type_names)
+            self.type_names.append(name)
+        return code
+
+    def _set_holder(self, row: int, name):
+        if name is None:
+            self.holder_starts[row], self.holder_lengths[row] = 0, NO_HOLDER
+            return
+        encoded = name.encode()[:NO_HOLDER - 1]
+        self.holder_starts[row], self.holder_lengths[row] = len(self.holder_blob), len(encoded)
+        self.holder_blob += encoded  # A renamed holder leaves its old bytes behind
+
+    def get_field(self, row: int, field: str):
+        if field == 'balance':
+            return self.balances[row] / 100
+        if field == 'expiry':
+            return unpack_expiry(self.expiry[row])
+        if field == 'type':
+            return self.type_names[self.types[row]]
+        if field == 'cardholder':
+            length = self.holder_lengths[row]
+            if length == NO_HOLDER:
+                return None
+            start = self.holder_starts[row]
+            return self.holder_blob[start:start + length].decode()
+        return self.extras.get(row, {}).get(field)
+
+    def set_field(self, row: int, field: str, value):
+        if field == 'balance':
+            self.balances[row] = to_minor_units(value)
+        elif field == 'expiry':
+            self.expiry[row] = pack_expiry(value)
+        elif field == 'type':
+            self.types[row] = self._type_code(value)
+        elif field == 'cardholder':
+            self._set_holder(row, value)
+        else:
+            self.extras.setdefault(row, {})[field] = value
+
+    def row_dict(self, row: int) -> dict:
+        card = {'expiry': unpack_expiry(self.expiry[row]), 'balance': self.balances[row] / 100}
+        for field in ('cardholder', 'type'):
+            value = self.get_field(row, field)
+            if value is not None:
+                card[field] = value
+        card.update(self.extras.get(row, {}))
+        return card
+
+    # --- mapping interface (what the bank code uses of valid_cards) ---
+
+    def __setitem__(self, pan: str, card_info: dict):
+        if not isinstance(pan, str) or not pan.isdigit() or len(pan) > MAX_PAN_DIGITS:
+            raise ValueError(f"Card number must be 1-{MAX_PAN_DIGITS} digits")
+        slot, row = self._probe(pan)
+        if row == EMPTY:
+            row = len(self.keys)
+            self.keys.append(int(pan))
+            self.lengths.append(len(pan))
+            self.expiry.append(pack_expiry(card_info['expiry']))
+            self.balances.append(to_minor_units(card_info.get('balance', 0)))
+            self.types.append(self._type_code(card_info.get('type')))
+            self.holder_starts.append(0)
+            self.holder_lengths.append(NO_HOLDER)
+            self._set_holder(row, card_info.get('cardholder'))
+            self.index[slot] = row
+            if len(self.keys) > self.grow_at:
+                self._resize(self.size * 2)
+        else:
+            self.extras.pop(row, None)
+            self.set_field(row, 'expiry', card_info['expiry'])
+            self.set_field(row, 'balance', card_info.get('balance', 0))
+            self.set_field(row, 'type', card_info.get('type'))
+            self.set_field(row, 'cardholder', card_info.get('cardholder'))
+        for field, value in card_info.items():
+            if field not in ('expiry', 'balance', 'type', 'cardholder'):
+                self.extras.setdefault(row, {})[field] = value
+
+    def __delitem__(self, pan: str):
+        """Remove a card; the last row moves into its place so the columns stay dense"""
+        row = self.row_of(pan)
+        if row == EMPTY:
+            raise KeyError(pan)
+        self._unindex(self._probe(pan)[0])
+        last = len(self.keys) - 1
+        columns = (self.keys, self.lengths, self.expiry, self.balances, self.types,
+                   self.holder_starts, self.holder_lengths)
+        self.extras.pop(row, None)
+        if row != last:
+            self.index[self._probe(self.pan(last))[0]] = row
+            for column in columns:
+                column[row] = column[last]
+            if last in self.extras:
+                self.extras[row] = self.extras.pop(last)
+        for column in columns:
+            column.pop()
+
+    def __getitem__(self, pan: str) -> CardRecord:
+        row = self.row_of(pan)
+        if row == EMPTY:
+            raise KeyError(pan)
+        return CardRecord(self, row)
+
+    def get(self, pan: str, default=None):
+        row = self.row_of(pan)
+        return default if row == EMPTY else CardRecord(self, row)
+
+    def __contains__(self, pan) -> bool:
+        return self.row_of(pan) != EMPTY
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def pan(self, row: int) -> str:
+        return str(self.keys[row]).zfill(self.lengths[row])
+
+    def __iter__(self):
+        for row in range(len(self.keys)):
+            yield self.pan(row)
+
+    def items(self):
+        for row in range(len(self.keys)):
+            yield self.pan(row), CardRecord(self, row)
+
+    def values(self):
+        for row in range(len(self.keys)):
+            yield CardRecord(self, row)
+
+    def update(self, cards):
+        for pan, card_info in (cards.items() if hasattr(cards, 'items') else cards):
+            self[pan] = card_info
+
+    # --- fast paths ---
+
+    def has_funds(self, pan: str, amount) -> bool:
+        """Balance check on the int64 column, without building a record"""
+        row = self.row_of(pan)
+        return row != EMPTY and self.balances[row] >= to_minor_units(amount)
+
+    # --- persistence ---
+
+    @classmethod
+    def from_dict(cls, cards: dict) -> "CardTable":
+        table = cls(len(cards))
+        table.update(cards)
+        return table
+
+    @classmethod
+    def load(cls, path: str) -> "CardTable":
+        """Stream a valid_cards.json file into a table (never holds the dicts)"""
+        table = cls()
+        table.update(iter_json_items(path))
+        return table
+
+    def copy(self) -> "CardTable":
+        """Column-by-column copy (a memcpy per column), e.g. to save it outside a lock"""
+        table = CardTable.__new__(CardTable)
+        table.__dict__.update(self.__dict__)
+        for name in ('keys', 'lengths', 'expiry', 'balances', 'types', 'holder_starts',
+                     'holder_lengths', 'index'):
+            setattr(table, name, getattr(self, name)[:])
+        table.holder_blob = bytearray(self.holder_blob)
+        table.type_names = list(self.type_names)
+        table.type_codes = dict(self.type_codes)
+        table.extras = {row: dict(fields) for row, fields in self.extras.items()}
+        return table
+
+    def save(self, path: str):
+        """Write the valid_cards.json format, one card per line"""
+        temp = path + ".tmp"
+        with open(temp, "w") as f:
+            f.write("{")
+            for row in range(len(self.keys)):
+                f.write(",\n" if row else "\n")
+                f.write(f"  {json.dumps(self.pan(row))}: {json.dumps(self.row_dict(row))}")
+            f.write("\n}\n")
+        os.replace(temp, path)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the columns and the index"""
+        columns = (self.keys, self.lengths, self.expiry, self.balances, self.types,
+                   self.holder_starts, self.holder_lengths, self.index)
+        return sum(column.itemsize * len(column) for column in columns) + len(self.holder_blob)
+
+    def stats(self) -> dict:
+        cards = len(self.keys)
+        memory = self.memory_bytes()
+        return {
+            'cards': cards,
+            'memory_bytes': memory,
+            'bytes_per_card': round(memory / cards, 1) if cards else None,
+            'index_slots': self.size,
+            'load_factor': round(cards / self.size, 3)
+        }
+
+
+def replay_cards_journal(journal_file: str, valid_cards) -> int:
+    """
+    Apply the card changes a bank journaled after its valid_cards.json was
+    last written (TransactionManager.journal_card): `journal_file`.old from
+    an interrupted save first, then `journal_file`. Returns how many.
+    """
+    replayed = 0
+    for path in (journal_file + ".old", journal_file):
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # Torn by a crash mid-write: nothing after it was journaled
+                    card_number = entry['card']
+                    if entry['op'] == 'balance' and card_number in valid_cards:
+                        valid_cards[card_number]['balance'] = entry['balance']
+                    elif entry['op'] == 'card':
+                        valid_cards[card_number] = entry['info']
+                    elif entry['op'] == 'remove' and card_number in valid_cards:
+                        del valid_cards[card_number]
+                    replayed += 1
+        except FileNotFoundError:
+            continue
+    return replayed
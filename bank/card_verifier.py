@@ -1,19 +1,68 @@
-import re
 import random
 from typing import Dict, Tuple
-import sys
-import os
 
-# Add the parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from shared.config import CardValidator
+from shared.bloom import BloomFilter
+from shared.config import Config, CardValidator
+from shared.metrics import metrics
 
 class CardVerifier:
     def __init__(self, valid_cards: Dict):
         self.valid_cards = valid_cards
         self.validator = CardValidator()
         self.fraud_patterns = self._initialize_fraud_patterns()
+        self.verify_latency = metrics.histogram('card_verify_us')
+        
+        # Negative-lookup filter over every issued PAN: unknown cards (card
+        # testing) are rejected before the card store is touched
+        self.filter_rejected = metrics.counter('card_filter_total', {'result': 'rejected'})
+        self.filter_passed = metrics.counter('card_filter_total', {'result': 'passed'})
+        self.filter_false_positives = metrics.counter('card_filter_false_positives_total')
+        self.card_filter = None
+        self.rebuild_card_filter()
+        metrics.gauge('card_filter_memory_bytes').set_function(lambda: self.card_filter.memory_bytes)
+        metrics.gauge('card_filter_estimated_fp_rate').set_function(
+            lambda: self.card_filter.estimated_false_positive_rate())
+    
+    def rebuild_card_filter(self, capacity: int = None):
+        """(Re)build the PAN filter with room for growth"""
+        capacity = capacity or max(Config.CARD_FILTER_MIN_CAPACITY,
+                                   int(len(self.valid_cards) * Config.CARD_FILTER_HEADROOM))
+        card_filter = BloomFilter(capacity, Config.CARD_FILTER_ERROR_RATE, stable=False)
+        for card_number in self.valid_cards:
+            card_filter.add(card_number)
+        self.card_filter = card_filter
+        
+        stats = card_filter.stats()
+        print(f"🧮 Card filter: {stats['items']} cards, {stats['memory_bytes'] / 1024:.0f} KiB, "
+              f"target FP rate {stats['target_false_positive_rate']:.2%}")
+    
+    def might_exist(self, card_number: str) -> bool:
+        """False means the card was never issued; True may be a false positive"""
+        if card_number in self.card_filter:
+            self.filter_passed.inc()
+            return True
+        self.filter_rejected.inc()
+        return False
+    
+    def record_store_miss(self):
+        """A card passed the filter but is not in the store"""
+        self.filter_false_positives.inc()
+    
+    def add_card(self, card_number: str, card_info: Dict):
+        """Issue a card: add it to the store and the filter"""
+        self.valid_cards[card_number] = card_info
+        if self.card_filter.count >= self.card_filter.capacity:
+            self.rebuild_card_filter(self.card_filter.capacity * 2)
+        else:
+            self.card_filter.add(card_number)
+    
+    def card_filter_stats(self) -> Dict:
+        stats = self.card_filter.stats()
+        checked = self.filter_passed.value + self.filter_rejected.value
+        stats['checked'] = checked
+        stats['rejected'] = self.filter_rejected.value
+        stats['observed_false_positives'] = self.filter_false_positives.value
+        return stats
     
     def _initialize_fraud_patterns(self) -> Dict:
         """Initialize known fraud detection patterns"""
@@ -23,11 +72,19 @@ class CardVerifier:
             'suspicious_bins': ['6060', '5110']  # Known risky BINs
         }
     
-    def verify_card(self, card_data: Dict, transaction_amount: float = 0.0) -> Tuple[bool, str]:
+    def verify_card(self, card_data: Dict, transaction_amount: float = 0.0,
+                    transaction_id: str = None) -> Tuple[bool, str]:
         """
         Comprehensive card verification
         Returns (is_valid, reason)
         """
+        with self.verify_latency.time():
+            is_valid, reason = self._verify_card(card_data, transaction_amount, transaction_id)
+        metrics.counter('card_verify_total', {'result': 'valid' if is_valid else 'rejected'}).inc()
+        return is_valid, reason
+    
+    def _verify_card(self, card_data: Dict, transaction_amount: float,
+                     transaction_id: str = None) -> Tuple[bool, str]:
         card_number = card_data['number']
         
         # 1. Basic format validation
@@ -42,8 +99,11 @@ class CardVerifier:
         if not self.validator.validate_cvv(card_data['cvv']):
             return False, "Invalid CVV"
         
-        # 4. Check if card exists in bank database
+        # 4. Check if card exists in bank database (filter first, then the store)
+        if not self.might_exist(card_number):
+            return False, "Card not found in bank system"
         if card_number not in self.valid_cards:
+            self.record_store_miss()
             return False, "Card not found in bank system"
         
         card_info = self.valid_cards[card_number]
@@ -57,14 +117,28 @@ class CardVerifier:
             return False, "Insufficient funds"
         
         # 7. Fraud detection checks
-        fraud_check, fraud_reason = self._fraud_detection(card_number, transaction_amount)
+        fraud_check, fraud_reason = self._fraud_detection(card_number, transaction_amount,
+                                                          transaction_id)
         if not fraud_check:
             return False, fraud_reason
         
         return True, "Card verification successful"
     
-    def _fraud_detection(self, card_number: str, amount: float) -> Tuple[bool, str]:
+    def _fraud_rng(self, transaction_id: str = None):
+        """
+        Source of the simulated fraud draws. With Config.FRAUD_SEED set, each
+        transaction gets its own generator seeded from (seed, transaction_id),
+        so a replay decides every transaction the same way whatever order the
+        workers take them in.
+        """
+        if Config.FRAUD_SEED is None or transaction_id is None:
+            return random
+        return random.Random(f"{Config.FRAUD_SEED}:{transaction_id}")
+    
+    def _fraud_detection(self, card_number: str, amount: float,
+                         transaction_id: str = None) -> Tuple[bool, str]:
         """Advanced fraud detection checks"""
+        rng = self._fraud_rng(transaction_id)
         
         # Check for suspicious BIN
         bin_number = card_number[:4]
@@ -74,11 +148,11 @@ class CardVerifier:
         # High amount threshold
         if amount > self.fraud_patterns['high_amount_threshold']:
             # 30% chance of flagging high amount as suspicious
-            if random.random() < 0.3:
+            if rng.random() < 0.3:
                 return False, "High amount requires manual verification"
         
         # Simulate various fraud scenarios (15% chance total)
-        fraud_risk = random.random()
+        fraud_risk = rng.random()
         
         if fraud_risk < 0.05:  # 5% chance
             return False, "Suspicious transaction pattern"
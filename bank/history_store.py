@@ -0,0 +1,292 @@
+"""
+Indexed transaction history
+A SQLite index over the append-only history log. The index catches up
+incrementally from the log (the position is committed with the rows), so
+it can be rebuilt at any time and queried from other processes. The bank
+syncs it on a timer (BankService); lookups read the index as it stands.
+
+    python -m bank.history_store --last4 1111 --since 2024-01-01
+    python -m bank.history_store --status FRAUD --last-hours 1
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from shared.config import Config
+from shared.rotating_log import RotatingLog
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    transaction_id TEXT,
+    timestamp TEXT,
+    status TEXT,
+    reason TEXT,
+    card_last4 TEXT,
+    card_fingerprint TEXT,
+    merchant_id TEXT,
+    amount REAL,
+    record TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_time ON transactions (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_last4 ON transactions (card_last4, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_fingerprint ON transactions (card_fingerprint, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_status ON transactions (status, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_merchant ON transactions (merchant_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_transaction_id ON transactions (transaction_id);
+CREATE TABLE IF NOT EXISTS log_position (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    seq INTEGER,
+    offset INTEGER
+);
+"""
+
+SYNC_BATCH = 5000
+
+
+def _timestamp(value) -> str:
+    """Accept datetimes or ISO strings; the log stores isoformat() text"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+
+class HistoryStore:
+    def __init__(self, history_log: RotatingLog = None, db_path: str = None):
+        self.history_log = history_log or RotatingLog(Config.HISTORY_DIR, "transactions",
+                                                      read_only=True)
+        self.db_path = db_path or Config.HISTORY_DB
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+        self.lock = threading.Lock()  # One connection, shared by GUI and worker threads
+        self._sync_lock = threading.Lock()  # One sync at a time; queries only wait for its inserts
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def _position(self):
+        row = self.conn.execute("SELECT seq, offset FROM log_position WHERE id = 1").fetchone()
+        return (row['seq'], row['offset']) if row else None
+
+    def sync(self) -> int:
+        """
+        Index records appended to the log since the last sync; returns how
+        many. Other processes may sync the same database: a batch is only
+        committed if the indexed position is still the one it was read from.
+        """
+        with self._sync_lock:
+            indexed = 0
+            while True:
+                with self.lock:
+                    start = self._position()
+                batch = []
+                position = start
+                for position, record in self.history_log.iter_with_positions(start):
+                    batch.append(record)
+                    if len(batch) >= SYNC_BATCH:
+                        break
+                if not batch:
+                    return indexed
+                if self._insert(batch, start, position):
+                    indexed += len(batch)
+
+    def _insert(self, records: list, start, position) -> bool:
+        """
+        Commit rows and the log position they reach in one write transaction,
+        unless the index moved past `start` meanwhile (then nothing is written)
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")  # Write lock held from the position check on
+            try:
+                if self._position() != start:
+                    self.conn.rollback()
+                    return False
+                self.conn.executemany(
+                    "INSERT INTO transactions (transaction_id, timestamp, status, reason, card_last4, "
+                    "card_fingerprint, merchant_id, amount, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(r.get('transaction_id'), r.get('timestamp'), r.get('status'), r.get('reason'),
+                      r.get('card_last4'), r.get('card_fingerprint'), r.get('merchant_id'),
+                      r.get('amount'), json.dumps(r)) for r in records])
+                self.conn.execute("INSERT OR REPLACE INTO log_position (id, seq, offset) VALUES (1, ?, ?)",
+                                  position)
+                self.conn.commit()
+                return True
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    @staticmethod
+    def _filters(since, until, card_last4, card_fingerprint, status, merchant_id):
+        clauses, params = [], []
+        for column, value in (('card_last4', card_last4), ('card_fingerprint', card_fingerprint),
+                              ('status', status), ('merchant_id', merchant_id)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(_timestamp(until))
+        return clauses, params
+
+    def query(self, since=None, until=None, card_last4: str = None, card_fingerprint: str = None,
+              status: str = None, merchant_id: str = None, page_size: int = None,
+              newest_first: bool = True, sync: bool = False):
+        """
+        Yield pages (lists of transaction dicts) matching every given filter.
+        Pages are fetched lazily with keyset pagination on (timestamp, id),
+        so stopping early never scans the rest of the history. With sync,
+        the index first catches up with the log.
+        """
+        if sync:
+            self.sync()
+        page_size = page_size or Config.HISTORY_PAGE_SIZE
+        clauses, params = self._filters(since, until, card_last4, card_fingerprint, status,
+                                         merchant_id)
+        order = "DESC" if newest_first else "ASC"
+        after = "<" if newest_first else ">"
+
+        last = None
+        while True:
+            page_clauses, page_params = list(clauses), list(params)
+            if last is not None:
+                page_clauses.append(f"(timestamp, id) {after} (?, ?)")
+                page_params.extend(last)
+            where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+            sql = (f"SELECT id, timestamp, record FROM transactions {where} "
+                   f"ORDER BY timestamp {order}, id {order} LIMIT ?")
+            with self.lock:
+                rows = self.conn.execute(sql, page_params + [page_size]).fetchall()
+            if not rows:
+                return
+            yield [json.loads(row['record']) for row in rows]
+            if len(rows) < page_size:
+                return
+            last = (rows[-1]['timestamp'], rows[-1]['id'])
+
+    def count(self, since=None, until=None, card_last4: str = None, card_fingerprint: str = None,
+              status: str = None, merchant_id: str = None) -> int:
+        clauses, params = self._filters(since, until, card_last4, card_fingerprint, status,
+                                        merchant_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM transactions {where}", params).fetchone()[0]
+
+    def summary(self, since=None, until=None, merchant_id: str = None) -> list:
+        """Transaction count and amount per (status, merchant) - the basis of reports"""
+        self.sync()
+        clauses, params = self._filters(since, until, None, None, None, merchant_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT status, merchant_id, COUNT(*) AS count, SUM(amount) AS amount "
+                f"FROM transactions {where} GROUP BY status, merchant_id "
+                f"ORDER BY status, merchant_id", params).fetchall()
+        return [dict(row) for row in rows]
+    
+    def find(self, transaction_id: str):
+        """
+        The most recent record for a transaction id, or None. Reads the
+        index as it stands and scans only the log tail it has not caught up
+        with, so a lookup on the authorization path never indexes a backlog.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT record FROM transactions WHERE transaction_id = ? "
+                                    "ORDER BY id DESC LIMIT 1", (transaction_id,)).fetchone()
+            position = self._position()
+        found = json.loads(row['record']) if row else None
+        for record in self.history_log.iter_records(position):
+            if record.get('transaction_id') == transaction_id:
+                found = record
+        return found
+
+    def known_ids(self, transaction_ids) -> set:
+        """The subset of these transaction ids that is already indexed (one sync)"""
+        transaction_ids = list(transaction_ids)
+        self.sync()
+        known = set()
+        with self.lock:
+            for i in range(0, len(transaction_ids), 500):
+                chunk = transaction_ids[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT transaction_id FROM transactions WHERE transaction_id IN "
+                    f"({','.join('?' * len(chunk))})", chunk).fetchall()
+                known.update(row[0] for row in rows)
+        return known
+    
+    def transaction_ids(self, since=None):
+        """Every indexed transaction id at or after `since`"""
+        self.sync()
+        clauses, params = self._filters(since, None, None, None, None, None)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock:
+            rows = self.conn.execute(f"SELECT transaction_id FROM transactions {where}", params).fetchall()
+        return [row[0] for row in rows if row[0]]
+
+    def rebuild(self) -> int:
+        """Drop the index and re-read the whole log"""
+        with self._sync_lock, self.lock, self.conn:
+            self.conn.execute("DELETE FROM transactions")
+            self.conn.execute("DELETE FROM log_position")
+        return self.sync()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the bank's transaction history")
+    parser.add_argument("--since", help="ISO timestamp (inclusive)")
+    parser.add_argument("--until", help="ISO timestamp (exclusive)")
+    parser.add_argument("--last-hours", type=float, help="shortcut for --since now-N hours")
+    parser.add_argument("--last4", help="card number ending")
+    parser.add_argument("--card", help="full card number (matched by fingerprint)")
+    parser.add_argument("--status", help="APPROVED, DECLINED, FRAUD or ERROR")
+    parser.add_argument("--merchant", help="merchant id")
+    parser.add_argument("--limit", type=int, default=50, help="stop after this many rows (0 = all)")
+    parser.add_argument("--count", action="store_true", help="only print the number of matches")
+    parser.add_argument("--rebuild", action="store_true", help="re-index the whole history log")
+    args = parser.parse_args()
+
+    store = HistoryStore()
+    if args.rebuild:
+        print(f"🔁 Re-indexed {store.rebuild()} transactions")
+
+    fingerprint = None
+    if args.card:
+        from shared.encryption import EncryptionManager
+        fingerprint = EncryptionManager().fingerprint(args.card)
+    since = args.since
+    if args.last_hours:
+        since = datetime.now() - timedelta(hours=args.last_hours)
+    filters = dict(since=since, until=args.until, card_last4=args.last4,
+                   card_fingerprint=fingerprint, status=args.status and args.status.upper(),
+                   merchant_id=args.merchant)
+
+    if args.count:
+        store.sync()
+        print(store.count(**filters))
+        return
+
+    shown = 0
+    for page in store.query(sync=True, **filters):
+        for record in page:
+            print(f"{record['timestamp'][:19]}  {record['transaction_id'][:8]}  "
+                  f"****{record.get('card_last4', '????')}  {record.get('amount', 0):>10.2f}  "
+                  f"{record['status']:<9} {record.get('merchant_id') or '-':<12} {record.get('reason', '')}")
+            shown += 1
+            if args.limit and shown >= args.limit:
+                return
+    if not shown:
+        print("No matching transactions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Duplicate-transaction cache
+Remembers the response given for each recent transaction_id so a replayed
+request (client retry, hedged request) gets the original answer instead of
+a second debit.
+
+Lookups go: bounded LRU of recent responses -> Bloom filter of every id
+seen in the window -> optional durable lookup (the history index). The
+Bloom filter answers "definitely new" for the common case, so the durable
+lookup only runs for real duplicates older than the LRU (or the rare
+false positive).
+"""
+import threading
+from collections import OrderedDict
+
+from shared.bloom import BloomFilter
+from shared.metrics import metrics
+
+
+class IdempotencyCache:
+    def __init__(self, capacity: int = 10_000, bloom_capacity: int = 1_000_000,
+                 bloom_error_rate: float = 0.001, fallback=None):
+        self.capacity = capacity
+        self.fallback = fallback  # callable(transaction_id) -> response dict or None
+        self.responses = OrderedDict()  # transaction_id -> {'response', 'encrypted'}
+        self.lock = threading.Lock()
+
+        # Two generations: when the current filter is full it becomes the
+        # previous one, so memory and false-positive rate stay bounded
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.current = BloomFilter(bloom_capacity, bloom_error_rate)
+        self.previous = None
+
+        self.hits = metrics.counter('idempotency_lookups_total', {'result': 'hit'})
+        self.durable_hits = metrics.counter('idempotency_lookups_total', {'result': 'durable_hit'})
+        self.misses = metrics.counter('idempotency_lookups_total', {'result': 'miss'})
+        self.false_positives = metrics.counter('idempotency_lookups_total',
+                                               {'result': 'bloom_false_positive'})
+
+    def _seen(self, transaction_id: str) -> bool:
+        return transaction_id in self.current or (self.previous is not None and
+                                                  transaction_id in self.previous)
+
+    def _remember_id(self, transaction_id: str):
+        if self.current.count >= self.bloom_capacity:
+            self.previous = self.current
+            self.current = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+        self.current.add(transaction_id)
+
+    def get(self, transaction_id: str):
+        """The cache entry for a transaction already answered, or None"""
+        if not transaction_id:
+            return None
+        with self.lock:
+            entry = self.responses.get(transaction_id)
+            if entry is not None:
+                self.responses.move_to_end(transaction_id)
+                self.hits.inc()
+                return entry
+            seen = self._seen(transaction_id)
+        if not seen:
+            self.misses.inc()
+            return None
+
+        response = self.fallback(transaction_id) if self.fallback else None
+        if response is None:
+            self.false_positives.inc()
+            return None
+        self.durable_hits.inc()
+        return self.put(transaction_id, response)
+
+    def peek(self, transaction_id: str):
+        """LRU-only lookup, without metrics or the durable fallback"""
+        with self.lock:
+            return self.responses.get(transaction_id)
+
+    def put(self, transaction_id: str, response: dict, encrypted: str = None) -> dict:
+        entry = {'response': response, 'encrypted': encrypted}
+        with self.lock:
+            self.responses[transaction_id] = entry
+            self.responses.move_to_end(transaction_id)
+            if len(self.responses) > self.capacity:
+                self.responses.popitem(last=False)
+            if not self._seen(transaction_id):
+                self._remember_id(transaction_id)
+        return entry
+
+    def seed(self, transaction_ids):
+        """Mark ids as seen (e.g. from the history index at startup)"""
+        with self.lock:
+            for transaction_id in transaction_ids:
+                self._remember_id(transaction_id)
+
+    def export_state(self) -> dict:
+        """Copy of the cached responses and Bloom filters, for a checkpoint"""
+        with self.lock:
+            return {
+                'responses': [[transaction_id, entry['response'], entry['encrypted']]
+                              for transaction_id, entry in self.responses.items()],
+                'current_count': self.current.count,
+                'previous_count': self.previous.count if self.previous is not None else None,
+                'current_bits': bytes(self.current.bits),
+                'previous_bits': bytes(self.previous.bits) if self.previous is not None else None
+            }
+
+    def restore_state(self, responses: list, current_bits, current_count: int,
+                      previous_bits=None, previous_count: int = None):
+        """Reload what export_state saved; raises ValueError if the filter size changed"""
+        with self.lock:
+            current = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+            current.load_bits(current_bits, current_count)
+            previous = None
+            if previous_bits is not None:
+                previous = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+                previous.load_bits(previous_bits, previous_count)
+            self.current, self.previous = current, previous
+            self.responses.clear()
+            for transaction_id, response, encrypted in responses[-self.capacity:]:
+                self.responses[transaction_id] = {'response': response, 'encrypted': encrypted}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'cached_responses': len(self.responses),
+                'bloom': self.current.stats(),
+                'previous_bloom_items': len(self.previous) if self.previous else 0
+            }
@@ -0,0 +1,95 @@
+"""
+Primary lease
+Exactly one bank process may consume a bus directory. The primary records
+itself in <COMM_DIR>/primary.json when it starts. A second bank, whether an
+old primary that was restarted or a replica being promoted, may only take
+over once the recorded process is gone.
+
+The lease itself is an exclusive flock on <COMM_DIR>/primary.lock, taken
+without blocking and held for the life of the process, so two banks
+starting together cannot both pass the check. The kernel releases it when
+the holder exits, however it exits. primary.json only describes the holder.
+"""
+import json
+import os
+import time
+
+try:
+    import fcntl  # POSIX only; elsewhere the recorded pid is the only check
+except ImportError:
+    fcntl = None
+
+from shared.config import Config
+
+_held = {}  # Lock file -> open handle holding its flock until this process exits
+
+
+class LeaseHeldError(RuntimeError):
+    """Another live bank process is primary on this bus"""
+
+
+def lease_file() -> str:
+    return os.path.join(Config.COMM_DIR, "primary.json")
+
+
+def lock_file() -> str:
+    return os.path.join(Config.COMM_DIR, "primary.lock")
+
+
+def read_lease():
+    try:
+        with open(lease_file(), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by someone else
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"  # Killed, not yet reaped
+    except (OSError, IndexError):
+        return True
+
+
+def holder_alive(lease: dict = None) -> bool:
+    """True if the lease is held by a running process other than this one"""
+    lease = lease if lease is not None else read_lease()
+    return bool(lease) and lease.get('pid') != os.getpid() and process_alive(lease['pid'])
+
+
+def claim_primary(data_dir: str = None) -> dict:
+    """Record this process as primary; raises LeaseHeldError while another primary runs"""
+    os.makedirs(Config.COMM_DIR, exist_ok=True)
+    path = os.path.abspath(lock_file())
+    if fcntl is not None and path not in _held:
+        handle = open(path, "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            lease = read_lease() or {}
+            raise LeaseHeldError(f"Bank pid {lease.get('pid', '?')} ({lease.get('data_dir')}) is "
+                                 f"already primary on {Config.COMM_DIR}")
+        _held[path] = handle
+    lease = read_lease()
+    if fcntl is None and holder_alive(lease):
+        raise LeaseHeldError(f"Bank pid {lease['pid']} ({lease.get('data_dir')}) is already "
+                             f"primary on {Config.COMM_DIR}")
+    lease = {
+        'pid': os.getpid(),
+        'data_dir': data_dir or Config.BANK_DATA_DIR,
+        'epoch': (lease or {}).get('epoch', 0) + 1,
+        'since': time.time()
+    }
+    temp = f"{lease_file()}.{os.getpid()}.tmp"
+    with open(temp, "w") as f:
+        json.dump(lease, f)
+    os.replace(temp, lease_file())
+    return lease
@@ -0,0 +1,467 @@
+"""
+Hot-standby bank replica
+Follows the primary's ledger (see TransactionManager.replicate; start the
+primary with --ledger) and applies every change to its own copy of the
+cards and of the transaction history in REPLICA_DATA_DIR. The replica
+answers read-only queries (balances, history, reports) over a small
+JSON/HTTP API, so they never load the primary.
+
+Promotion (POST /promote, or automatic once the primary's process has been
+gone for --auto-promote-after seconds) applies the rest of the ledger and
+starts a BankService on the replica's data and the primary's bus. The vendor
+keeps sending to the same bus, so payments resume as soon as it is up.
+
+A new replica starts from a copy of the primary's cards (the saved store
+plus the primary's card journal) and history, taken after noting where the
+ledger ends. Ledger entries carry absolute balances,
+so replaying entries the copy already contains is harmless; their history
+records are skipped when the history already has them.
+
+The ledger is read from the primary's data directory. On separate hosts
+that directory must be on shared or replicated storage.
+
+    python bank/bank_replica.py --primary-data bank/data --auto-promote-after 3
+"""
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from shared.config import Config
+from shared.metrics import metrics
+from shared.rotating_log import RotatingLog
+from bank.card_table import CardTable, replay_cards_journal
+from bank.history_store import HistoryStore
+from bank.rollups import Rollups
+from bank.primary_lease import LeaseHeldError, read_lease, holder_alive, process_alive
+
+APPLY_BATCH = 5000  # Ledger entries applied per lock hold
+
+
+class BankReplica:
+    """
+    Applies the primary's ledger in a background thread. The cards and the
+    ledger position are checkpointed together every REPLICA_CHECKPOINT_SECONDS,
+    so a restarted replica resumes where its saved cards left off.
+    """
+
+    def __init__(self, primary_dir: str = None, data_dir: str = None, workers: int = None,
+                 auto_promote_after: float = 0):
+        self.primary_dir = primary_dir or Config.BANK_DATA_DIR
+        self.data_dir = data_dir or Config.REPLICA_DATA_DIR
+        self.workers = workers or Config.BANK_WORKERS
+        self.auto_promote_after = auto_promote_after
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.cards_file = os.path.join(self.data_dir, "valid_cards.json")
+        self.state_file = os.path.join(self.data_dir, "replica.json")
+
+        self.source = RotatingLog(os.path.join(self.primary_dir, "ledger"), "ledger", read_only=True)
+        self.history_log = RotatingLog(os.path.join(self.data_dir, "history"), "transactions",
+                                       max_bytes=Config.HISTORY_MAX_BYTES,
+                                       rotate_seconds=Config.HISTORY_ROTATE_SECONDS,
+                                       compress=Config.HISTORY_COMPRESS)
+        self.history = HistoryStore(self.history_log, os.path.join(self.data_dir, "history.db"))
+        self.rollups = Rollups(os.path.join(self.data_dir, "rollups.bin"))  # Saved with the cards
+
+        self.role = 'replica'
+        self.service = None  # BankService once promoted
+        self.lock = threading.RLock()  # Cards and ledger position
+        self._promote_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._follower = None
+        self._checkpoint_at = time.monotonic()
+        self._primary_gone_at = None
+
+        # Metrics
+        self.lag_seconds = 0.0
+        metrics.gauge('replication_lag_seconds').set_function(lambda: round(self.lag_seconds, 3))
+        metrics.gauge('replication_lag_bytes').set_function(self.lag_bytes)
+        metrics.gauge('replica_is_primary').set_function(lambda: int(self.role == 'primary'))
+        self.apply_latency = metrics.histogram('replication_apply_us')
+
+        state = self._load_state()
+        if state is None:
+            self._bootstrap()
+        else:
+            self.position = tuple(state['position']) if state['position'] else None
+            self.valid_cards = self._load_cards(self.cards_file)
+            self.rollups.catch_up(self.history_log)
+            print(f"🪞 Replica resumed: {len(self.valid_cards)} cards, ledger position {self.position}")
+        # Anything the ledger holds from before now may already be in our history
+        self.dedupe_until = time.time()
+
+    # --- state ---
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _load_cards(path: str, attempts: int = 20):
+        """Load a valid_cards.json, retrying while a primary rewrites it"""
+        for attempt in range(attempts):
+            try:
+                if Config.CARD_TABLE:
+                    return CardTable.load(path)
+                with open(path, "r") as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                return CardTable() if Config.CARD_TABLE else {}
+            except ValueError:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(0.05)
+
+    def _copy_cards(self, path: str):
+        """
+        The primary's saved cards with its card journal applied: the store
+        is only rewritten every CARDS_SAVE_SECONDS, and the ledger is followed
+        from now on. Retried if the primary saved its store meanwhile (the
+        journal we read may then have been started after our copy).
+        """
+        while True:
+            before = self._file_version(path)
+            valid_cards = self._load_cards(path)
+            replayed = replay_cards_journal(path + ".journal", valid_cards)
+            if self._file_version(path) == before:
+                if replayed:
+                    print(f"🪞 Applied {replayed} journaled card changes of the primary")
+                return valid_cards
+
+    @staticmethod
+    def _file_version(path: str):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _ledger_end(self):
+        """Position after the last complete ledger entry (None: no ledger yet)"""
+        segments = self.source.segments()
+        if not segments:
+            return None
+        position = (segments[-1][0], 0)
+        for position, _ in self.source.iter_raw_with_positions(position):
+            pass
+        return position
+
+    def _bootstrap(self):
+        """Copy the primary's cards and history; the ledger is followed from before the copy"""
+        started = time.perf_counter()
+        self.position = self._ledger_end()
+        self.valid_cards = self._copy_cards(os.path.join(self.primary_dir, "valid_cards.json"))
+        primary_history = RotatingLog(os.path.join(self.primary_dir, "history"), "transactions",
+                                      read_only=True)
+        copied = 0
+        batch = []
+        for record in primary_history.iter_records():
+            batch.append(record)
+            if len(batch) >= APPLY_BATCH:
+                self.history_log.append_many(batch)
+                self.rollups.add_many(batch)
+                copied += len(batch)
+                batch = []
+        self.history_log.append_many(batch)
+        self.rollups.add_many(batch)
+        copied += len(batch)
+        self.checkpoint()
+        print(f"🪞 Replica bootstrapped from {self.primary_dir}: {len(self.valid_cards)} cards, "
+              f"{copied} history records ({time.perf_counter() - started:.1f}s)")
+
+    def checkpoint(self):
+        """Save cards, then the ledger position they include"""
+        with self.lock:
+            if isinstance(self.valid_cards, CardTable):
+                self.valid_cards.save(self.cards_file)
+            else:
+                temp = self.cards_file + ".tmp"
+                with open(temp, "w") as f:
+                    json.dump(self.valid_cards, f, indent=2)
+                os.replace(temp, self.cards_file)
+            self.history_log.flush()
+            self.rollups.save(self.history_log.position())
+            state = {'primary_dir': self.primary_dir, 'position': self.position,
+                     'saved_at': datetime.now().isoformat()}
+            temp = self.state_file + ".tmp"
+            with open(temp, "w") as f:
+                json.dump(state, f)
+            os.replace(temp, self.state_file)
+        self.history.sync()  # Keep the index warm for queries and promotion
+        self._checkpoint_at = time.monotonic()
+
+    # --- applying the ledger ---
+
+    def _apply(self, entry: dict):
+        op = entry.get('op')
+        card_number = entry.get('card')
+        if op == 'transaction':
+            if entry.get('balance') is not None and card_number in self.valid_cards:
+                self.valid_cards[card_number]['balance'] = entry['balance']
+        elif op == 'card':
+            self.valid_cards[card_number] = entry['info']
+        elif op == 'remove':
+            if card_number in self.valid_cards:
+                del self.valid_cards[card_number]
+        metrics.counter('replication_applied_total', {'op': op or 'unknown'}).inc()
+
+    def catch_up(self) -> int:
+        """Apply up to APPLY_BATCH new ledger entries; returns how many"""
+        with self.lock:
+            entries = []
+            for position, entry in self.source.iter_with_positions(self.position):
+                entries.append((position, entry))
+                if len(entries) >= APPLY_BATCH:
+                    break
+            if not entries:
+                self.lag_seconds = 0.0
+                return 0
+            started = time.perf_counter_ns()
+
+            transactions = [entry for _, entry in entries if entry.get('op') == 'transaction']
+            records = [entry['record'] for entry in transactions]
+            replayed = [entry['record'].get('transaction_id') for entry in transactions
+                        if entry.get('ts', 0) <= self.dedupe_until]
+            if replayed:
+                known = self.history.known_ids(replayed)
+                records = [record for record in records if record.get('transaction_id') not in known]
+
+            for _, entry in entries:
+                self._apply(entry)
+            self.history_log.append_many(records)
+            self.rollups.add_many(records)
+            self.position = entries[-1][0]
+            self.apply_latency.record((time.perf_counter_ns() - started) // 1000)
+            self.lag_seconds = max(0.0, time.time() - entries[-1][1].get('ts', time.time()))
+            return len(entries)
+
+    def lag_bytes(self) -> int:
+        """Ledger bytes written by the primary and not yet applied here"""
+        position = self.position or (0, 0)
+        behind = 0
+        for seq, path in self.source.segments():
+            if seq < position[0]:
+                continue
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            behind += max(0, size - position[1]) if seq == position[0] else size
+        return behind
+
+    def _follow_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                applied = self.catch_up()
+                if time.monotonic() - self._checkpoint_at >= Config.REPLICA_CHECKPOINT_SECONDS:
+                    self.checkpoint()
+                if self.auto_promote_after and self._primary_gone_for() >= self.auto_promote_after:
+                    print(f"⚠️  Primary gone for {self.auto_promote_after:g}s - promoting")
+                    self.promote()
+                    return
+                if not applied:
+                    self._stop_event.wait(Config.REPLICA_POLL_INTERVAL)
+            except Exception as e:
+                print(f"❌ Replication error: {e}")
+                self._stop_event.wait(1)
+
+    def _primary_gone_for(self) -> float:
+        """Seconds since the primary's process was last seen (0 while it runs or has no lease)"""
+        lease = read_lease()
+        if not lease or process_alive(lease['pid']):
+            self._primary_gone_at = None
+            return 0.0
+        if self._primary_gone_at is None:
+            self._primary_gone_at = time.monotonic()
+        return time.monotonic() - self._primary_gone_at
+
+    # --- lifecycle ---
+
+    def start(self):
+        self._stop_event.clear()
+        self._follower = threading.Thread(target=self._follow_loop, name="replica-follow", daemon=True)
+        self._follower.start()
+        print(f"🪞 Following {self.source.directory} into {self.data_dir}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._follower and self._follower is not threading.current_thread():
+            self._follower.join(10)
+        if self.service is not None:
+            self.service.stop()
+            return
+        self.checkpoint()
+        self.history_log.close()
+        self.history.close()
+
+    def promote(self) -> float:
+        """
+        Become the primary: apply the rest of the ledger and start a
+        BankService on this data. Returns the seconds it took. Raises
+        LeaseHeldError while the old primary's process is still running.
+        """
+        from bank.bank_service import BankService
+        from bank.transaction_manager import TransactionManager
+
+        with self._promote_lock:
+            if self.role == 'primary':
+                return 0.0
+            if holder_alive():
+                raise LeaseHeldError(f"Primary pid {read_lease()['pid']} is still running - "
+                                     f"stop it before promoting")
+            started = time.perf_counter()
+            self._stop_event.set()
+            if self._follower and self._follower is not threading.current_thread():
+                self._follower.join(10)
+            while self.catch_up():
+                pass
+            self.checkpoint()
+            self.history_log.close()
+            self.history.close()
+
+            Config.BANK_DATA_DIR = self.data_dir
+            Config.HISTORY_DIR = os.path.join(self.data_dir, "history")
+            Config.HISTORY_DB = os.path.join(self.data_dir, "history.db")
+            Config.SETTLEMENT_DIR = os.path.join(self.data_dir, "settlement")
+            Config.LEDGER_DIR = os.path.join(self.data_dir, "ledger")
+            manager = TransactionManager(valid_cards=self.valid_cards)
+            self.service = BankService(self.workers, transaction_manager=manager)
+            self.service.add_observer(lambda event, data: print(data) if event == 'log' else None)
+            self.service.start()
+            self.history = manager.history_store
+            self.role = 'primary'
+            self.lag_seconds = 0.0
+            elapsed = time.perf_counter() - started
+            print(f"👑 Replica promoted to primary in {elapsed:.2f}s ({len(self.valid_cards)} cards)")
+            return elapsed
+
+    # --- read-only queries ---
+
+    def balance(self, card_number: str):
+        card = self.valid_cards.get(card_number)
+        if card is None:
+            return None
+        return {'card_last4': card_number[-4:], 'expiry': card['expiry'], 'balance': card['balance']}
+
+    def status(self) -> dict:
+        return {
+            'role': self.role,
+            'primary_dir': self.primary_dir,
+            'data_dir': self.data_dir,
+            'cards': len(self.valid_cards),
+            'ledger_position': self.position,
+            'lag_seconds': round(self.lag_seconds, 3),
+            'lag_bytes': self.lag_bytes() if self.role == 'replica' else 0,
+            'primary_lease': read_lease()
+        }
+
+    def run_forever(self, host: str = None, port: int = None):
+        """Follow (and serve queries) until SIGINT/SIGTERM"""
+        def _handle_signal(signum, frame):
+            print(f"\n🛑 Received signal {signum}, shutting down...")
+            done.set()
+
+        done = threading.Event()
+        signal.signal(signal.SIGINT, _handle_signal)
+        signal.signal(signal.SIGTERM, _handle_signal)
+
+        server = ThreadingHTTPServer((host or Config.REPLICA_API_HOST,
+                                      Config.REPLICA_API_PORT if port is None else port),
+                                     self._make_handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="replica-api", daemon=True).start()
+        print(f"🌐 Replica API listening on http://{server.server_address[0]}:{server.server_port}")
+
+        self.start()
+        while not done.is_set():
+            done.wait(1)
+        server.shutdown()
+        server.server_close()
+        self.stop()
+
+    def _make_handler(self):
+        replica = self
+
+        class ReplicaAPIHandler(BaseHTTPRequestHandler):
+            def _send_json(self, code: int, body):
+                data = json.dumps(body, default=str).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                try:
+                    if url.path == "/status":
+                        self._send_json(200, replica.status())
+                    elif url.path == "/balance":
+                        balance = replica.balance(query.get('card', ''))
+                        self._send_json(200 if balance else 404, balance or {'error': 'Card not found'})
+                    elif url.path == "/history":
+                        limit = int(query.get('limit', Config.HISTORY_PAGE_SIZE))
+                        records = []
+                        for page in replica.history.query(
+                                since=query.get('since'), until=query.get('until'),
+                                card_last4=query.get('last4'), status=query.get('status'),
+                                merchant_id=query.get('merchant'), page_size=limit):
+                            records.extend(page)
+                            if len(records) >= limit:
+                                break
+                        self._send_json(200, {'transactions': records[:limit]})
+                    elif url.path == "/report":
+                        self._send_json(200, {'since': query.get('since'), 'until': query.get('until'),
+                                              'rows': replica.history.summary(
+                                                  query.get('since'), query.get('until'),
+                                                  query.get('merchant'))})
+                    elif url.path == "/rollups":
+                        # After promotion the service's manager keeps the rollups
+                        rollups = (replica.service.transaction_manager.rollups if replica.service
+                                   else replica.rollups)
+                        window = dict(dimension=query.get('by', 'all'), since=query.get('since'),
+                                      until=query.get('until'))
+                        try:
+                            if 'totals' in query:
+                                self._send_json(200, {'totals': rollups.totals(
+                                    resolution=query.get('resolution'), **window)})
+                            else:
+                                self._send_json(200, {'rows': rollups.query(
+                                    query.get('resolution', 'hour'), value=query.get('value'),
+                                    status=query.get('status'), **window)})
+                        except ValueError as e:
+                            self._send_json(400, {'error': str(e)})
+                    elif url.path == "/metrics":
+                        data = metrics.to_text().encode()
+                        self.send_response(200)
+                        self.send_header("Content-Type", "text/plain")
+                        self.send_header("Content-Length", str(len(data)))
+                        self.end_headers()
+                        self.wfile.write(data)
+                    else:
+                        self._send_json(404, {'error': 'Not found'})
+                except Exception as e:
+                    self._send_json(500, {'error': str(e)})
+
+            def do_POST(self):
+                if self.path != "/promote":
+                    self._send_json(404, {'error': 'Not found'})
+                    return
+                try:
+                    seconds = replica.promote()
+                    self._send_json(200, {'role': replica.role, 'seconds': round(seconds, 3)})
+                except LeaseHeldError as e:
+                    self._send_json(409, {'error': str(e)})
+
+            def log_message(self, format, *args):
+                pass  # Keep the console for replication output
+
+        return ReplicaAPIHandler
@@ -0,0 +1,342 @@
+"""
+Reporting rollups
+Per-minute, per-hour and per-day buckets of transaction counts and amounts,
+updated as each transaction is recorded (a few dict updates, whatever the
+size of the history). Inside a bucket, counts are kept per status for every
+merchant, card BIN and reason, plus a total over all transactions.
+Approvals per hour, fraud rate per BIN or volume per merchant therefore come
+from at most a few thousand buckets instead of a scan of the history log.
+
+A bucket is named after the timestamp prefix it covers ("2024-01-31T14:05",
+"2024-01-31T14", "2024-01-31"), so buckets follow the bank's local time like
+the history and the settlement days do. Buckets older than
+ROLLUP_RETENTION_DAYS for their resolution are dropped.
+
+The rollups are saved (shared.checkpoint format) together with the history
+log position they include. At startup the file is loaded and the history
+written after that position is replayed. Without a file, the whole history
+is replayed once. Buckets that did not change since the previous save are
+not encoded again.
+
+    python -m bank.rollups --resolution hour --last-hours 24         # all transactions, per status
+    python -m bank.rollups --by bin --totals --last-hours 168        # fraud rate per BIN
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from shared.config import Config
+from shared.metrics import metrics
+from shared.rotating_log import RotatingLog
+from shared.checkpoint import read_checkpoint, write_checkpoint
+
+RESOLUTIONS = {'minute': 16, 'hour': 13, 'day': 10}  # Bucket name = this much of the timestamp
+DIMENSIONS = ('all', 'merchant', 'bin', 'reason')
+
+
+def _timestamp(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _minor_units(amount) -> int:
+    try:
+        return int(round(float(amount) * 100))
+    except (TypeError, ValueError):
+        return 0
+
+
+class Rollups:
+    """
+    Buckets per resolution: {bucket name: {dimension: {(value, status): (count, cents)}}}
+    Thread-safe; add() is called with the transaction manager's lock held.
+    """
+
+    def __init__(self, path: str, retention_days: dict = None):
+        self.path = path
+        self.retention_days = retention_days or Config.ROLLUP_RETENTION_DAYS
+        self.buckets = {resolution: {} for resolution in RESOLUTIONS}
+        self.lock = threading.Lock()
+        self._dirty = {resolution: set() for resolution in RESOLUTIONS}
+        self._encoded = {resolution: {} for resolution in RESOLUTIONS}  # Saving thread only
+        self._newest_minute = ""
+        self._cutoffs = self._retention_cutoffs()
+
+        for resolution in RESOLUTIONS:
+            metrics.gauge('rollup_buckets', {'resolution': resolution}).set_function(
+                lambda resolution=resolution: len(self.buckets[resolution]))
+        self.query_latency = metrics.histogram('rollup_query_us')
+
+    def _retention_cutoffs(self) -> dict:
+        """Oldest bucket name kept per resolution"""
+        now = datetime.now()
+        return {resolution: (now - timedelta(days=self.retention_days[resolution]))
+                .isoformat()[:length] for resolution, length in RESOLUTIONS.items()}
+
+    def _expire(self):
+        """Drop the buckets that left the retention window (caller holds lock)"""
+        cutoffs = self._retention_cutoffs()
+        if cutoffs == self._cutoffs:
+            return
+        self._cutoffs = cutoffs
+        for resolution, buckets in self.buckets.items():
+            for name in [name for name in buckets if name < cutoffs[resolution]]:
+                del buckets[name]
+
+    # --- updates ---
+
+    def add(self, record: dict):
+        """Count one history record in every resolution"""
+        timestamp = record.get('timestamp')
+        if not timestamp:
+            return
+        status = record.get('status') or 'UNKNOWN'
+        cents = _minor_units(record.get('amount'))
+        entries = [('all', '')]
+        for dimension, field in (('merchant', 'merchant_id'), ('bin', 'card_bin'),
+                                 ('reason', 'reason')):
+            if record.get(field):
+                entries.append((dimension, record[field]))
+
+        with self.lock:
+            for resolution, length in RESOLUTIONS.items():
+                name = timestamp[:length]
+                buckets = self.buckets[resolution]
+                bucket = buckets.get(name)
+                if bucket is None:
+                    if name < self._cutoffs[resolution]:
+                        continue  # Replayed record older than the retention
+                    if resolution == 'minute' and name > self._newest_minute:
+                        # About once a minute: move the retention window on
+                        self._newest_minute = name
+                        self._expire()
+                    bucket = buckets[name] = {dimension: {} for dimension in DIMENSIONS}
+                for dimension, value in entries:
+                    counts = bucket[dimension]
+                    key = (value, status)
+                    count, total = counts.get(key, (0, 0))
+                    counts[key] = (count + 1, total + cents)
+                self._dirty[resolution].add(name)
+
+    def add_many(self, records) -> int:
+        count = 0
+        for record in records:
+            self.add(record)
+            count += 1
+        return count
+
+    # --- queries ---
+
+    def _select(self, resolution: str, dimension: str, first: str, last) -> list:
+        """(bucket name, entries of one dimension) for first <= name < last, in order"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution!r} (one of {', '.join(RESOLUTIONS)})")
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension {dimension!r} (one of {', '.join(DIMENSIONS)})")
+        with self.lock:
+            selected = [(name, list(bucket[dimension].items()))
+                        for name, bucket in self.buckets[resolution].items()
+                        if name >= first and (last is None or name < last)]
+        selected.sort()
+        return selected
+
+    def query(self, resolution: str = 'hour', dimension: str = 'all', since=None, until=None,
+              value: str = None, status: str = None) -> list:
+        """
+        Chart series: {'bucket', 'value', 'status', 'count', 'amount'} rows in
+        bucket order. since/until are rounded down to the resolution; the
+        bucket holding `until` is excluded.
+        """
+        length = RESOLUTIONS.get(resolution, 0)
+        first = _timestamp(since)[:length] if since is not None else ""
+        last = _timestamp(until)[:length] if until is not None else None
+        with self.query_latency.time():
+            rows = []
+            for name, entries in self._select(resolution, dimension, first, last):
+                for (row_value, row_status), (count, cents) in sorted(entries):
+                    if ((value is not None and row_value != value) or
+                            (status is not None and row_status != status)):
+                        continue
+                    rows.append({'bucket': name, 'value': row_value, 'status': row_status,
+                                 'count': count, 'amount': cents / 100})
+            return rows
+
+    @staticmethod
+    def _spans(since, until) -> list:
+        """
+        (resolution, first, last) ranges covering [since, until): day buckets
+        for whole days, hour buckets for the partial days at either end
+        """
+        start = _timestamp(since) if since is not None else ""
+        end = _timestamp(until) if until is not None else None
+        first_day = start[:10]
+        if start[10:].strip("T:0."):  # since is not a midnight: its day starts with hours
+            first_day = (datetime.fromisoformat(start[:10]) + timedelta(days=1)).isoformat()[:10]
+        last_day = end[:10] if end is not None else None
+        if last_day is not None and last_day < first_day:
+            return [('hour', start[:13], end[:13])]  # Within one day
+        spans = [('hour', start[:13], first_day), ('day', first_day, last_day)]
+        if end is not None:
+            spans.append(('hour', last_day, end[:13]))
+        return spans
+
+    def totals(self, dimension: str = 'all', since=None, until=None,
+               resolution: str = None) -> dict:
+        """
+        Report table: per value, the transaction count and amount, counts and
+        amounts per status, and approval and fraud rates. since/until are
+        rounded down to the hour (or to `resolution`, if given). FRAUD is its
+        own status here (TransactionManager.statistics also counts it as declined).
+        """
+        if resolution is None:
+            spans = self._spans(since, until)
+        else:
+            length = RESOLUTIONS.get(resolution, 0)
+            spans = [(resolution, _timestamp(since)[:length] if since is not None else "",
+                      _timestamp(until)[:length] if until is not None else None)]
+        with self.query_latency.time():
+            sums = {}  # value -> {status: [count, cents]}
+            for span_resolution, first, last in spans:
+                for _, entries in self._select(span_resolution, dimension, first, last):
+                    for (value, status), (count, cents) in entries:
+                        per_status = sums.setdefault(value, {}).setdefault(status, [0, 0])
+                        per_status[0] += count
+                        per_status[1] += cents
+
+            table = {}
+            for value, per_status in sums.items():
+                count = sum(counts[0] for counts in per_status.values())
+                table[value] = {
+                    'count': count,
+                    'amount': sum(counts[1] for counts in per_status.values()) / 100,
+                    'statuses': {status: {'count': counts[0], 'amount': counts[1] / 100}
+                                 for status, counts in sorted(per_status.items())},
+                    'approval_rate': round(per_status.get('APPROVED', (0,))[0] / count, 4),
+                    'fraud_rate': round(per_status.get('FRAUD', (0,))[0] / count, 4)
+                }
+            return table
+
+    # --- persistence ---
+
+    def take_changes(self):
+        """Copy the buckets changed since the last call, and the names still kept"""
+        with self.lock:
+            changed = {}
+            for resolution, buckets in self.buckets.items():
+                changed[resolution] = {
+                    name: {dimension: dict(counts) for dimension, counts in buckets[name].items()}
+                    for name in self._dirty[resolution] if name in buckets}
+                self._dirty[resolution].clear()
+            kept = {resolution: list(buckets) for resolution, buckets in self.buckets.items()}
+        return changed, kept
+
+    def sections(self, changes, history_position) -> dict:
+        """Checkpoint sections from take_changes(); re-encodes only the changed buckets"""
+        changed, kept = changes
+        sections = {'rollups': {'history_position': history_position,
+                                'saved': datetime.now().isoformat()}}
+        for resolution in RESOLUTIONS:
+            encoded = self._encoded[resolution]
+            for name, bucket in changed[resolution].items():
+                # Columns per dimension: load() rebuilds each dict with zip()
+                columns = {}
+                for dimension, counts in bucket.items():
+                    if counts:
+                        keys, totals = zip(*counts.items())
+                        columns[dimension] = [*zip(*keys), *zip(*totals)]
+                encoded[name] = json.dumps([name, columns], separators=(",", ":")).encode()
+            self._encoded[resolution] = encoded = {name: encoded[name] for name in kept[resolution]
+                                                   if name in encoded}
+            sections[resolution] = b"\n".join(encoded.values())
+        return sections
+
+    def save(self, history_position):
+        write_checkpoint(self.path, self.sections(self.take_changes(), history_position))
+
+    def load(self):
+        """Load the saved buckets; returns the history position they include (None: none saved)"""
+        sections = read_checkpoint(self.path)
+        if sections is None or 'rollups' not in sections:
+            return None
+        with self.lock:
+            for resolution in RESOLUTIONS:
+                buckets, encoded = {}, {}
+                cutoff = self._cutoffs[resolution]
+                for line in bytes(sections.get(resolution, b"")).splitlines():
+                    name, columns = json.loads(line)
+                    if name < cutoff:
+                        continue
+                    bucket = buckets[name] = {dimension: {} for dimension in DIMENSIONS}
+                    for dimension, (values, statuses, counts, cents) in columns.items():
+                        bucket[dimension] = dict(zip(zip(values, statuses), zip(counts, cents)))
+                    encoded[name] = line
+                self.buckets[resolution] = buckets
+                self._encoded[resolution] = encoded
+                self._dirty[resolution].clear()
+            if self.buckets['minute']:
+                self._newest_minute = max(self.buckets['minute'])
+        position = sections['rollups']['history_position']
+        return tuple(position) if position else None
+
+    def catch_up(self, history_log: RotatingLog) -> int:
+        """Load the saved rollups, then count the history recorded after them"""
+        started = time.perf_counter()
+        position = self.load()
+        replayed = self.add_many(history_log.iter_records(position))
+        print(f"📊 Rollups {'rebuilt from' if position is None else 'caught up with'} "
+              f"{replayed} transactions in {time.perf_counter() - started:.2f}s")
+        return replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report from the bank's rollups")
+    parser.add_argument("--by", choices=DIMENSIONS, default='all', help="group by")
+    parser.add_argument("--resolution", choices=list(RESOLUTIONS),
+                        help="bucket size (series default: hour; totals default: days plus hours)")
+    parser.add_argument("--since", help="ISO timestamp (inclusive)")
+    parser.add_argument("--until", help="ISO timestamp (exclusive)")
+    parser.add_argument("--last-hours", type=float, help="shortcut for --since now-N hours")
+    parser.add_argument("--value", help="only this merchant, BIN or reason")
+    parser.add_argument("--status", help="APPROVED, DECLINED or FRAUD")
+    parser.add_argument("--totals", action="store_true",
+                        help="one row per value with approval and fraud rates instead of a series")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    parser.add_argument("--data-dir", default=Config.BANK_DATA_DIR)
+    args = parser.parse_args()
+
+    # The running bank saves every CHECKPOINT_SECONDS; the history log has the rest
+    rollups = Rollups(os.path.join(args.data_dir, "rollups.bin"))
+    rollups.catch_up(RotatingLog(os.path.join(args.data_dir, "history"), "transactions",
+                                 read_only=True))
+    since = args.since
+    if args.last_hours:
+        since = datetime.now() - timedelta(hours=args.last_hours)
+
+    if args.totals:
+        table = rollups.totals(args.by, since, args.until, args.resolution)
+        if args.json:
+            print(json.dumps(table, indent=2))
+            return
+        for value, entry in sorted(table.items(), key=lambda item: -item[1]['count']):
+            print(f"{value or '(all)':<40} {entry['count']:>9} {entry['amount']:>14.2f}  "
+                  f"approved {entry['approval_rate']:6.1%}  fraud {entry['fraud_rate']:6.1%}")
+        if not table:
+            print("No transactions in range")
+        return
+
+    rows = rollups.query(args.resolution or 'hour', args.by, since, args.until, args.value,
+                         args.status and args.status.upper())
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    for row in rows:
+        print(f"{row['bucket']:<17} {row['value'] or '-':<40} {row['status']:<9} "
+              f"{row['count']:>9} {row['amount']:>14.2f}")
+    if not rows:
+        print("No transactions in range")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Weighted fair intake scheduling
+Requests are queued per merchant and served by deficit round-robin, so a
+merchant's share of the bank's workers follows its configured weight
+instead of its arrival rate. Interactive payment requests are served
+before bulk work; bulk keeps a small guaranteed share so it never starves.
+"""
+import queue
+import threading
+from collections import deque
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+
+class DeficitRoundRobin:
+    """Deficit round-robin across flows, every item costing one unit"""
+
+    def __init__(self, weights: dict = None, default_weight: float = 1.0):
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.queues = {}  # flow -> deque of items
+        self.deficit = {}
+        self.active = deque()  # Flows with queued items, in service order
+        self.turn_started = False  # Head of `active` has received its quantum
+        self.size = 0
+
+    def weight(self, flow) -> float:
+        return self.weights.get(flow, self.default_weight)
+
+    def push(self, flow, item):
+        flow_queue = self.queues.get(flow)
+        if flow_queue is None:
+            flow_queue = self.queues[flow] = deque()
+        if not flow_queue:
+            self.active.append(flow)
+            self.deficit[flow] = 0.0
+        flow_queue.append(item)
+        self.size += 1
+
+    def pop(self):
+        """Next item in fair order; IndexError when empty"""
+        if not self.size:
+            raise IndexError("pop from an empty scheduler")
+        while True:
+            flow = self.active[0]
+            if self.turn_started and self.deficit[flow] >= 1:
+                self.deficit[flow] -= 1
+                flow_queue = self.queues[flow]
+                item = flow_queue.popleft()
+                self.size -= 1
+                if not flow_queue:
+                    # An idle flow keeps no credit (standard DRR)
+                    self.active.popleft()
+                    del self.queues[flow], self.deficit[flow]
+                    self.turn_started = False
+                return item
+            if self.turn_started:
+                self.active.rotate(-1)  # Credit used up: the next flow's turn
+            self.deficit[self.active[0]] += self.weight(self.active[0])
+            self.turn_started = True
+
+    def depths(self) -> dict:
+        return {flow: len(flow_queue) for flow, flow_queue in self.queues.items()}
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class FairQueue:
+    """
+    Bounded, thread-safe drop-in for the bank's intake queue.Queue:
+    put_nowait raises queue.Full and get raises queue.Empty the same way.
+    """
+
+    def __init__(self, maxsize: int, weights: dict = None, default_weight: float = 1.0,
+                 bulk_share: float = 0.1):
+        self.maxsize = maxsize
+        self.classes = {
+            INTERACTIVE: DeficitRoundRobin(weights, default_weight),
+            BULK: DeficitRoundRobin(weights, default_weight)
+        }
+        self.bulk_every = max(1, round(1 / bulk_share)) if bulk_share > 0 else None
+        self.served = 0
+        self.condition = threading.Condition()
+
+    def put_nowait(self, item, merchant_id=None, traffic_class: str = INTERACTIVE):
+        with self.condition:
+            if self.maxsize and self.qsize() >= self.maxsize:
+                raise queue.Full
+            self.classes[traffic_class].push(merchant_id, item)
+            self.condition.notify()
+
+    def _next_class(self) -> str:
+        interactive, bulk = self.classes[INTERACTIVE], self.classes[BULK]
+        if not bulk:
+            return INTERACTIVE
+        if not interactive:
+            return BULK
+        self.served += 1
+        return BULK if self.bulk_every and self.served % self.bulk_every == 0 else INTERACTIVE
+
+    def get(self, timeout: float = None):
+        with self.condition:
+            if not self.condition.wait_for(self.qsize, timeout):
+                raise queue.Empty
+            return self.classes[self._next_class()].pop()
+
+    def qsize(self, traffic_class: str = None) -> int:
+        if traffic_class:
+            return len(self.classes[traffic_class])
+        return len(self.classes[INTERACTIVE]) + len(self.classes[BULK])
+
+    def empty(self) -> bool:
+        return not self.qsize()
+
+    def depths(self) -> dict:
+        """Queued requests per merchant, both classes together"""
+        with self.condition:
+            totals = self.classes[INTERACTIVE].depths()
+            for merchant_id, depth in self.classes[BULK].depths().items():
+                totals[merchant_id] = totals.get(merchant_id, 0) + depth
+            return totals
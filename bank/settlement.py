@@ -0,0 +1,186 @@
+"""
+End-of-day settlement
+Streams the bank's transaction history log through a generator pipeline,
+totals approved amounts per merchant and day, and writes one settlement
+file per day once that day can no longer receive transactions.
+
+Memory holds only the days still open (normally today and yesterday).
+Progress - log position plus the open totals - is checkpointed atomically,
+so a crashed run resumes where it stopped without double counting.
+
+    python -m bank.settlement
+    python -m bank.settlement --through 2024-01-31
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from shared.config import Config
+from shared.rotating_log import RotatingLog
+
+APPROVED_MARKER = b'"status": "APPROVED"'
+
+
+def approved_records(raw_records):
+    """Skip JSON decoding for everything that cannot be an approval"""
+    for position, line in raw_records:
+        if APPROVED_MARKER not in line:
+            yield position, None
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield position, None
+            continue
+        yield position, record if record.get('status') == 'APPROVED' else None
+
+
+def to_minor_units(amount) -> int:
+    return int(round(float(amount) * 100))
+
+
+def format_minor_units(cents: int) -> str:
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+class SettlementJob:
+    def __init__(self, history_log: RotatingLog = None, output_dir: str = None,
+                 grace_seconds: float = None, checkpoint_every: int = None):
+        self.history_log = history_log or RotatingLog(Config.HISTORY_DIR, "transactions",
+                                                      read_only=True)
+        self.output_dir = output_dir or Config.SETTLEMENT_DIR
+        self.grace = timedelta(seconds=Config.SETTLEMENT_GRACE_SECONDS
+                               if grace_seconds is None else grace_seconds)
+        self.checkpoint_every = checkpoint_every or Config.SETTLEMENT_CHECKPOINT_EVERY
+        self.checkpoint_path = os.path.join(self.output_dir, "checkpoint.json")
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self.position = None
+        self.watermark = ""  # Latest timestamp seen, ISO text
+        self.open_days = {}  # day -> {merchant_id: [count, cents]}
+        self.settled = {}  # day -> number of batches written (late records make extra batches)
+        self.load_checkpoint()
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        self.position = tuple(state['position']) if state['position'] else None
+        self.watermark = state['watermark']
+        self.open_days = state['open_days']
+        self.settled = state['settled']
+
+    def save_checkpoint(self):
+        """Position and totals are written together with one atomic rename"""
+        state = {
+            'position': self.position,
+            'watermark': self.watermark,
+            'open_days': self.open_days,
+            'settled': self.settled,
+            'updated': datetime.now().isoformat()
+        }
+        temp = self.checkpoint_path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(state, f)
+        os.replace(temp, self.checkpoint_path)
+
+    def _close_time(self, day: str) -> str:
+        """ISO timestamp after which `day` cannot receive more transactions"""
+        end = datetime.combine(date.fromisoformat(day) + timedelta(days=1), datetime.min.time())
+        return (end + self.grace).isoformat()
+
+    def settle_day(self, day: str):
+        """Write the settlement file for one day and forget its totals"""
+        totals = self.open_days.pop(day)
+        batch = self.settled.get(day, 0)
+        suffix = f"-{batch}" if batch else ""
+        path = os.path.join(self.output_dir, f"settlement-{day}{suffix}.csv")
+        temp = path + ".tmp"
+        with open(temp, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["settlement_date", "merchant_id", "approved_count", "approved_amount"])
+            for merchant_id in sorted(totals):
+                count, cents = totals[merchant_id]
+                writer.writerow([day, merchant_id, count, format_minor_units(cents)])
+        os.replace(temp, path)
+        self.settled[day] = batch + 1
+
+        total_count = sum(count for count, _ in totals.values())
+        total_cents = sum(cents for _, cents in totals.values())
+        print(f"🧾 Settled {day}{suffix}: {len(totals)} merchants, {total_count} approvals, "
+              f"${format_minor_units(total_cents)} -> {path}")
+        return path
+
+    def _settle_closed(self, now_iso: str):
+        for day in sorted(self.open_days):
+            if max(self.watermark, now_iso) >= self._close_time(day):
+                self.settle_day(day)
+
+    def run(self, through: str = None) -> dict:
+        """
+        Consume the log from the checkpoint and settle every day that has
+        closed (or every day up to `through`, inclusive)
+        """
+        start = time.perf_counter()
+        scanned = approved = 0
+        now_iso = datetime.now().isoformat()
+        next_close = None  # Cheapest possible per-record check for day rollover
+
+        for position, record in approved_records(self.history_log.iter_raw_with_positions(self.position)):
+            self.position = position
+            scanned += 1
+            if record is not None:
+                approved += 1
+                timestamp = record['timestamp']
+                if timestamp > self.watermark:
+                    self.watermark = timestamp
+                day = timestamp[:10]
+                if day in self.settled and day not in self.open_days:
+                    print(f"⚠️  Late transaction {record['transaction_id'][:8]} for settled day {day}")
+                merchant_totals = self.open_days.setdefault(day, {})
+                totals = merchant_totals.setdefault(record.get('merchant_id') or "UNKNOWN", [0, 0])
+                totals[0] += 1
+                totals[1] += to_minor_units(record['amount'])
+
+                if next_close is None or self.watermark >= next_close:
+                    self._settle_closed("")
+                    next_close = min((self._close_time(d) for d in self.open_days), default=None)
+
+            if scanned % self.checkpoint_every == 0:
+                self.save_checkpoint()
+
+        self._settle_closed(now_iso)
+        if through:
+            for day in sorted(self.open_days):
+                if day <= through:
+                    self.settle_day(day)
+        self.save_checkpoint()
+
+        elapsed = time.perf_counter() - start
+        return {
+            'scanned': scanned,
+            'approved': approved,
+            'open_days': sorted(self.open_days),
+            'seconds': round(elapsed, 3),
+            'records_per_second': round(scanned / elapsed) if elapsed else None
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Settle approved transactions per merchant and day")
+    parser.add_argument("--through", help="also settle still-open days up to this date (YYYY-MM-DD)")
+    parser.add_argument("--output-dir", help=f"default {Config.SETTLEMENT_DIR}")
+    args = parser.parse_args()
+
+    summary = SettlementJob(output_dir=args.output_dir).run(through=args.through)
+    print(f"✅ Scanned {summary['scanned']} records ({summary['approved']} approved) in "
+          f"{summary['seconds']}s; open days: {', '.join(summary['open_days']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+SecurePay benchmark suite
+Microbenchmarks, synthetic card populations and an open-loop load generator
+
+Run `python -m bench --help` from the repository root.
+"""
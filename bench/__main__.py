@@ -0,0 +1,141 @@
+"""
+Benchmark command line
+
+    python -m bench micro [--only validator encryption bus tokens journal rollups] [--scale 0.1]
+    python -m bench startup [--runs 5]
+    python -m bench load --rate 20 --duration 30 --cards 100000 [--bank inprocess]
+    python -m bench table --cards 10000000 [--baseline-cards 1000000]
+    python -m bench scale --instances 1 2 4 --duration 20
+    python -m bench transport [--messages 5000] [--only file shm_bus]
+    python -m bench replay captures/<capture> [--speed 1|4|max] [--seed 7]
+    python -m bench compare bench/results/old.json bench/results/new.json
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.workspace import bench_workspace
+from bench.report import write_results, print_results, compare
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="SecurePay benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    micro = sub.add_parser("micro", help="microbenchmarks")
+    micro.add_argument("--only", nargs="+",
+                       choices=["validator", "encryption", "bus", "tokens", "journal", "rollups"])
+    micro.add_argument("--scale", type=float, default=1.0, help="multiply iteration counts")
+    micro.add_argument("--output", help="results file (default bench/results/...)")
+
+    startup = sub.add_parser("startup", help="python -X importtime cost of each entry point")
+    startup.add_argument("--runs", type=int, default=5, help="best-of-N runs per entry point")
+    startup.add_argument("--output", help="results file (default bench/results/...)")
+
+    load = sub.add_parser("load", help="open-loop end-to-end load test")
+    load.add_argument("--rate", type=float, default=10.0, help="offered payments per second")
+    load.add_argument("--duration", type=float, default=30.0, help="seconds of offered load")
+    load.add_argument("--cards", type=int, default=10_000, help="synthetic card population")
+    load.add_argument("--bank", choices=["subprocess", "inprocess"], default="subprocess")
+    load.add_argument("--bank-workers", type=int, default=None)
+    load.add_argument("--concurrency", type=int, default=64, help="max in-flight vendor payments")
+    load.add_argument("--output", help="results file (default bench/results/...)")
+
+    table = sub.add_parser("table", help="card store memory: dict vs CardTable")
+    table.add_argument("--cards", type=int, default=1_000_000, help="cards loaded into CardTable")
+    table.add_argument("--baseline-cards", type=int, default=1_000_000,
+                       help="cards loaded into the dict store (about 0.5 GB per million)")
+    table.add_argument("--output", help="results file (default bench/results/...)")
+
+    scale = sub.add_parser("scale", help="aggregate TPS over several routed bank instances")
+    scale.add_argument("--instances", type=int, nargs="+", default=[1, 2, 4],
+                       help="bank instance counts to measure")
+    scale.add_argument("--duration", type=float, default=20.0, help="seconds per instance count")
+    scale.add_argument("--cards", type=int, default=10_000, help="synthetic card population")
+    scale.add_argument("--concurrency", type=int, default=64, help="payments kept in flight")
+    scale.add_argument("--bank-workers", type=int, default=None)
+    scale.add_argument("--output", help="results file (default bench/results/...)")
+
+    transport = sub.add_parser("transport", help="vendor <-> bank hop latency per transport")
+    transport.add_argument("--messages", type=int, default=5000, help="round trips per transport")
+    transport.add_argument("--size", type=int, default=400, help="payload bytes per message")
+    transport.add_argument("--only", nargs="+",
+                           choices=["file", "unix_socket", "tcp", "shm_ring", "shm_bus"])
+    transport.add_argument("--output", help="results file (default bench/results/...)")
+
+    replay = sub.add_parser("replay", help="replay captured traffic (vendor --capture) against a bank")
+    replay.add_argument("capture", help="capture directory written by the vendor")
+    replay.add_argument("--speed", default="1",
+                        help="1 = captured pace, N = N times faster, max = as fast as the bank answers")
+    replay.add_argument("--seed", type=int, default=7, help="fraud seed and transaction id seed")
+    replay.add_argument("--bank", choices=["subprocess", "inprocess"], default="subprocess")
+    replay.add_argument("--bank-workers", type=int, default=None)
+    replay.add_argument("--concurrency", type=int, default=64, help="max in-flight requests")
+    replay.add_argument("--bus", choices=["file", "shm"], default=None,
+                        help="vendor <-> bank transport (default Config.BUS_TRANSPORT)")
+    replay.add_argument("--limit", type=int, default=None, help="replay only the first N requests")
+    replay.add_argument("--output", help="results file (default bench/results/...)")
+
+    cmp = sub.add_parser("compare", help="compare two results files")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="regression threshold (0.10 = 10%%)")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        regressions = compare(args.baseline, args.current, args.threshold)
+        return 1 if regressions else 0
+
+    output = os.path.abspath(args.output) if args.output else None
+    if args.command == "replay":
+        try:
+            if args.speed != "max" and float(args.speed) <= 0:
+                raise ValueError(args.speed)
+        except ValueError:
+            parser.error("--speed must be a positive number or max")
+        capture = os.path.abspath(args.capture)  # The run happens in a scratch directory
+        if args.bus:
+            from shared.config import Config
+            Config.BUS_TRANSPORT = args.bus
+    if args.command == "startup":
+        from bench.startup import run_startup
+        results = run_startup(args.runs)
+        print_results(results)
+        print(f"📄 Results written to {write_results('startup', results, output)}")
+        return 0
+
+    with bench_workspace():
+        if args.command == "micro":
+            from bench.micro import run_micro
+            results = run_micro(args.only, args.scale)
+        elif args.command == "table":
+            from bench.table import run_table
+            results = run_table(args.cards, args.baseline_cards)
+        elif args.command == "replay":
+            from bench.replay import run_replay
+            results = run_replay(capture, args.speed, args.seed, bank_mode=args.bank,
+                                 bank_workers=args.bank_workers, concurrency=args.concurrency,
+                                 limit=args.limit)
+        elif args.command == "transport":
+            from bench.transport import run_transport
+            results = run_transport(args.messages, args.size, args.only)
+        elif args.command == "scale":
+            from bench.scale import run_scale
+            results = run_scale(args.instances, args.duration, cards=args.cards,
+                                concurrency=args.concurrency, bank_workers=args.bank_workers)
+        else:
+            from bench.loadgen import run_load
+            results = run_load(args.rate, args.duration, cards=args.cards, bank_mode=args.bank,
+                               bank_workers=args.bank_workers, concurrency=args.concurrency)
+
+    print_results(results)
+    path = write_results(args.command, results, output)
+    print(f"📄 Results written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Synthetic card population generator
+Writes N Luhn-valid cards in the valid_cards.json format without holding
+them all in memory.
+
+Usage:
+    python -m bench.cards 1000000 --output bank/data/valid_cards.json
+"""
+import argparse
+import json
+import random
+
+# Issuer prefixes that are not in CardVerifier's suspicious BIN list
+DEFAULT_BINS = ["4111", "4532", "5500", "5425", "3400", "3700", "6011"]
+CARD_TYPES = {"4": "Visa", "5": "Mastercard", "3": "American Express", "6": "Discover"}
+
+
+def luhn_check_digit(partial: str) -> str:
+    """Check digit that makes partial + digit pass CardValidator.validate_card_format"""
+    checksum = 0
+    for i, digit in enumerate(reversed(partial)):
+        d = int(digit)
+        if i % 2 == 0:  # These positions get doubled once the check digit is appended
+            d = sum(divmod(d * 2, 10))
+        checksum += d
+    return str((10 - checksum % 10) % 10)
+
+
+# Odd, not a multiple of 5: multiplying by it permutes any 10**k range,
+# so account numbers are unique without remembering the ones already issued
+SCRAMBLE = 982451653
+
+
+def generate_pan(index: int, offset: int, bins=DEFAULT_BINS) -> str:
+    """The index-th synthetic PAN; distinct indexes give distinct PANs"""
+    prefix = bins[index % len(bins)]
+    length = 15 if prefix.startswith("3") else 16
+    digits = length - len(prefix) - 1
+    account = (index // len(bins) * SCRAMBLE + offset) % (10 ** digits)
+    body = prefix + str(account).zfill(digits)
+    return body + luhn_check_digit(body)
+
+
+def generate_cards(count: int, seed: int = 42, bins=DEFAULT_BINS,
+                   expiry: str = "12/30", balance: float = 1_000_000.0):
+    """Yield (pan, card_info) pairs; PANs are unique within one run"""
+    offset = random.Random(seed).randrange(10 ** 9)
+    for i in range(count):
+        pan = generate_pan(i, offset, bins)
+        yield pan, {
+            "expiry": expiry,
+            "balance": balance,
+            "cardholder": f"Bench Holder {i + 1}",
+            "type": CARD_TYPES.get(pan[0], "Unknown")
+        }
+
+
+def write_cards(path: str, count: int, seed: int = 42, **kwargs) -> int:
+    """Stream a card population into a valid_cards.json style file"""
+    written = 0
+    with open(path, "w") as f:
+        f.write("{\n")
+        for pan, info in generate_cards(count, seed, **kwargs):
+            if written:
+                f.write(",\n")
+            f.write(f"  {json.dumps(pan)}: {json.dumps(info)}")
+            written += 1
+        f.write("\n}\n")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic card population")
+    parser.add_argument("count", type=int, help="number of cards")
+    parser.add_argument("--output", default="bank/data/valid_cards.json")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    written = write_cards(args.output, args.count, args.seed)
+    print(f"✅ Wrote {written} cards to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
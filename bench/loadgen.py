@@ -0,0 +1,135 @@
+"""
+Open-loop load generator
+Drives PaymentProcessor against a headless bank at a fixed arrival rate.
+Latency is measured from each request's scheduled start, so a slow system
+cannot hide its queueing delay (no coordinated omission).
+"""
+import contextlib
+import io
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter as Tally
+from concurrent.futures import ThreadPoolExecutor
+
+from shared.config import Config
+from shared.encryption import EncryptionManager
+from shared.metrics import Histogram
+
+from bench.cards import write_cards, generate_cards
+from bench.report import result, max_rss_kb
+from bench.workspace import REPO_ROOT
+
+
+def start_bank(mode: str, workers: int, instance: str = None, fraud_seed: int = None):
+    """
+    Start a headless bank (optionally one routed instance, optionally with
+    seeded fraud draws) in this workspace; returns a stop() callable
+    """
+    if mode == "inprocess":
+        from bank.bank_service import BankService
+        service = BankService(workers=workers)
+        service.start()
+        return service.stop
+
+    command = [sys.executable, os.path.join(REPO_ROOT, "bank", "bank_daemon.py"),
+               "--workers", str(workers), "--metrics-port", "0"]
+    if instance:
+        command += ["--instance", instance]
+    if fraud_seed is not None:
+        command += ["--fraud-seed", str(fraud_seed)]
+    if Config.BUS_TRANSPORT != "file":
+        command += ["--bus", Config.BUS_TRANSPORT]
+    process = subprocess.Popen(command, cwd=os.getcwd(), stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+
+    def stop():
+        process.terminate()
+        try:
+            process.wait(15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return stop
+
+
+def outcome_of(message: str) -> str:
+    for status in ("RETRY_LATER", "APPROVED", "DECLINED", "FRAUD", "ERROR"):
+        if status in message:
+            return status.lower()
+    return "other"
+
+
+def run_load(rate: float, duration: float, cards: int = 10_000, bank_mode: str = "subprocess",
+             bank_workers: int = None, concurrency: int = 64, seed: int = 7,
+             amount: str = "1.00") -> list:
+    """Offer `rate` payments/second for `duration` seconds and report what came back"""
+    from vendor.payment_processor import PaymentProcessor
+    from vendor.circuit_breaker import CircuitOpenError
+
+    print(f"🃏 Generating {cards} cards...")
+    write_cards("bank/data/valid_cards.json", cards)
+    pans = [pan for pan, _ in generate_cards(cards)]
+    rng = random.Random(seed)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        EncryptionManager()  # Create the shared key before two processes race for it
+        stop_bank = start_bank(bank_mode, bank_workers or Config.BANK_WORKERS)
+        processor = PaymentProcessor()
+    time.sleep(2 if bank_mode == "subprocess" else 0.2)
+
+    latencies = Histogram("load.latency", {})
+    outcomes = Tally()
+    lock = threading.Lock()
+
+    def pay(scheduled: float, pan: str):
+        card_data = {'number': pan, 'expiry': '12/30', 'cvv': '123', 'amount': amount,
+                     'save_token': False}
+        try:
+            outcome = outcome_of(processor.process_payment(card_data))
+        except CircuitOpenError:
+            outcome = "circuit_open"
+        except TimeoutError:
+            outcome = "timeout"
+        except Exception:
+            outcome = "error"
+        latencies.record((time.perf_counter() - scheduled) * 1e6)
+        with lock:
+            outcomes[outcome] += 1
+
+    total = int(rate * duration)
+    print(f"🚀 Offering {rate:g} TPS for {duration:g}s ({total} payments, bank={bank_mode})...")
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="loadgen")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for i in range(total):
+                scheduled = start + i / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(pay, scheduled, rng.choice(pans))
+            executor.shutdown(wait=True)
+            elapsed = time.perf_counter() - start
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor.close()  # Flushes the payment journal bench.reconciliation reads
+        stop_bank()
+
+    completed = sum(outcomes.values())
+    return [result(
+        "load.open_loop", completed, elapsed, latencies,
+        offered_tps=rate,
+        achieved_tps=round(completed / elapsed, 2) if elapsed else None,
+        outcomes=dict(outcomes),
+        cards=cards,
+        bank_mode=bank_mode,
+        bank_workers=bank_workers or Config.BANK_WORKERS,
+        vendor_concurrency=concurrency,
+        vendor_max_rss_kb=max_rss_kb(),
+        bank_max_rss_kb=max_rss_kb(children=True) if bank_mode == "subprocess" else None
+    )]
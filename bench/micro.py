@@ -0,0 +1,157 @@
+"""
+Microbenchmarks for the hot building blocks
+CardValidator, EncryptionManager, MessageBus, TokenManager, the payment journal
+and the reporting rollups
+"""
+import io
+import contextlib
+import itertools
+from datetime import datetime, timedelta
+
+from shared.config import CardValidator
+from shared.encryption import EncryptionManager
+from shared.rotating_log import RotatingLog, AsyncLogWriter
+from communication.message_bus import MessageBus
+from bank.rollups import Rollups
+from vendor.token_manager import TokenManager
+
+from bench.cards import generate_cards
+from bench.report import run_timed
+
+SAMPLE_PAYMENT = {
+    'transaction_id': '00000000-0000-0000-0000-000000000000',
+    'timestamp': '2024-01-01T00:00:00',
+    'card_data': {'number': '4111111111111111', 'expiry': '12/30', 'cvv': '123'},
+    'token': None,
+    'amount': '100'
+}
+
+
+def bench_card_validator(iterations: int) -> list:
+    validator = CardValidator()
+    return [
+        run_timed("card_validator.luhn", lambda: validator.validate_card_format("4111111111111111"),
+                  iterations),
+        run_timed("card_validator.expiry", lambda: validator.validate_expiry("12/30"), iterations),
+        run_timed("card_validator.cvv", lambda: validator.validate_cvv("123"), iterations),
+    ]
+
+
+def bench_encryption(iterations: int) -> list:
+    with contextlib.redirect_stdout(io.StringIO()):
+        encryption = EncryptionManager()
+    ciphertext = encryption.encrypt_data(SAMPLE_PAYMENT)
+    return [
+        run_timed("encryption.encrypt", lambda: encryption.encrypt_data(SAMPLE_PAYMENT), iterations),
+        run_timed("encryption.decrypt", lambda: encryption.decrypt_data(ciphertext), iterations),
+    ]
+
+
+def bench_message_bus(iterations: int) -> list:
+    """Send + receive round trips; the queue files grow as the run proceeds"""
+    bus = MessageBus()
+    bus.clear_queues()
+    payload = "x" * 400  # Roughly the size of an encrypted payment request
+
+    def round_trip():
+        bus.send_to_bank(payload)
+        bus.receive_from_vendor()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [run_timed("message_bus.round_trip", round_trip, iterations,
+                             queue_length=iterations)]
+    bus.clear_queues()
+    return results
+
+
+def bench_token_manager(iterations: int) -> list:
+    manager = TokenManager(tokens_file="vendor/data/tokens.json")
+    manager.clear_all_tokens()
+    cards = generate_cards(iterations + 20)
+
+    def generate():
+        pan, info = next(cards)
+        manager.generate_token({'number': pan, 'expiry': info['expiry']})
+
+    results = [run_timed("token_manager.generate_token", generate, iterations,
+                         vault_size=iterations)]
+    token = next(iter(manager.tokens))
+    results.append(run_timed("token_manager.get_card_data",
+                             lambda: manager.get_card_data(token), iterations * 10))
+    return results
+
+
+def bench_payment_journal(iterations: int) -> list:
+    """Cost a payment pays for its journal record: synchronous write vs background writer"""
+    record = {'transaction_id': SAMPLE_PAYMENT['transaction_id'], 'timestamp': SAMPLE_PAYMENT['timestamp'],
+              'status': 'APPROVED', 'reason': 'Payment successful', 'card_last4': '1111',
+              'card_masked': '**** **** **** 1111', 'amount': '100', 'merchant_id': 'VENDOR_001',
+              'attempts': 1, 'latency_ms': 12.5, 'bank_latency_ms': 11.9}
+    sync_log = RotatingLog("vendor/data/bench_journal/sync", "payments")
+    async_log = AsyncLogWriter(RotatingLog("vendor/data/bench_journal/async", "payments"))
+    results = [run_timed("payment_journal.sync_append", lambda: sync_log.append(record), iterations)]
+    results.append(run_timed("payment_journal.async_append", lambda: async_log.append(record),
+                             iterations))
+    async_log.close()
+    sync_log.close()
+    return results
+
+
+def bench_rollups(iterations: int) -> list:
+    """Per-transaction update cost, then report queries over 30 days of buckets"""
+    rollups = Rollups("bank/data/bench_rollups.bin")
+    start = datetime.now() - timedelta(days=30)
+    step = timedelta(days=30) / iterations
+    statuses = ['APPROVED'] * 8 + ['DECLINED', 'FRAUD']
+    reasons = {'APPROVED': 'Payment successful', 'DECLINED': 'Insufficient funds',
+               'FRAUD': 'Velocity limit exceeded'}
+    counter = itertools.count()
+
+    def record():
+        i = next(counter)
+        status = statuses[i % len(statuses)]
+        return {'timestamp': (start + step * i).isoformat(), 'status': status,
+                'reason': reasons[status], 'merchant_id': f"VENDOR_00{i % 3 + 1}",
+                'card_bin': str(400000 + i % 500), 'amount': 25.0}
+
+    feed = iter([record() for _ in range(iterations + 10)])  # run_timed warms up with 10 calls
+    results = [run_timed("rollups.add", lambda: rollups.add(next(feed)), iterations)]
+    results[0]['buckets'] = sum(len(buckets) for buckets in rollups.buckets.values())
+    week = datetime.now() - timedelta(days=7)
+    results.append(run_timed("rollups.totals_by_bin_7d", lambda: rollups.totals('bin', week), 20,
+                             history=iterations))
+    results.append(run_timed("rollups.series_per_minute_1d",
+                             lambda: rollups.query('minute', since=datetime.now() - timedelta(days=1)),
+                             20, history=iterations))
+    results.append(run_timed("rollups.save", lambda: rollups.save(None), 5))
+    return results
+
+
+SUITES = {
+    'validator': bench_card_validator,
+    'encryption': bench_encryption,
+    'bus': bench_message_bus,
+    'tokens': bench_token_manager,
+    'journal': bench_payment_journal,
+    'rollups': bench_rollups,
+}
+
+# Default iteration counts - I/O heavy benchmarks rewrite JSON files per call
+DEFAULT_ITERATIONS = {
+    'validator': 100_000,
+    'encryption': 5_000,
+    'bus': 500,
+    'tokens': 500,
+    'journal': 100_000,
+    'rollups': 200_000,
+}
+
+
+def run_micro(names=None, scale: float = 1.0) -> list:
+    """Run the selected microbenchmarks inside the current (scratch) working directory"""
+    results = []
+    for name in names or SUITES:
+        iterations = max(1, int(DEFAULT_ITERATIONS[name] * scale))
+        print(f"⏱️  {name} ({iterations} iterations)...")
+        results.extend(SUITES[name](iterations))
+    return results
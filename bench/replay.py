@@ -0,0 +1,222 @@
+"""
+Traffic replay
+Drives a headless bank with a capture recorded by the vendor
+(vendor.traffic_capture): the same cards, amounts, merchants, priorities,
+tokenized/manual mix and arrival spacing. Speeds:
+
+    --speed 1     the captured pace (open loop; latency from each request's
+                  scheduled start, as in bench.loadgen)
+    --speed 4     four times faster
+    --speed max   as fast as the bank answers, `concurrency` requests in
+                  flight (latency from each send)
+
+The bank runs with Config.FRAUD_SEED and the requests get transaction ids
+derived from the seed, so every run makes the same fraud decisions:
+outcome_digest only changes when the bank's behaviour changes (or when it
+sheds load). Cards are issued from the capture with ample balances; cards
+the bank did not know at capture time are left out again.
+
+Requests go straight onto the bus as the vendor would send them. The
+vendor's own work (CVV checks, token lookups) is not replayed.
+
+    python -m bench replay captures/20260101-120000 --speed max
+    python -m bench compare bench/results/replay-<old>.json bench/results/replay-<new>.json
+"""
+import contextlib
+import hashlib
+import io
+import json
+import threading
+import time
+import uuid
+from collections import Counter as Tally
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from shared.config import Config
+from shared.encryption import EncryptionManager
+from shared.metrics import Histogram
+from communication.message_bus import create_bus
+from communication.protocols import MessageType
+from vendor.traffic_capture import read_capture
+
+from bench.loadgen import start_bank
+from bench.report import result, max_rss_kb
+
+NOT_FOUND = "not found"  # Reason of a card the bank did not know when it was captured
+REPLAY_NAMESPACE = uuid.UUID("6f1d3a52-8c4e-4b7a-9a53-2e1f0c7d9b10")
+
+
+def load_capture(directory: str, limit: int = None) -> list:
+    """Capture records in arrival order"""
+    records = []
+    for record in read_capture(directory):
+        records.append(record)
+        if limit and len(records) >= limit:
+            break
+    records.sort(key=lambda record: record['t'])
+    return records
+
+
+def traffic_mix(records: list) -> dict:
+    """What the capture is made of: the properties the replay preserves"""
+    seen = set()
+    repeats = 0
+    for record in records:
+        if record['card'] in seen:
+            repeats += 1
+        seen.add(record['card'])
+    total = len(records) or 1
+    span = records[-1]['t'] - records[0]['t'] if records else 0.0
+    return {
+        'requests': len(records),
+        'cards': len(seen),
+        'repeat_card_share': round(repeats / total, 4),
+        'tokenized_share': round(sum(r['tokenized'] for r in records) / total, 4),
+        'bulk_share': round(sum(r['priority'] == 'bulk' for r in records) / total, 4),
+        'merchants': dict(Tally(r['merchant_id'] for r in records)),
+        'captured_seconds': round(span, 3),
+        'captured_tps': round(len(records) / span, 2) if span else None,
+        'captured_outcomes': dict(Tally(r['status'].lower() for r in records))
+    }
+
+
+def write_replay_cards(records: list, path: str) -> int:
+    """Issue every captured card the bank knew, with its captured expiry"""
+    cards = {}
+    unknown = set()
+    for record in records:
+        if NOT_FOUND in (record.get('reason') or "").lower():
+            unknown.add(record['card'])
+        else:
+            cards.setdefault(record['card'], record['expiry'])
+    with open(path, "w") as f:
+        json.dump({pan: {'expiry': expiry, 'balance': 1_000_000_000.0,
+                         'cardholder': "Replay Holder", 'type': "Replay"}
+                   for pan, expiry in cards.items() if pan not in unknown}, f)
+    return len(cards) - len(unknown & cards.keys())
+
+
+def build_requests(records: list, seed: int) -> list:
+    """(transaction_id, encrypted message, merchant_id, message_type, priority) per record"""
+    encryption = EncryptionManager()
+    requests = []
+    for index, record in enumerate(records):
+        transaction_id = str(uuid.uuid5(REPLAY_NAMESPACE, f"{seed}:{index}"))
+        payment_message = {
+            'transaction_id': transaction_id,
+            'timestamp': datetime.now().isoformat(),
+            'card_data': {'number': record['card'], 'expiry': record['expiry'], 'cvv': "123",
+                          'amount': record['amount'], 'save_token': False},
+            'token': f"replay-{record['card'][-4:]}" if record['tokenized'] else None,
+            'amount': record['amount'],
+            'merchant_id': record['merchant_id']
+        }
+        bulk = record['priority'] == 'bulk'
+        message_type = (MessageType.BULK_PAYMENT_REQUEST if bulk
+                        else MessageType.PAYMENT_REQUEST).value
+        requests.append((transaction_id, encryption.encrypt_data(payment_message),
+                         record['merchant_id'], message_type, record['priority']))
+    return requests
+
+
+def run_replay(capture: str, speed: str = "1", seed: int = 7, bank_mode: str = "subprocess",
+               bank_workers: int = None, concurrency: int = 64, limit: int = None) -> list:
+    records = load_capture(capture, limit)
+    if not records:
+        raise ValueError(f"{capture} holds no traffic")
+    mix = traffic_mix(records)
+    factor = None if speed == "max" else float(speed)
+    print(f"📼 {mix['requests']} requests over {mix['captured_seconds']}s, {mix['cards']} cards "
+          f"({mix['repeat_card_share']:.0%} repeats, {mix['tokenized_share']:.0%} tokenized)")
+
+    issued = write_replay_cards(records, "bank/data/valid_cards.json")
+    with contextlib.redirect_stdout(io.StringIO()):
+        requests = build_requests(records, seed)  # Encrypted up front: the driver stays cheap
+        Config.FRAUD_SEED = seed
+        stop_bank = start_bank(bank_mode, bank_workers or Config.BANK_WORKERS, fraud_seed=seed)
+        bus = create_bus('vendor')
+        encryption = EncryptionManager()
+    time.sleep(2 if bank_mode == "subprocess" else 0.2)
+
+    latencies = {'all': Histogram("replay.latency", {})}
+    for priority in ('interactive', 'bulk'):
+        latencies[priority] = Histogram(f"replay.{priority}", {})
+    outcomes = [None] * len(requests)
+
+    def replay(index: int, scheduled: float = None):
+        transaction_id, encrypted, merchant_id, message_type, priority = requests[index]
+        began = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            bus.send_to_bank(encrypted, merchant_id, message_type, transaction_id)
+            response = bus.receive_from_bank(timeout=Config.BANK_RESPONSE_TIMEOUT,
+                                             correlation_id=transaction_id)
+            outcome = (encryption.decrypt_data(response).get('status', 'other').lower()
+                       if response else "timeout")
+        except Exception:
+            outcome = "error"
+        elapsed_us = (time.perf_counter() - began) * 1e6
+        latencies['all'].record(elapsed_us)
+        latencies[priority].record(elapsed_us)
+        outcomes[index] = outcome
+
+    speed_text = "max speed" if factor is None else f"{factor:g}x"
+    print(f"🚀 Replaying at {speed_text} against {issued} cards (bank={bank_mode}, "
+          f"bus={Config.BUS_TRANSPORT})...")
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="replay")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if factor is None:
+                slots = threading.Semaphore(concurrency)
+
+                def closed_loop(index: int):
+                    try:
+                        replay(index)
+                    finally:
+                        slots.release()
+
+                for index in range(len(requests)):
+                    slots.acquire()
+                    executor.submit(closed_loop, index)
+            else:
+                first = records[0]['t']
+                for index, record in enumerate(records):
+                    scheduled = start + (record['t'] - first) / factor
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    executor.submit(replay, index, scheduled)
+            executor.shutdown(wait=True)
+            elapsed = time.perf_counter() - start
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bus.close()
+            stop_bank()
+        Config.FRAUD_SEED = None
+
+    matches = sum(outcome == record['status'].lower() for outcome, record in zip(outcomes, records))
+    offered = (len(records) / (mix['captured_seconds'] / factor)
+               if factor and mix['captured_seconds'] else None)
+    results = [result(
+        "replay", len(outcomes), elapsed, latencies['all'],
+        capture=capture,
+        speed=speed,
+        seed=seed,
+        offered_tps=round(offered, 2) if offered else None,
+        achieved_tps=round(len(outcomes) / elapsed, 2) if elapsed else None,
+        outcomes=dict(Tally(outcomes)),
+        outcome_digest=hashlib.sha1(",".join(outcomes).encode()).hexdigest()[:16],
+        matches_capture=round(matches / len(outcomes), 4),
+        mix=mix,
+        bank_mode=bank_mode,
+        bank_workers=bank_workers or Config.BANK_WORKERS,
+        bus=Config.BUS_TRANSPORT,
+        vendor_concurrency=concurrency,
+        bank_max_rss_kb=max_rss_kb(children=True) if bank_mode == "subprocess" else None
+    )]
+    for priority in ('interactive', 'bulk'):
+        histogram = latencies[priority]
+        if histogram.count:
+            results.append(result(f"replay.{priority}", histogram.count, elapsed, histogram))
+    return results
@@ -0,0 +1,144 @@
+"""
+Benchmark results: collection, machine-readable output and comparison
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from shared.metrics import Histogram
+
+from bench.workspace import REPO_ROOT
+
+RESULTS_DIR = os.path.join(REPO_ROOT, "bench", "results")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def max_rss_kb(children: bool = False) -> int:
+    """Peak resident set size in KiB (0 where the resource module is unavailable)"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return resource.getrusage(who).ru_maxrss
+
+
+def run_timed(name: str, function, iterations: int, warmup: int = 10, **extra) -> dict:
+    """Call function() `iterations` times, recording per-call latency and peak memory"""
+    for _ in range(warmup):
+        function()
+
+    latencies = Histogram(name, {})
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        function()
+        latencies.record((time.perf_counter_ns() - t0) / 1000)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result(name, iterations, elapsed, latencies, peak_memory_bytes=peak, **extra)
+
+
+def result(name: str, operations: int, seconds: float, latencies: Histogram = None, **extra) -> dict:
+    """One benchmark result in the common schema"""
+    entry = {
+        'name': name,
+        'operations': operations,
+        'seconds': round(seconds, 6),
+        'throughput_ops': round(operations / seconds, 2) if seconds else None
+    }
+    if latencies is not None:
+        snap = latencies.snapshot()
+        entry['latency_us'] = {k: snap[k] for k in ('min', 'p50', 'p90', 'p99', 'p999', 'max')}
+    entry.update(extra)
+    return entry
+
+
+def write_results(suite: str, results: list, path: str = None) -> str:
+    """Write results as JSON, by default to bench/results/<suite>-<rev>-<time>.json"""
+    document = {
+        'suite': suite,
+        'revision': git_revision(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'max_rss_kb': max_rss_kb(),
+        'results': results
+    }
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{suite}-{document['revision']}-"
+                                         f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def print_results(results: list):
+    print(f"{'benchmark':<40} {'ops/s':>12} {'p50 µs':>10} {'p99 µs':>10} {'peak mem':>10}")
+    for entry in results:
+        if 'import_us' in entry:
+            tk_note = "  (loads tkinter)" if entry.get('loads_tkinter') else ""
+            print(f"{entry['name']:<40} import {entry['import_us']:>8} µs, "
+                  f"{entry['modules_loaded']} modules{tk_note}")
+            continue
+        latency = entry.get('latency_us') or {}
+        peak = entry.get('peak_memory_bytes')
+        peak_text = f"{peak / 1024:.0f} KiB" if peak is not None else "-"
+        throughput = entry['throughput_ops']
+        print(f"{entry['name']:<40} {throughput if throughput is not None else '-':>12} "
+              f"{latency.get('p50', '-'):>10} {latency.get('p99', '-'):>10} {peak_text:>10}")
+
+
+def cost(entry: dict):
+    """Latency figure compared between runs: p99, or import time for startup results"""
+    if entry.get('latency_us'):
+        return entry['latency_us'].get('p99')
+    return entry.get('import_us')
+
+
+def compare(baseline_path: str, current_path: str, threshold: float = 0.10) -> int:
+    """Print per-benchmark deltas; returns the number of regressions beyond threshold"""
+    with open(baseline_path) as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+    with open(current_path) as f:
+        current = json.load(f)['results']
+
+    regressions = 0
+    print(f"{'benchmark':<40} {'ops/s Δ':>10} {'cost Δ':>10}")
+    for entry in current:
+        old = baseline.get(entry['name'])
+        if old is None:
+            print(f"{entry['name']:<40} {'new':>10}")
+            continue
+
+        def delta(new_value, old_value):
+            if not new_value or not old_value:
+                return None
+            return (new_value - old_value) / old_value
+
+        throughput_delta = delta(entry.get('throughput_ops'), old.get('throughput_ops'))
+        p99_delta = delta(cost(entry), cost(old))
+
+        flag = ""
+        if (throughput_delta is not None and throughput_delta < -threshold) or \
+                (p99_delta is not None and p99_delta > threshold):
+            flag = "  ⚠️ regression"
+            regressions += 1
+
+        fmt = lambda d: f"{d:+.1%}" if d is not None else "-"
+        print(f"{entry['name']:<40} {fmt(throughput_delta):>10} {fmt(p99_delta):>10}{flag}")
+    return regressions
@@ -0,0 +1,128 @@
+"""
+Horizontal scaling benchmark
+Routes a fixed card population over 1, 2, 4... bank instances (one
+bank_daemon process each, see communication.routing) and drives them
+closed-loop from one vendor process: `concurrency` payments are kept in
+flight for `duration` seconds. Reports aggregate TPS per instance count,
+the speed-up over the smallest count and each instance's share of the load.
+"""
+import contextlib
+import io
+import os
+import random
+import shutil
+import threading
+import time
+from collections import Counter as Tally
+
+from shared.config import Config
+from shared.encryption import EncryptionManager
+from shared.metrics import Histogram
+from communication.routing import save_routing, split_cards, CONSISTENT_HASH
+
+from bench.cards import write_cards, generate_cards
+from bench.loadgen import start_bank, outcome_of
+from bench.report import result, max_rss_kb
+
+
+def reset_instances():
+    """Fresh bus directories and card partitions for the next run"""
+    shutil.rmtree(Config.BANK_INSTANCES_DIR, ignore_errors=True)
+    comm_root = os.path.dirname(Config.ROUTING_FILE)
+    for entry in os.listdir(comm_root):
+        path = os.path.join(comm_root, entry)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def run_instances(count: int, pans: list, duration: float, concurrency: int, bank_workers: int,
+                  seed: int) -> dict:
+    from vendor.payment_processor import PaymentProcessor
+    from vendor.circuit_breaker import CircuitOpenError
+
+    reset_instances()
+    names = [f"bank-{i + 1}" for i in range(count)]
+    save_routing({'version': count, 'strategy': CONSISTENT_HASH,
+                  'instances': {name: {} for name in names}})
+    partition = split_cards("bank/data/valid_cards.json")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        stops = [start_bank("subprocess", bank_workers, name) for name in names]
+        processor = PaymentProcessor()
+    time.sleep(2 + 0.5 * count)
+    requests_before = {name: processor.link(name).requests.value for name in names}
+
+    latencies = Histogram("scale.latency", {})
+    outcomes = Tally()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(index: int):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            card_data = {'number': rng.choice(pans), 'expiry': '12/30', 'cvv': '123',
+                         'amount': '1.00', 'save_token': False}
+            start = time.perf_counter()
+            try:
+                outcome = outcome_of(processor.process_payment(card_data))
+            except CircuitOpenError:
+                outcome = "circuit_open"
+            except TimeoutError:
+                outcome = "timeout"
+            except Exception:
+                outcome = "error"
+            latencies.record((time.perf_counter() - start) * 1e6)
+            with lock:
+                outcomes[outcome] += 1
+
+    print(f"🚀 {count} bank instance(s), {concurrency} payments in flight for {duration:g}s...")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            clients = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+            elapsed = time.perf_counter() - start
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for stop in stops:
+                stop()
+            processor.close()
+
+    completed = sum(outcomes.values())
+    return result(
+        f"scale.instances_{count}", completed, elapsed, latencies,
+        instances=count,
+        outcomes=dict(outcomes),
+        cards_per_instance=partition,
+        requests_per_instance={name: processor.link(name).requests.value - requests_before[name]
+                               for name in names},
+        bank_workers=bank_workers,
+        vendor_concurrency=concurrency,
+        cpu_count=os.cpu_count(),
+        bank_max_rss_kb=max_rss_kb(children=True)
+    )
+
+
+def run_scale(instance_counts: list, duration: float = 20.0, cards: int = 10_000,
+              concurrency: int = 64, bank_workers: int = None, seed: int = 7) -> list:
+    print(f"🃏 Generating {cards} cards...")
+    write_cards("bank/data/valid_cards.json", cards)
+    pans = [pan for pan, _ in generate_cards(cards)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        EncryptionManager()  # Every instance and the vendor must share one key
+
+    results = [run_instances(count, pans, duration, concurrency, bank_workers or Config.BANK_WORKERS,
+                             seed)
+               for count in sorted(instance_counts)]
+    base = results[0]
+    for entry in results:
+        if base['throughput_ops'] and entry['throughput_ops']:
+            entry['speedup'] = round(entry['throughput_ops'] / base['throughput_ops'], 2)
+            entry['scaling_efficiency'] = round(
+                entry['speedup'] * base['instances'] / entry['instances'], 2)
+        print(f"   {entry['instances']} instance(s): {entry['throughput_ops']} TPS "
+              f"(x{entry.get('speedup')}) {entry['requests_per_instance']}")
+    return results
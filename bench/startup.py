@@ -0,0 +1,73 @@
+"""
+Startup-time benchmark
+Measures `python -X importtime` cost of each entry point in a fresh
+interpreter, and flags entry points that load Tkinter.
+"""
+import subprocess
+import sys
+import time
+
+from bench.report import result
+from bench.workspace import REPO_ROOT
+
+# Service paths must stay free of GUI imports; GUI launchers are listed for reference
+ENTRY_POINTS = {
+    'bank.bank_daemon': False,
+    'vendor.vendor_api': False,
+    'bank.bank_service': False,
+    'vendor.vendor_service': False,
+    'shared.trace_viewer': False,
+    'bench.cards': False,
+    'bank.bank_app': True,
+    'vendor.vendor_app': True,
+}
+
+
+def parse_importtime(stderr: str):
+    """Total cumulative microseconds of top-level imports, plus all module names"""
+    total = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name_column = line[len("import time:"):].split("|", 2)
+        modules.add(name_column.strip())
+        if not name_column.startswith("  "):  # Top level: no nesting indent
+            total += int(cumulative_us)
+    return total, modules
+
+
+def measure(module: str, runs: int = 5) -> dict:
+    """Best-of-N import cost for one module in a fresh interpreter"""
+    best_import_us = None
+    best_wall = None
+    modules = set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   cwd=REPO_ROOT, capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+        import_us, modules = parse_importtime(completed.stderr)
+        best_import_us = import_us if best_import_us is None else min(best_import_us, import_us)
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+    return {'import_us': best_import_us, 'wall_seconds': best_wall, 'modules': modules}
+
+
+def run_startup(runs: int = 5) -> list:
+    results = []
+    for module, gui_allowed in ENTRY_POINTS.items():
+        print(f"⏱️  import {module}...")
+        measured = measure(module, runs)
+        loads_tkinter = "tkinter" in measured['modules']
+        if loads_tkinter and not gui_allowed:
+            print(f"⚠️  {module} imports tkinter on a service path")
+        results.append(result(
+            f"startup.{module}", 1, measured['wall_seconds'],
+            import_us=measured['import_us'],
+            modules_loaded=len(measured['modules']),
+            loads_tkinter=loads_tkinter,
+            loads_cryptography="cryptography" in measured['modules']
+        ))
+    return results
@@ -0,0 +1,79 @@
+"""
+Card store memory and lookup benchmark
+Loads the same synthetic valid_cards.json into the dict store and into
+CardTable and compares bytes per card and lookup / balance-check latency.
+The dict baseline is measured on a smaller population by default: at
+10M cards it needs several GB.
+"""
+import gc
+import itertools
+import json
+import random
+import time
+import tracemalloc
+
+from bank.card_table import CardTable
+
+from bench.cards import write_cards
+from bench.report import result, run_timed
+
+LOOKUPS = 200_000
+
+
+def bench_dict(count: int, path: str) -> list:
+    write_cards(path, count)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(path) as f:
+        cards = json.load(f)
+    elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pans = list(cards)[:100_000]
+    sample = itertools.cycle(random.Random(7).choices(pans, k=LOOKUPS))
+    results = [
+        result("card_store.dict.load", count, elapsed, memory_bytes=memory,
+               bytes_per_card=round(memory / count, 1)),
+        run_timed("card_store.dict.lookup", lambda: cards[next(sample)]['expiry'], LOOKUPS),
+        run_timed("card_store.dict.balance_check",
+                  lambda: cards[next(sample)]['balance'] >= 100.0, LOOKUPS),
+    ]
+    del cards
+    gc.collect()
+    return results
+
+
+def bench_table(count: int, path: str) -> list:
+    write_cards(path, count)
+    gc.collect()
+    start = time.perf_counter()
+    table = CardTable.load(path)
+    elapsed = time.perf_counter() - start
+    stats = table.stats()
+
+    pans = [table.pan(row) for row in range(min(count, 100_000))]
+    sample = itertools.cycle(random.Random(7).choices(pans, k=LOOKUPS))
+    results = [
+        result("card_store.table.load", count, elapsed, **stats),
+        run_timed("card_store.table.lookup", lambda: table[next(sample)]['expiry'], LOOKUPS),
+        run_timed("card_store.table.balance_check", lambda: table.has_funds(next(sample), 100),
+                  LOOKUPS),
+    ]
+    return results
+
+
+def run_table(cards: int, baseline_cards: int) -> list:
+    """Run inside the bench workspace; card files are written to its bank/data"""
+    print(f"⏱️  dict store ({baseline_cards} cards)...")
+    results = bench_dict(baseline_cards, "bank/data/valid_cards.json")
+    print(f"⏱️  card table ({cards} cards)...")
+    results.extend(bench_table(cards, "bank/data/valid_cards.json"))
+
+    dict_bytes = results[0]['bytes_per_card']
+    table_bytes = results[3]['bytes_per_card']
+    results.append(result("card_store.memory_ratio", 1, 0, dict_bytes_per_card=dict_bytes,
+                          table_bytes_per_card=table_bytes,
+                          ratio=round(dict_bytes / table_bytes, 1)))
+    return results
@@ -0,0 +1,279 @@
+"""
+Vendor <-> bank transport latency
+Ping-pong between this process and a forked echo peer over each transport:
+
+    file          MessageBus queue files (peer polls every millisecond; the
+                  vendor side waits with its shared response poller)
+    unix_socket   AF_UNIX stream socketpair, length-prefixed frames
+    tcp           loopback TCP connection, TCP_NODELAY, length-prefixed frames
+    shm_ring      two raw ShmRing segments with futex wake-ups
+    shm_bus       ShmMessageBus end to end (envelope encoding, correlation,
+                  the vendor's reader thread)
+
+Every request carries a payload of roughly an encrypted payment's size.
+Results are round-trip latencies; hop_p50_us is half the median round trip.
+"""
+import contextlib
+import io
+import multiprocessing
+import os
+import socket
+import struct
+import time
+import uuid
+
+from shared.config import Config
+from shared.metrics import Histogram
+from communication.message_bus import MessageBus
+from communication.shm_ring import ShmRing, HAVE_FUTEX
+from communication.shm_bus import ShmMessageBus
+
+from bench.report import result
+
+FRAME = struct.Struct("<I")
+FILE_MESSAGES = 100  # The file bus is milliseconds per hop; fewer round trips suffice
+
+
+def _quiet():
+    """Peers run with stdout discarded (the file bus prints per message)"""
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+
+
+def _measure(name: str, round_trip, messages: int, warmup: int = 20, **extra) -> dict:
+    for _ in range(warmup):
+        round_trip()
+    latencies = Histogram(name, {})
+    start = time.perf_counter()
+    for _ in range(messages):
+        t0 = time.perf_counter_ns()
+        round_trip()
+        latencies.record((time.perf_counter_ns() - t0) / 1000)
+    entry = result(name, messages, time.perf_counter() - start, latencies, **extra)
+    entry['hop_p50_us'] = round(latencies.percentile(50) / 2, 3)
+    return entry
+
+
+def _spawn(target, *args):
+    ready = multiprocessing.get_context("fork").Event()
+    peer = multiprocessing.get_context("fork").Process(target=target, args=args + (ready,),
+                                                       daemon=True)
+    peer.start()
+    if not ready.wait(10):
+        peer.kill()
+        raise RuntimeError(f"{target.__name__} did not start")
+    return peer
+
+
+# --- file queues ---
+
+def _file_peer(comm_dir: str, ready):
+    _quiet()
+    bus = MessageBus(comm_dir)
+    ready.set()
+    while True:
+        batch = bus.receive_envelopes_from_vendor(Config.BANK_INTAKE_BATCH)
+        if not batch:
+            time.sleep(0.001)
+            continue
+        if any(envelope['message'] == "quit" for envelope in batch):
+            return
+        bus.send_batch_to_vendor([(envelope['message'], envelope['correlation_id'])
+                                  for envelope in batch])
+
+
+def bench_file(messages: int, payload: str) -> dict:
+    comm_dir = os.path.abspath("communication_data/transport-file")
+    bus = MessageBus(comm_dir)
+    bus.clear_queues()
+    peer = _spawn(_file_peer, comm_dir)
+
+    def round_trip():
+        correlation_id = str(uuid.uuid4())
+        bus.send_to_bank(payload, correlation_id=correlation_id)
+        if bus.receive_from_bank(timeout=5, correlation_id=correlation_id) != payload:
+            raise RuntimeError("file bus lost a message")
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return _measure("transport.file", round_trip, messages, warmup=5,
+                            response_poll_ms=bus.response_poll_interval * 1000)
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bus.send_to_bank("quit")
+        peer.join(5)
+
+
+# --- sockets ---
+
+def _receive_frame(sock, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("peer closed the socket")
+        data += chunk
+    return bytes(data)
+
+
+def _socket_echo(sock):
+    try:
+        while True:
+            size = FRAME.unpack(_receive_frame(sock, FRAME.size))[0]
+            sock.sendall(FRAME.pack(size) + _receive_frame(sock, size))
+    except ConnectionError:
+        return
+
+
+def _unix_peer(sock, ready):
+    ready.set()
+    _socket_echo(sock)
+
+
+def _tcp_peer(server, ready):
+    ready.set()
+    connection, _ = server.accept()
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    _socket_echo(connection)
+
+
+def _socket_round_trip(sock, frame: bytes):
+    def round_trip():
+        sock.sendall(frame)
+        size = FRAME.unpack(_receive_frame(sock, FRAME.size))[0]
+        _receive_frame(sock, size)
+    return round_trip
+
+
+def bench_unix_socket(messages: int, payload: str) -> dict:
+    ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    peer = _spawn(_unix_peer, theirs)
+    theirs.close()
+    frame = FRAME.pack(len(payload)) + payload.encode()
+    try:
+        return _measure("transport.unix_socket", _socket_round_trip(ours, frame), messages)
+    finally:
+        ours.close()
+        peer.join(5)
+
+
+def bench_tcp(messages: int, payload: str) -> dict:
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    peer = _spawn(_tcp_peer, server)
+    client = socket.create_connection(server.getsockname())
+    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    server.close()
+    frame = FRAME.pack(len(payload)) + payload.encode()
+    try:
+        return _measure("transport.tcp", _socket_round_trip(client, frame), messages)
+    finally:
+        client.close()
+        peer.join(5)
+
+
+# --- shared memory ---
+
+def _ring_peer(names: tuple, ready):
+    requests, answers = ShmRing.attach(names[0]), ShmRing.attach(names[1])
+    ready.set()
+    running = True
+    while running and requests.wait(5):
+        frames = []
+        while True:
+            view = requests.peek()
+            if view is None:
+                break
+            if view == b"quit":
+                running = False
+                break
+            frames.append(view)
+        while frames:
+            sent = answers.send(frames)  # Copied straight from one segment to the other
+            frames = frames[sent:]
+            if frames:
+                answers.wait_for_space(len(frames[0]), 1)
+        requests.commit()
+    requests.close()
+    answers.close()
+
+
+def bench_shm_ring(messages: int, payload: str) -> dict:
+    suffix = uuid.uuid4().hex[:8]
+    names = (f"securepay-bench-{suffix}-v2b", f"securepay-bench-{suffix}-b2v")
+    requests = ShmRing.create(names[0], Config.SHM_RING_BYTES)
+    answers = ShmRing.create(names[1], Config.SHM_RING_BYTES, requests.epoch)
+    peer = _spawn(_ring_peer, names)
+    frame = payload.encode()
+
+    def round_trip():
+        requests.send((frame,))
+        answers.wait(5)
+        answers.receive(1)
+
+    try:
+        return _measure("transport.shm_ring", round_trip, messages, futex=HAVE_FUTEX)
+    finally:
+        requests.send((b"quit",))
+        peer.join(5)
+        requests.close()
+        answers.close()
+
+
+def _bus_peer(comm_dir: str, ready):
+    _quiet()
+    bus = ShmMessageBus(comm_dir, role="bank")
+    ready.set()
+    try:
+        while True:
+            batch = bus.receive_envelopes_from_vendor(Config.BANK_INTAKE_BATCH)
+            if not batch:
+                bus.wait_for_vendor(Config.POLL_INTERVAL)
+                continue
+            if any(envelope['message'] == "quit" for envelope in batch):
+                return
+            bus.send_batch_to_vendor([(envelope['message'], envelope['correlation_id'])
+                                      for envelope in batch])
+    finally:
+        bus.close()
+
+
+def bench_shm_bus(messages: int, payload: str) -> dict:
+    comm_dir = os.path.abspath("communication_data/transport-shm")
+    os.makedirs(comm_dir, exist_ok=True)
+    peer = _spawn(_bus_peer, comm_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bus = ShmMessageBus(comm_dir, role="vendor")
+    if bus.to_bank is None:
+        raise RuntimeError("vendor could not attach to the shared-memory bus")
+
+    def round_trip():
+        correlation_id = str(uuid.uuid4())
+        bus.send_to_bank(payload, Config.MERCHANT_ID, correlation_id=correlation_id)
+        if bus.receive_from_bank(timeout=5, correlation_id=correlation_id) != payload:
+            raise RuntimeError("shared-memory bus lost a message")
+
+    try:
+        entry = _measure("transport.shm_bus", round_trip, messages)
+        entry['fallbacks'] = bus.ring_fallbacks.value  # Messages that took the files instead
+        return entry
+    finally:
+        bus.send_to_bank("quit", correlation_id="quit")
+        peer.join(5)
+        bus.close()
+
+
+def run_transport(messages: int, size: int, only=None) -> list:
+    payload = "x" * size
+    benches = {
+        'file': lambda: bench_file(min(messages, FILE_MESSAGES), payload),
+        'unix_socket': lambda: bench_unix_socket(messages, payload),
+        'tcp': lambda: bench_tcp(messages, payload),
+        'shm_ring': lambda: bench_shm_ring(messages, payload),
+        'shm_bus': lambda: bench_shm_bus(messages, payload),
+    }
+    results = []
+    for name in only or benches:
+        print(f"⏱️  transport.{name}...")
+        results.append(dict(benches[name](), payload_bytes=size))
+    return results
@@ -0,0 +1,30 @@
+"""
+Isolated working directory for benchmark runs
+SecurePay resolves its data files relative to the working directory, so every
+run gets a scratch copy of that layout and never touches the real data.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DATA_DIRS = ["bank/data", "vendor/data", "shared", "communication_data"]
+
+
+@contextmanager
+def bench_workspace(keep: bool = False):
+    """chdir into a fresh workspace with the expected data layout"""
+    previous = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="securepay-bench-")
+    for directory in DATA_DIRS:
+        os.makedirs(os.path.join(workdir, directory), exist_ok=True)
+
+    os.chdir(workdir)
+    try:
+        yield workdir
+    finally:
+        os.chdir(previous)
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
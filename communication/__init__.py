@@ -1,17 +1,36 @@
-from .message_bus import MessageBus
-from .protocols import (
-    MessageType, 
-    TransactionStatus, 
-    PaymentMessage, 
-    MessageFactory, 
-    ProtocolValidator
-)
+"""
+Communication layer for SecurePay
+Message bus transports (queue files, shared-memory rings), the payment
+message protocol and bank routing
 
-__all__ = [
-    'MessageBus', 
-    'MessageType', 
-    'TransactionStatus', 
-    'PaymentMessage', 
-    'MessageFactory', 
-    'ProtocolValidator'
-]
\ No newline at end of file
+Attributes are imported lazily (PEP 562).
+"""
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'MessageBus': '.message_bus',
+    'create_bus': '.message_bus',
+    'ShmMessageBus': '.shm_bus',
+    'ShmRing': '.shm_ring',
+    'MessageType': '.protocols',
+    'TransactionStatus': '.protocols',
+    'PaymentMessage': '.protocols',
+    'MessageFactory': '.protocols',
+    'ProtocolValidator': '.protocols',
+    'BankRouter': '.routing',
+    'RoutingTable': '.routing',
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value  # Later lookups skip __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
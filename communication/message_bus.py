@@ -1,33 +1,104 @@
+import glob
 import json
+import re
 import time
 import os
 import uuid
+from contextlib import contextmanager
+import threading
 from threading import Lock
-import sys
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    import fcntl  # POSIX only; elsewhere only threads of one process are serialized
+except ImportError:
+    fcntl = None
+
+from shared.config import Config
+from shared.metrics import metrics
+
+MERCHANT_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
 
 class MessageBus:
-    def __init__(self):
-        self.comm_dir = "communication_data"
+    def __init__(self, comm_dir: str = None):
+        self.comm_dir = comm_dir or Config.COMM_DIR
         os.makedirs(self.comm_dir, exist_ok=True)
         self.vendor_to_bank_file = os.path.join(self.comm_dir, "vendor_to_bank.json")
         self.bank_to_vendor_file = os.path.join(self.comm_dir, "bank_to_vendor.json")
         self.lock = Lock()
+        self.lock_file = os.path.join(self.comm_dir, ".bus.lock")
+        
+        # Correlated response waiters share one poller (see _await_response)
+        self._waiters = {}
+        self._waiters_lock = Lock()
+        self._poll_lock = Lock()
+        self._last_response_poll = 0.0
+        self.response_poll_interval = 0.05
+        
+        # Metrics
+        self.send_to_bank_latency = metrics.histogram('bus_send_us', {'queue': 'vendor_to_bank'})
+        self.send_to_vendor_latency = metrics.histogram('bus_send_us', {'queue': 'bank_to_vendor'})
+        self.receive_from_vendor_latency = metrics.histogram('bus_receive_us', {'queue': 'vendor_to_bank'})
+        self.receive_from_bank_wait = metrics.histogram('bus_response_wait_us', {'queue': 'bank_to_vendor'})
+        self.vendor_queue_depth = metrics.gauge('bus_queue_depth', {'queue': 'vendor_to_bank'})
     
-    def send_to_bank(self, message: str):
-        """Send encrypted message to bank via file"""
+    @contextmanager
+    def locked(self):
+        """
+        Serialize read-modify-write of the queue files across threads and
+        processes. Vendor and bank each own a MessageBus, so the thread lock
+        alone lets one side's write silently drop the other side's update.
+        """
         with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_file, "a") as lock_handle:
+                fcntl.flock(lock_handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_handle, fcntl.LOCK_UN)
+    
+    def partition_file(self, merchant_id: str = None) -> str:
+        """
+        Vendor -> bank queue file for one merchant. Each merchant has its own
+        partition, so a large backlog from one merchant is neither rewritten
+        by other merchants' sends nor queued ahead of their requests.
+        """
+        if merchant_id is None:
+            return self.vendor_to_bank_file
+        if not MERCHANT_ID_PATTERN.fullmatch(merchant_id):
+            raise ValueError(f"Invalid merchant id: {merchant_id!r}")
+        return os.path.join(self.comm_dir, f"vendor_to_bank.{merchant_id}.json")
+    
+    def _vendor_partition_files(self) -> list:
+        """The shared queue file (messages without a merchant) plus every merchant partition"""
+        return [self.vendor_to_bank_file] + sorted(
+            glob.glob(os.path.join(self.comm_dir, "vendor_to_bank.*.json")))
+    
+    def send_to_bank(self, message: str, merchant_id: str = None, message_type: str = None,
+                     correlation_id: str = None):
+        """
+        Send encrypted message to bank via file. merchant_id and message_type
+        travel in clear on the envelope so the bank can schedule the request
+        before decrypting it; correlation_id names the answer the sender
+        will wait for.
+        """
+        partition_file = self.partition_file(merchant_id)
+        with self.locked(), self.send_to_bank_latency.time():
             message_data = {
                 'id': str(uuid.uuid4()),
                 'timestamp': time.time(),
                 'message': message,
+                'merchant_id': merchant_id,
+                'message_type': message_type,
+                'correlation_id': correlation_id,
                 'read': False
             }
             
             # Read existing messages
             try:
-                with open(self.vendor_to_bank_file, 'r') as f:
+                with open(partition_file, 'r') as f:
                     messages = json.load(f)
             except (FileNotFoundError, json.JSONDecodeError):
                 messages = []
@@ -36,18 +107,19 @@ class MessageBus:
             messages.append(message_data)
             
             # Write back
-            with open(self.vendor_to_bank_file, 'w') as f:
+            with open(partition_file, 'w') as f:
                 json.dump(messages, f, indent=2)
             
             print(f"📤 Vendor → Bank: Message {message_data['id'][:8]} sent")
     
-    def send_to_vendor(self, message: str):
+    def send_to_vendor(self, message: str, correlation_id: str = None):
         """Send encrypted message to vendor via file"""
-        with self.lock:
+        with self.locked(), self.send_to_vendor_latency.time():
             message_data = {
                 'id': str(uuid.uuid4()),
                 'timestamp': time.time(),
                 'message': message,
+                'correlation_id': correlation_id,
                 'read': False
             }
             
@@ -67,18 +139,52 @@ class MessageBus:
             
             print(f"📤 Bank → Vendor: Message {message_data['id'][:8]} sent")
     
-    def receive_from_bank(self, timeout: int = 10):
-        """Receive message from bank with timeout"""
+    def send_batch_to_vendor(self, messages: list):
+        """Send several (message, correlation_id) pairs in one read/write of the queue file"""
+        if not messages:
+            return
+        with self.locked(), self.send_to_vendor_latency.time():
+            try:
+                with open(self.bank_to_vendor_file, 'r') as f:
+                    queued = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                queued = []
+            
+            now = time.time()
+            for message, correlation_id in messages:
+                queued.append({
+                    'id': str(uuid.uuid4()),
+                    'timestamp': now,
+                    'message': message,
+                    'correlation_id': correlation_id,
+                    'read': False
+                })
+            
+            with open(self.bank_to_vendor_file, 'w') as f:
+                json.dump(queued, f, indent=2)
+            
+            print(f"📤 Bank → Vendor: {len(messages)} message(s) sent")
+    
+    def receive_from_bank(self, timeout: int = 10, correlation_id: str = None):
+        """
+        Receive message from bank with timeout
+        If correlation_id is given, only the response for that transaction is
+        consumed, so several vendor workers can wait on the bus concurrently.
+        """
         start_time = time.time()
+        if correlation_id is not None:
+            return self._await_response(correlation_id, timeout, start_time)
         
         while time.time() - start_time < timeout:
-            with self.lock:
+            with self.locked():
                 try:
                     with open(self.bank_to_vendor_file, 'r') as f:
                         messages = json.load(f)
                     
                     # Find unread messages
-                    unread_messages = [msg for msg in messages if not msg.get('read', False)]
+                    unread_messages = [msg for msg in messages if not msg.get('read', False)
+                                       and (correlation_id is None or
+                                            msg.get('correlation_id') == correlation_id)]
                     
                     if unread_messages:
                         message = unread_messages[0]
@@ -92,6 +198,7 @@ class MessageBus:
                             json.dump(messages, f, indent=2)
                         
                         print(f"📥 Vendor ← Bank: Message {message['id'][:8]} received")
+                        self.receive_from_bank_wait.record((time.time() - start_time) * 1e6)
                         return message['message']
                 
                 except (FileNotFoundError, json.JSONDecodeError):
@@ -102,41 +209,146 @@ class MessageBus:
         print("⏰ Vendor: Timeout waiting for bank response")
         return None
     
-    def receive_from_vendor(self):
-        """Receive message from vendor (non-blocking)"""
-        with self.lock:
+    def _await_response(self, correlation_id: str, timeout: float, start_time: float):
+        """
+        Wait for one correlated response. All waiting threads share a single
+        poller: whichever thread is due reads the file once and hands every
+        arrived response to its waiter, so the cost of polling does not grow
+        with the number of payments in flight.
+        """
+        slot = {'event': threading.Event(), 'message': None}
+        with self._waiters_lock:
+            self._waiters[correlation_id] = slot
+        try:
+            deadline = start_time + timeout
+            while slot['message'] is None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                if (time.time() - self._last_response_poll >= self.response_poll_interval and
+                        self._poll_lock.acquire(blocking=False)):
+                    try:
+                        self._last_response_poll = time.time()
+                        self._deliver_responses()
+                    finally:
+                        self._poll_lock.release()
+                    if slot['message'] is not None:
+                        break
+                slot['event'].wait(min(self.response_poll_interval, max(remaining, 0)))
+        finally:
+            with self._waiters_lock:
+                self._waiters.pop(correlation_id, None)
+        
+        if slot['message'] is None:
+            print("⏰ Vendor: Timeout waiting for bank response")
+            return None
+        print(f"📥 Vendor ← Bank: Message for {correlation_id[:8]} received")
+        self.receive_from_bank_wait.record((time.time() - start_time) * 1e6)
+        return slot['message']
+    
+    def _deliver_responses(self):
+        """Consume unread responses that have a waiter, in one read/write of the file"""
+        with self.locked():
             try:
-                with open(self.vendor_to_bank_file, 'r') as f:
+                with open(self.bank_to_vendor_file, 'r') as f:
                     messages = json.load(f)
-                
-                # Find unread messages
-                unread_messages = [msg for msg in messages if not msg.get('read', False)]
-                
-                if unread_messages:
-                    message = unread_messages[0]
-                    # Mark as read
-                    for msg in messages:
-                        if msg['id'] == message['id']:
-                            msg['read'] = True
-                    
-                    # Write back
-                    with open(self.vendor_to_bank_file, 'w') as f:
-                        json.dump(messages, f, indent=2)
-                    
-                    print(f"📥 Bank ← Vendor: Message {message['id'][:8]} received")
-                    return message['message']
-            
             except (FileNotFoundError, json.JSONDecodeError):
-                pass
-        
-        return None
+                return
+            
+            delivered = []
+            with self._waiters_lock:
+                for msg in messages:
+                    if msg.get('read', False):
+                        continue
+                    slot = self._waiters.get(msg.get('correlation_id'))
+                    if slot is not None and slot['message'] is None:
+                        msg['read'] = True
+                        slot['message'] = msg['message']
+                        delivered.append(slot)
+            
+            if delivered:
+                with open(self.bank_to_vendor_file, 'w') as f:
+                    json.dump(messages, f, indent=2)
+        for slot in delivered:
+            slot['event'].set()
+    
+    def receive_from_vendor(self):
+        """Receive message from vendor (non-blocking)"""
+        envelopes = self.receive_envelopes_from_vendor(1)
+        return envelopes[0]['message'] if envelopes else None
+    
+    def receive_envelopes_from_vendor(self, limit: int = 100) -> list:
+        """
+        Receive up to `limit` message envelopes from every partition in one
+        pass (non-blocking). Partitions are drained round-robin, one message
+        at a time, so a merchant with a large backlog cannot fill the batch.
+        """
+        with self.locked(), self.receive_from_vendor_latency.time():
+            partitions = []
+            for path in self._vendor_partition_files():
+                try:
+                    with open(path, 'r') as f:
+                        messages = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+                unread = [msg for msg in messages if not msg.get('read', False)]
+                if unread:
+                    partitions.append({'path': path, 'messages': messages, 'unread': unread, 'taken': 0})
+            
+            batch = []
+            while len(batch) < limit:
+                progress = False
+                for partition in partitions:
+                    if partition['taken'] < len(partition['unread']) and len(batch) < limit:
+                        msg = partition['unread'][partition['taken']]
+                        msg['read'] = True
+                        batch.append(msg)
+                        partition['taken'] += 1
+                        progress = True
+                if not progress:
+                    break
+            
+            unread_total = sum(len(partition['unread']) for partition in partitions)
+            self.vendor_queue_depth.set(unread_total - len(batch))
+            
+            for partition in partitions:
+                if partition['taken']:
+                    with open(partition['path'], 'w') as f:
+                        json.dump(partition['messages'], f, indent=2)
+            if batch:
+                print(f"📥 Bank ← Vendor: {len(batch)} message(s) received")
+            return batch
+    
+    def wait_for_vendor(self, timeout: float, stop_event: threading.Event = None):
+        """Idle between empty polls: sleep until timeout (or stop_event is set)"""
+        if stop_event is not None:
+            stop_event.wait(timeout)
+        else:
+            time.sleep(timeout)
+    
+    def close(self):
+        """Release transport resources (none for the file queues)"""
     
     def clear_queues(self):
         """Clear all messages (for testing)"""
-        with self.lock:
-            for file_path in [self.vendor_to_bank_file, self.bank_to_vendor_file]:
+        with self.locked():
+            for file_path in self._vendor_partition_files() + [self.bank_to_vendor_file]:
                 try:
                     with open(file_path, 'w') as f:
                         json.dump([], f)
                 except:
-                    pass
\ No newline at end of file
+                    pass
+
+
+def create_bus(role: str, comm_dir: str = None) -> MessageBus:
+    """
+    Bus for the vendor's or the bank's main loop, using Config.BUS_TRANSPORT:
+    "file" (the JSON queue files) or "shm" (shared-memory rings, see
+    communication.shm_bus). Other senders keep using MessageBus directly.
+    """
+    if Config.BUS_TRANSPORT == "shm":
+        from communication.shm_bus import ShmMessageBus
+        return ShmMessageBus(comm_dir, role)
+    if Config.BUS_TRANSPORT != "file":
+        raise ValueError(f"Unknown bus transport: {Config.BUS_TRANSPORT}")
+    return MessageBus(comm_dir)
@@ -2,14 +2,21 @@ from dataclasses import dataclass
 from typing import Dict, Any, Optional, Tuple
 from enum import Enum
 import json
+import random
+import string
+import uuid
 from datetime import datetime
 
+from shared.config import Config
+
 class MessageType(Enum):
     PAYMENT_REQUEST = "payment_request"
+    BULK_PAYMENT_REQUEST = "bulk_payment_request"  # Batch work, scheduled behind interactive payments
     PAYMENT_RESPONSE = "payment_response"
     TOKENIZATION_REQUEST = "tokenization_request"
     TOKENIZATION_RESPONSE = "tokenization_response"
     STATUS_CHECK = "status_check"
+    PROFILE_CONTROL = "profile_control"  # Start/stop the bank's profiler (shared.profiler)
     ERROR = "error"
 
 class TransactionStatus(Enum):
@@ -18,6 +25,7 @@ class TransactionStatus(Enum):
     DECLINED = "declined"
     FRAUD = "fraud"
     ERROR = "error"
+    RETRY_LATER = "retry_later"  # Bank is shedding load; resend after a back-off
 
 @dataclass
 class PaymentMessage:
@@ -54,17 +62,18 @@ class MessageFactory:
     """Factory for creating standardized messages"""
     
     @staticmethod
-    def create_payment_request(card_data: Dict, amount: float, token: str = None) -> PaymentMessage:
+    def create_payment_request(card_data: Dict, amount: float, token: str = None,
+                               merchant_id: str = None, bulk: bool = False) -> PaymentMessage:
         """Create a payment request message"""
         return PaymentMessage(
-            message_type=MessageType.PAYMENT_REQUEST,
+            message_type=MessageType.BULK_PAYMENT_REQUEST if bulk else MessageType.PAYMENT_REQUEST,
             transaction_id=MessageFactory._generate_transaction_id(),
             timestamp=datetime.now().isoformat(),
             payload={
                 'card_data': card_data,
                 'amount': amount,
                 'token': token,
-                'merchant_id': 'VENDOR_001'  # In real system, this would be configurable
+                'merchant_id': merchant_id or Config.MERCHANT_ID
             }
         )
     
@@ -101,14 +110,11 @@ class MessageFactory:
     @staticmethod
     def _generate_transaction_id() -> str:
         """Generate unique transaction ID"""
-        import uuid
         return f"TXN_{uuid.uuid4().hex[:8].upper()}"
     
     @staticmethod
     def _generate_auth_code() -> str:
         """Generate authorization code"""
-        import random
-        import string
         return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
 class ProtocolValidator:
@@ -132,7 +138,7 @@ class ProtocolValidator:
                 return False, "Invalid timestamp format"
             
             # Validate payload based on message type
-            if message.message_type == MessageType.PAYMENT_REQUEST:
+            if message.message_type in (MessageType.PAYMENT_REQUEST, MessageType.BULK_PAYMENT_REQUEST):
                 return ProtocolValidator._validate_payment_request(message.payload)
             elif message.message_type == MessageType.PAYMENT_RESPONSE:
                 return ProtocolValidator._validate_payment_response(message.payload)
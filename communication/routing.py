@@ -0,0 +1,306 @@
+"""
+Bank routing
+Maps every card number to the bank instance that owns it, so authorization
+can be spread over several bank processes. Each instance has its own bus
+directory and its own partition of the cards.
+
+The routing table lives in ROUTING_FILE:
+
+    {
+      "version": 2,
+      "strategy": "consistent_hash",
+      "instances": {
+        "bank-1": {"comm_dir": "communication_data/bank-1", "weight": 1},
+        "bank-2": {"comm_dir": "communication_data/bank-2", "weight": 2}
+      }
+    }
+
+    consistent_hash  PANs are placed on a hash ring with ROUTING_VNODES
+                     points per unit of weight; adding an instance moves
+                     only the cards it takes over
+    bin_ranges       "bin_ranges": [["400000", "499999", "bank-1"], ...]
+                     matched on the first six digits (ranges must not
+                     overlap); "default" owns BINs no range covers
+
+Without the file every card goes to a single bank on COMM_DIR. Routers
+re-read the file when it changes, so instances are added, removed or
+reweighted without restarting anything: the vendor sends new requests to
+the new owner and each bank hands the cards it no longer owns to theirs
+(see BankService).
+
+    python -m communication.routing set bank-1 bank-2 bank-3=2
+    python -m communication.routing split-cards bank/data/valid_cards.json
+    python -m communication.routing show
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+
+from shared.config import Config
+
+CONSISTENT_HASH = 'consistent_hash'
+BIN_RANGES = 'bin_ranges'
+BIN_DIGITS = 6
+DEFAULT_INSTANCE = 'bank'  # The single bank used when there is no routing file
+
+
+def _hash(key: str) -> int:
+    """Stable 64-bit hash (hash() differs between processes)"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+def default_comm_dir(instance: str) -> str:
+    return os.path.join(os.path.dirname(Config.ROUTING_FILE) or ".", instance)
+
+
+def instance_data_dir(instance: str) -> str:
+    return os.path.join(Config.BANK_INSTANCES_DIR, instance)
+
+
+class RoutingTable:
+    """One immutable version of the routing file"""
+
+    def __init__(self, data: dict):
+        self.version = int(data.get('version', 0))
+        self.strategy = data.get('strategy', CONSISTENT_HASH)
+        instances = data.get('instances') or {}
+        if not instances:
+            raise ValueError("Routing table lists no bank instances")
+        self.instances = {}
+        for name, spec in instances.items():
+            spec = spec or {}
+            weight = int(spec.get('weight', 1))
+            if weight < 1:
+                raise ValueError(f"Instance {name}: weight must be at least 1")
+            self.instances[name] = {'comm_dir': spec.get('comm_dir') or default_comm_dir(name),
+                                    'weight': weight}
+        self.default = data.get('default') or next(iter(self.instances))
+        if self.default not in self.instances:
+            raise ValueError(f"Default instance {self.default} is not listed")
+
+        if self.strategy == CONSISTENT_HASH:
+            points = sorted((_hash(f"{name}#{vnode}"), name)
+                            for name, spec in self.instances.items()
+                            for vnode in range(spec['weight'] * Config.ROUTING_VNODES))
+            self.ring = [point for point, _ in points]
+            self.ring_owners = [name for _, name in points]
+        elif self.strategy == BIN_RANGES:
+            ranges = sorted((int(low), int(high), name) for low, high, name in data.get('bin_ranges', []))
+            for low, high, name in ranges:
+                if name not in self.instances:
+                    raise ValueError(f"BIN range {low}-{high}: unknown instance {name}")
+                if low > high:
+                    raise ValueError(f"BIN range {low}-{high} is empty")
+            for (_, high, _), (low, _, _) in zip(ranges, ranges[1:]):
+                if low <= high:
+                    raise ValueError(f"BIN ranges overlap at {low}")
+            self.range_lows = [low for low, _, _ in ranges]
+            self.ranges = ranges
+        else:
+            raise ValueError(f"Unknown routing strategy: {self.strategy}")
+
+    @classmethod
+    def single(cls) -> "RoutingTable":
+        return cls({'instances': {DEFAULT_INSTANCE: {'comm_dir': Config.COMM_DIR}}})
+
+    def owner(self, card_number: str) -> str:
+        if self.strategy == CONSISTENT_HASH:
+            if len(self.instances) == 1:
+                return self.default
+            i = bisect_right(self.ring, _hash(card_number))
+            return self.ring_owners[i % len(self.ring)]
+        bin_number = int(card_number[:BIN_DIGITS].ljust(BIN_DIGITS, '0'))
+        i = bisect_right(self.range_lows, bin_number) - 1
+        if i >= 0 and bin_number <= self.ranges[i][1]:
+            return self.ranges[i][2]
+        return self.default
+
+    def shares(self) -> dict:
+        """Fraction of the key space (hash ring or BIN space) each instance owns"""
+        shares = dict.fromkeys(self.instances, 0.0)
+        if self.strategy == CONSISTENT_HASH:
+            if len(self.instances) == 1:
+                shares[self.default] = 1.0
+                return shares
+            previous = self.ring[-1] - 2 ** 64
+            for point, name in zip(self.ring, self.ring_owners):
+                shares[name] += (point - previous) / 2 ** 64
+                previous = point
+            return shares
+        space = 10 ** BIN_DIGITS
+        covered = 0
+        for low, high, name in self.ranges:
+            shares[name] += (high - low + 1) / space
+            covered += high - low + 1
+        shares[self.default] += (space - covered) / space
+        return shares
+
+    def to_dict(self) -> dict:
+        data = {'version': self.version, 'strategy': self.strategy,
+                'instances': self.instances, 'default': self.default}
+        if self.strategy == BIN_RANGES:
+            data['bin_ranges'] = [[str(low).zfill(BIN_DIGITS), str(high).zfill(BIN_DIGITS), name]
+                                  for low, high, name in self.ranges]
+        return data
+
+
+class BankRouter:
+    """
+    Card number -> bank instance, following ROUTING_FILE. Lookups use the
+    current RoutingTable; a changed file is swapped in whole, so a lookup
+    never sees half of an update.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.ROUTING_FILE
+        self.lock = threading.Lock()
+        self._stamp = None
+        self._checked_at = 0.0
+        self.table = RoutingTable.single()
+        self.maybe_reload(force=True)
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        """
+        Re-read the routing file if it changed (checked at most every
+        ROUTING_RELOAD_SECONDS unless forced). Returns True if the table changed.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < Config.ROUTING_RELOAD_SECONDS:
+            return False
+        with self.lock:
+            self._checked_at = now
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            try:
+                if stamp is None:
+                    table = RoutingTable.single()
+                else:
+                    with open(self.path, "r") as f:
+                        table = RoutingTable(json.load(f))
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                print(f"⚠️  Routing file {self.path} ignored, keeping version {self.table.version}: {e}")
+                return False
+            if table.to_dict() == self.table.to_dict():
+                return False
+            self.table = table
+            print(f"🧭 Routing table v{table.version} ({table.strategy}): {', '.join(table.instances)}")
+            return True
+
+    def owner(self, card_number: str) -> str:
+        self.maybe_reload()
+        return self.table.owner(card_number)
+
+    def comm_dir(self, instance: str) -> str:
+        spec = self.table.instances.get(instance)
+        return spec['comm_dir'] if spec else default_comm_dir(instance)
+
+    @property
+    def instances(self) -> list:
+        return list(self.table.instances)
+
+    @property
+    def version(self) -> int:
+        return self.table.version
+
+    def stats(self) -> dict:
+        table = self.table
+        shares = table.shares()
+        return {
+            'version': table.version,
+            'strategy': table.strategy,
+            'instances': {name: dict(spec, share=round(shares[name], 4))
+                          for name, spec in table.instances.items()}
+        }
+
+
+def save_routing(data: dict, path: str = None):
+    """Write a routing table atomically (validated first); routers pick it up on their next check"""
+    path = path or Config.ROUTING_FILE
+    RoutingTable(data)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp, path)
+
+
+def configure_instance(instance: str):
+    """Point this process's Config at one bank instance's bus directory and data"""
+    router = BankRouter()
+    if instance not in router.table.instances:
+        raise ValueError(f"Bank instance {instance} is not in {router.path}")
+    data_dir = instance_data_dir(instance)
+    Config.BANK_INSTANCE = instance
+    Config.COMM_DIR = router.comm_dir(instance)
+    Config.BANK_DATA_DIR = data_dir
+    Config.HISTORY_DIR = os.path.join(data_dir, "history")
+    Config.HISTORY_DB = os.path.join(data_dir, "history.db")
+    Config.SETTLEMENT_DIR = os.path.join(data_dir, "settlement")
+    Config.LEDGER_DIR = os.path.join(data_dir, "ledger")
+    os.makedirs(data_dir, exist_ok=True)
+
+
+def split_cards(cards_file: str, router: BankRouter = None) -> dict:
+    """Write each instance's share of a valid_cards.json into its data directory"""
+    router = router or BankRouter()
+    with open(cards_file, "r") as f:
+        cards = json.load(f)
+    partitions = {name: {} for name in router.instances}
+    for card_number, card_info in cards.items():
+        partitions[router.table.owner(card_number)][card_number] = card_info
+    for name, partition in partitions.items():
+        os.makedirs(instance_data_dir(name), exist_ok=True)
+        with open(os.path.join(instance_data_dir(name), "valid_cards.json"), "w") as f:
+            json.dump(partition, f, indent=2)
+    return {name: len(partition) for name, partition in partitions.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or change the bank routing table")
+    parser.add_argument("--file", default=Config.ROUTING_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="print the routing table and each instance's share")
+    owner = commands.add_parser("owner", help="print the instance that owns a card")
+    owner.add_argument("card_number")
+    set_instances = commands.add_parser("set", help="route by consistent hash over these instances")
+    set_instances.add_argument("instances", nargs="+", metavar="NAME[=WEIGHT]")
+    split = commands.add_parser("split-cards", help="partition a valid_cards.json by owner")
+    split.add_argument("cards_file")
+    args = parser.parse_args()
+
+    router = BankRouter(args.file)
+    if args.command == "set":
+        instances = {}
+        for item in args.instances:
+            name, _, weight = item.partition("=")
+            previous = router.table.instances.get(name, {})
+            instances[name] = {'comm_dir': previous.get('comm_dir') or default_comm_dir(name),
+                               'weight': int(weight or 1)}
+        save_routing({'version': router.version + 1, 'strategy': CONSISTENT_HASH,
+                      'instances': instances}, args.file)
+        router.maybe_reload(force=True)
+    elif args.command == "owner":
+        print(router.owner(args.card_number))
+        return
+    elif args.command == "split-cards":
+        for name, count in split_cards(args.cards_file, router).items():
+            print(f"{name}: {count} cards -> {instance_data_dir(name)}/valid_cards.json")
+        return
+    print(json.dumps(router.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
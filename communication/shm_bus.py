@@ -0,0 +1,332 @@
+"""
+Shared-memory transport for a co-located vendor and bank
+Same interface as MessageBus; payment requests and their answers travel
+through two ShmRing segments (vendor -> bank, bank -> vendor) instead of
+the JSON queue files. The file queues stay in place and are still read, so
+everything that is not the vendor's hot path keeps working unchanged:
+profiler control messages, card hand-offs between bank instances, a
+second vendor process, and any message the ring had no room for.
+
+- The bank creates both rings when it starts (replacing stale ones) and
+  unlinks them when it stops.
+- One vendor process claims the producer end with an exclusive lock on
+  <comm_dir>/.ring.vendor.lock; other vendor processes use the files.
+- The bank answers on the ring exactly the requests that arrived on it, so
+  a reply always takes the path its waiter is watching.
+- The vendor re-checks the ring's epoch every SHM_RECHECK_SECONDS and
+  re-attaches after a bank restart.
+
+Frames carry the envelope as ASCII fields separated by \\x1f (message
+bodies are base64 ciphertext or ids): timestamp, merchant_id, message_type,
+correlation_id, message on the way in; correlation_id, message on the way
+back. Nothing is printed per message on this path.
+
+Enable with Config.BUS_TRANSPORT = "shm" on both sides.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from shared.config import Config
+from shared.metrics import metrics
+from communication.message_bus import MessageBus
+from communication.shm_ring import ShmRing
+
+SEPARATOR = "\x1f"
+
+
+def ring_names(comm_dir: str) -> tuple:
+    """(vendor -> bank, bank -> vendor) segment names for one bus directory"""
+    digest = hashlib.sha1(os.path.abspath(comm_dir).encode()).hexdigest()[:12]
+    return f"securepay-{digest}-v2b", f"securepay-{digest}-b2v"
+
+
+class ShmMessageBus(MessageBus):
+    def __init__(self, comm_dir: str = None, role: str = "vendor"):
+        super().__init__(comm_dir)
+        if role not in ("bank", "vendor"):
+            raise ValueError(f"Unknown bus role: {role}")
+        self.role = role
+        self.to_bank_name, self.to_vendor_name = ring_names(self.comm_dir)
+        self.to_bank = None  # ShmRing, or None while the files are used
+        self.to_vendor = None
+        self._send_lock = threading.Lock()  # One producer per ring
+        self._receive_lock = threading.Lock()  # One consumer per ring
+        self._closed = False
+
+        queue = 'vendor_to_bank' if role == "vendor" else 'bank_to_vendor'
+        self.ring_sends = metrics.counter('bus_ring_messages_total', {'queue': queue})
+        self.ring_fallbacks = metrics.counter('bus_ring_fallback_total', {'queue': queue})
+
+        if role == "bank":
+            self._ring_requests = OrderedDict()  # correlation ids that arrived on the ring
+            self._requests_lock = threading.Lock()
+            self._last_file_poll = 0.0
+            self.ring_used = metrics.gauge('bus_ring_bytes', {'queue': 'vendor_to_bank'})
+            self.to_bank = ShmRing.create(self.to_bank_name, Config.SHM_RING_BYTES)
+            self.to_vendor = ShmRing.create(self.to_vendor_name, Config.SHM_RING_BYTES,
+                                            self.to_bank.epoch)
+            print(f"🧵 Shared-memory bus ready ({Config.SHM_RING_BYTES // 1024} KiB per direction)")
+        else:
+            self._ring_waiters = set()  # correlation ids whose answer comes on the ring
+            self._arrived = OrderedDict()  # answers that beat their waiter's registration
+            self._lock_handle = None
+            self._epoch = None
+            self._checked_at = 0.0
+            self._attach_lock = threading.Lock()
+            self._reader = None
+            self._attach()
+
+    # --- vendor side ---
+
+    def _claim(self) -> bool:
+        """Become the ring's single producer (held for the process lifetime)"""
+        if self._lock_handle is not None:
+            return True
+        if fcntl is None:
+            return False
+        handle = open(os.path.join(self.comm_dir, ".ring.vendor.lock"), "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_handle = handle
+        return True
+
+    def _attach(self):
+        self._checked_at = time.monotonic()
+        if not self._claim():
+            return
+        try:
+            to_bank = ShmRing.attach(self.to_bank_name)
+            to_vendor = ShmRing.attach(self.to_vendor_name)
+        except (FileNotFoundError, ValueError):
+            return  # No bank on this host (yet); the files work meanwhile
+        if to_bank.closed or to_bank.epoch != to_vendor.epoch or to_vendor.closed:
+            to_bank.close()
+            to_vendor.close()
+            return
+        to_vendor.skip()  # Answers left in the ring for an earlier vendor are not ours
+        self.to_bank, self.to_vendor, self._epoch = to_bank, to_vendor, to_bank.epoch
+        self._reader = threading.Thread(target=self._read_answers, args=(to_vendor,),
+                                        name="vendor-ring-reader", daemon=True)
+        self._reader.start()
+        print(f"🧵 Vendor attached to the shared-memory bus ({self.comm_dir})")
+
+    def _recheck(self):
+        """Follow bank restarts: drop a closed or replaced ring, attach a new one"""
+        self._checked_at = time.monotonic()
+        if self.to_bank is not None and (self.to_bank.closed or
+                                         ShmRing.read_epoch(self.to_bank_name) != self._epoch):
+            self._detach()
+        if self.to_bank is None:
+            self._attach()
+
+    def _detach(self):
+        to_bank, to_vendor, reader = self.to_bank, self.to_vendor, self._reader
+        self.to_bank = self.to_vendor = self._reader = None
+        if reader is not None:
+            reader.join()
+        with self._send_lock:
+            to_bank.close()
+        to_vendor.close()
+        # Requests sent on the old ring will not be answered on it
+        with self._waiters_lock:
+            self._ring_waiters.clear()
+
+    def _read_answers(self, ring: ShmRing):
+        while self.to_vendor is ring:
+            if not ring.wait(Config.POLL_INTERVAL):
+                continue
+            delivered = []
+            with self._waiters_lock:
+                while True:
+                    view = ring.peek()
+                    if view is None:
+                        break
+                    correlation_id, _, message = bytes(view).decode().partition(SEPARATOR)
+                    slot = self._waiters.get(correlation_id)
+                    if slot is not None and slot['message'] is None:
+                        slot['message'] = message
+                        delivered.append(slot)
+                    else:
+                        self._arrived[correlation_id] = message
+                        if len(self._arrived) > Config.SHM_TRACKED_REQUESTS:
+                            self._arrived.popitem(last=False)
+                ring.commit()
+            for slot in delivered:
+                slot['event'].set()
+
+    def send_to_bank(self, message: str, merchant_id: str = None, message_type: str = None,
+                     correlation_id: str = None):
+        if self.role == "bank":
+            return super().send_to_bank(message, merchant_id, message_type, correlation_id)
+        if (time.monotonic() - self._checked_at >= Config.SHM_RECHECK_SECONDS and
+                self._attach_lock.acquire(blocking=False)):
+            try:
+                self._recheck()
+            finally:
+                self._attach_lock.release()
+        ring = self.to_bank
+        if ring is None or correlation_id is None:
+            return super().send_to_bank(message, merchant_id, message_type, correlation_id)
+        self.partition_file(merchant_id)  # Same merchant id validation as the files
+        with self.send_to_bank_latency.time():
+            frame = SEPARATOR.join((repr(time.time()), merchant_id or "", message_type or "",
+                                    correlation_id, message)).encode()
+            with self._waiters_lock:
+                self._ring_waiters.add(correlation_id)
+            with self._send_lock:
+                sent = ring.send((frame,)) if self.to_bank is ring else 0
+        if sent:
+            self.ring_sends.inc()
+            return
+        with self._waiters_lock:
+            self._ring_waiters.discard(correlation_id)
+        self.ring_fallbacks.inc()
+        super().send_to_bank(message, merchant_id, message_type, correlation_id)
+
+    def _await_response(self, correlation_id: str, timeout: float, start_time: float):
+        if self.role != "vendor":
+            return super()._await_response(correlation_id, timeout, start_time)
+        slot = {'event': threading.Event(), 'message': None}
+        with self._waiters_lock:
+            if correlation_id not in self._ring_waiters:
+                slot = None
+            elif correlation_id in self._arrived:
+                slot['message'] = self._arrived.pop(correlation_id)
+            else:
+                self._waiters[correlation_id] = slot
+        if slot is None:
+            return super()._await_response(correlation_id, timeout, start_time)
+        try:
+            deadline = start_time + timeout
+            while slot['message'] is None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                # Answers sent through the files (ring full at the bank) are rare; look now and then
+                if not slot['event'].wait(min(Config.POLL_INTERVAL, remaining)):
+                    with self._poll_lock:
+                        self._deliver_responses()
+        finally:
+            with self._waiters_lock:
+                self._waiters.pop(correlation_id, None)
+                self._ring_waiters.discard(correlation_id)
+
+        if slot['message'] is None:
+            print("⏰ Vendor: Timeout waiting for bank response")
+            return None
+        self.receive_from_bank_wait.record((time.time() - start_time) * 1e6)
+        return slot['message']
+
+    # --- bank side ---
+
+    def receive_envelopes_from_vendor(self, limit: int = 100) -> list:
+        """
+        Ring frames first, then the file queues - on every call while the
+        ring is idle, otherwise at most every POLL_INTERVAL so they are
+        never starved.
+        """
+        if self.role != "bank":
+            return super().receive_envelopes_from_vendor(limit)
+        batch = []
+        with self._receive_lock, self.receive_from_vendor_latency.time():
+            ring = self.to_bank
+            while len(batch) < limit:
+                view = ring.peek()
+                if view is None:
+                    break
+                (timestamp, merchant_id, message_type, correlation_id,
+                 message) = bytes(view).decode().split(SEPARATOR, 4)
+                batch.append({'id': correlation_id, 'timestamp': float(timestamp),
+                              'message': message, 'merchant_id': merchant_id or None,
+                              'message_type': message_type or None,
+                              'correlation_id': correlation_id, 'transport': 'shm', 'read': True})
+            ring.commit()
+            self.ring_used.set(ring.used())
+        if batch:
+            with self._requests_lock:
+                for envelope in batch:
+                    self._ring_requests[envelope['correlation_id']] = True
+                while len(self._ring_requests) > Config.SHM_TRACKED_REQUESTS:
+                    self._ring_requests.popitem(last=False)
+        now = time.monotonic()
+        if len(batch) < limit and (not batch or now - self._last_file_poll >= Config.POLL_INTERVAL):
+            self._last_file_poll = now
+            batch.extend(super().receive_envelopes_from_vendor(limit - len(batch)))
+        return batch
+
+    def wait_for_vendor(self, timeout: float, stop_event: threading.Event = None):
+        """Sleep on the ring until a request arrives, stop_event is set or timeout"""
+        if self.role != "bank":
+            return super().wait_for_vendor(timeout, stop_event)
+        deadline = time.monotonic() + timeout
+        while stop_event is None or not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.to_bank.wait(min(remaining, 0.1)):
+                return
+
+    def _take_ring_requests(self, messages: list) -> tuple:
+        """Split (message, correlation_id) pairs into ring-bound frames and file-bound pairs"""
+        frames, files = [], []
+        with self._requests_lock:
+            for message, correlation_id in messages:
+                if correlation_id is not None and self._ring_requests.pop(correlation_id, None):
+                    frames.append((SEPARATOR.join((correlation_id, message)).encode(),
+                                   (message, correlation_id)))
+                else:
+                    files.append((message, correlation_id))
+        return frames, files
+
+    def _send_frames(self, frames: list) -> list:
+        """Write frames to the ring, waiting briefly for room; returns the pairs that did not fit"""
+        with self._send_lock, self.send_to_vendor_latency.time():
+            ring = self.to_vendor
+            pending = frames
+            while pending:
+                sent = ring.send([frame for frame, _ in pending])
+                self.ring_sends.inc(sent)
+                pending = pending[sent:]
+                if pending and not ring.wait_for_space(len(pending[0][0]),
+                                                       Config.SHM_SEND_TIMEOUT):
+                    break
+        if pending:
+            self.ring_fallbacks.inc(len(pending))
+        return [pair for _, pair in pending]
+
+    def send_to_vendor(self, message: str, correlation_id: str = None):
+        if self.role != "bank":
+            return super().send_to_vendor(message, correlation_id)
+        frames, files = self._take_ring_requests([(message, correlation_id)])
+        for message, correlation_id in files + self._send_frames(frames):
+            super().send_to_vendor(message, correlation_id)
+
+    def send_batch_to_vendor(self, messages: list):
+        if self.role != "bank":
+            return super().send_batch_to_vendor(messages)
+        frames, files = self._take_ring_requests(messages)
+        super().send_batch_to_vendor(files + self._send_frames(frames))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.role == "bank":
+            self.to_bank.close()
+            self.to_vendor.close()
+            return
+        with self._attach_lock:
+            if self.to_bank is not None:
+                self._detach()
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
@@ -0,0 +1,338 @@
+"""
+Shared-memory ring buffer
+A single-producer/single-consumer byte ring in a
+multiprocessing.shared_memory segment. Frames are a u32 length followed by
+the payload, padded to 8 bytes. A frame that would straddle the end of the
+ring is preceded by a wrap marker and starts again at offset 0, so every
+frame is contiguous and readers get it as a memoryview of the segment
+itself, with no copy.
+
+Segment layout (little-endian, one 64-byte cache line per field group so
+producer and consumer never write the same line):
+    0    magic "SPRG", capacity, epoch, owner pid, closed flag
+    64   head  u64 - bytes ever written (producer only)
+    128  tail  u64 - bytes ever consumed (consumer only)
+    192  data signal u32, consumer-waiting u32
+    256  space signal u32, producer-waiting u32
+    320  data (capacity bytes, a power of two)
+
+An idle side sleeps in futex(FUTEX_WAIT) on its signal word and the other
+side wakes it with FUTEX_WAKE after publishing. The wait is bounded
+(WAIT_SLICE), so a wake-up lost to a race costs at most one slice. Without
+futex (not Linux, or an architecture whose syscall number is not listed
+below) waiting falls back to short sleeps.
+"""
+import ctypes
+import os
+import platform
+import random
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+try:
+    from _posixshmem import shm_unlink
+except ImportError:  # Windows: segments go away with their last handle
+    shm_unlink = None
+
+MAGIC = b"SPRG"
+HEADER = struct.Struct("<4sIQIB")
+HEAD_OFFSET = 64
+TAIL_OFFSET = 128
+DATA_SIGNAL_OFFSET = 192
+DATA_WAITING_OFFSET = 196
+SPACE_SIGNAL_OFFSET = 256
+SPACE_WAITING_OFFSET = 260
+DATA_OFFSET = 320
+CLOSED_OFFSET = 20
+
+WRAP = 0xFFFFFFFF
+WAIT_SLICE = 0.05  # Longest single futex sleep
+
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+FUTEX_WAIT = 0
+FUTEX_WAKE = 1
+_SYS_FUTEX = {'x86_64': 202, 'amd64': 202, 'aarch64': 98, 'arm64': 98,
+              'i386': 240, 'i686': 240, 'armv7l': 240}.get(platform.machine().lower())
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _load_futex():
+    if not sys.platform.startswith("linux") or _SYS_FUTEX is None:
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        syscall = libc.syscall
+    except (OSError, AttributeError):
+        return None
+    syscall.restype = ctypes.c_long
+    return syscall
+
+
+_syscall = _load_futex()
+HAVE_FUTEX = _syscall is not None
+
+
+def futex_wait(address: int, expected: int, timeout: float):
+    """Sleep while the u32 at address equals expected (or until woken / timeout)"""
+    seconds = int(timeout)
+    timespec = _Timespec(seconds, int((timeout - seconds) * 1e9))
+    _syscall(_SYS_FUTEX, ctypes.c_void_p(address), FUTEX_WAIT, ctypes.c_uint32(expected),
+             ctypes.byref(timespec), None, 0)
+
+
+def futex_wake(address: int, count: int = 1):
+    _syscall(_SYS_FUTEX, ctypes.c_void_p(address), FUTEX_WAKE, count, None, None, 0)
+
+
+def _segment(name: str, size: int = 0) -> shared_memory.SharedMemory:
+    """
+    Open (size 0) or create a segment without handing it to the resource
+    tracker. The tracker is shared with forked children and would unlink an
+    attached segment when any of them exits (Python < 3.13 tracks attached
+    segments too). Owners unlink their rings themselves, and a bank that was
+    killed has its rings replaced when it starts again.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, create=size > 0, size=size, track=False)
+    except TypeError:
+        segment = shared_memory.SharedMemory(name=name, create=size > 0, size=size)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+def _unlink(segment: shared_memory.SharedMemory):
+    """SharedMemory.unlink() would also unregister it from the tracker again"""
+    try:
+        if shm_unlink is not None:
+            shm_unlink(segment._name)
+    except FileNotFoundError:
+        pass
+
+
+class ShmRing:
+    """
+    One direction of a shared-memory channel. Exactly one process may
+    produce (send) and one may consume (peek/commit); each side is also
+    single-threaded, so callers serialize their own threads.
+    """
+
+    def __init__(self, segment: shared_memory.SharedMemory, owner: bool):
+        self.segment = segment
+        self.name = segment.name
+        self.owner = owner
+        self.buf = segment.buf
+        magic, capacity, epoch, pid, _ = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            segment.close()
+            raise ValueError(f"{self.name} is not a SecurePay ring")
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.epoch = epoch
+        self.owner_pid = pid
+        # Locally cached positions: each side is the only writer of its own
+        self._head = _U64.unpack_from(self.buf, HEAD_OFFSET)[0]
+        self._tail = _U64.unpack_from(self.buf, TAIL_OFFSET)[0]
+        self._next_tail = self._tail
+        self._views = []
+        base = ctypes.c_char.from_buffer(self.buf)
+        self._address = ctypes.addressof(base)
+        del base  # The mapping, not this object, keeps the address valid
+
+    @classmethod
+    def create(cls, name: str, capacity: int, epoch: int = None) -> "ShmRing":
+        """Create (replacing a stale segment of the same name) and initialize a ring"""
+        if capacity < 4096 or capacity & (capacity - 1):
+            raise ValueError("Ring capacity must be a power of two of at least 4096 bytes")
+        try:
+            stale = _segment(name)
+        except FileNotFoundError:
+            pass
+        else:
+            stale.close()
+            _unlink(stale)
+        segment = _segment(name, DATA_OFFSET + capacity)
+        segment.buf[:DATA_OFFSET] = bytes(DATA_OFFSET)
+        HEADER.pack_into(segment.buf, 0, MAGIC, capacity,
+                         epoch if epoch is not None else random.getrandbits(63), os.getpid(), 0)
+        return cls(segment, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "ShmRing":
+        """Map an existing ring; FileNotFoundError if its owner has not created it"""
+        return cls(_segment(name), owner=False)
+
+    @staticmethod
+    def read_epoch(name: str):
+        """Epoch of the ring currently published under name, or None"""
+        try:
+            segment = _segment(name)
+        except FileNotFoundError:
+            return None
+        try:
+            magic, _, epoch, _, closed = HEADER.unpack_from(segment.buf, 0)
+            return epoch if magic == MAGIC and not closed else None
+        finally:
+            segment.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.buf is None or self.buf[CLOSED_OFFSET] != 0
+
+    def used(self) -> int:
+        """Bytes written and not yet consumed"""
+        return (_U64.unpack_from(self.buf, HEAD_OFFSET)[0] -
+                _U64.unpack_from(self.buf, TAIL_OFFSET)[0])
+
+    # --- producer ---
+
+    def send(self, payloads) -> int:
+        """
+        Append frames for as many of payloads (bytes-like) as fit, publish
+        them with one head update and wake the consumer. Returns how many
+        were written; the rest did not fit and stay with the caller.
+        """
+        buf = self.buf
+        capacity = self.capacity
+        head = self._head
+        tail = _U64.unpack_from(buf, TAIL_OFFSET)[0]
+        written = 0
+        for payload in payloads:
+            size = len(payload)
+            need = (size + 11) & ~7  # 4-byte length + payload, 8-byte aligned
+            if need > capacity // 2:
+                raise ValueError(f"{size}-byte frame does not fit a {capacity}-byte ring")
+            position = head & self.mask
+            contiguous = capacity - position
+            if head + need + (contiguous if contiguous < need else 0) - tail > capacity:
+                break  # Full
+            if contiguous < need:
+                _U32.pack_into(buf, DATA_OFFSET + position, WRAP)
+                head += contiguous
+                position = 0
+            start = DATA_OFFSET + position
+            _U32.pack_into(buf, start, size)
+            buf[start + 4:start + 4 + size] = payload
+            head += need
+            written += 1
+        if written:
+            self._head = head
+            _U64.pack_into(buf, HEAD_OFFSET, head)
+            self._signal(DATA_SIGNAL_OFFSET, DATA_WAITING_OFFSET)
+        return written
+
+    def wait_for_space(self, size: int, timeout: float) -> bool:
+        """Block until a size-byte frame fits (True) or timeout (False)"""
+        need = (size + 11) & ~7
+        return self._wait(SPACE_SIGNAL_OFFSET, SPACE_WAITING_OFFSET,
+                          lambda: self._head + 2 * need - _U64.unpack_from(self.buf, TAIL_OFFSET)[0]
+                          <= self.capacity, timeout)
+
+    # --- consumer ---
+
+    def peek(self):
+        """
+        The next unread frame as a memoryview into the segment, or None.
+        Views stay valid until commit(); consecutive peeks walk forward.
+        """
+        buf = self.buf
+        tail = self._next_tail
+        if tail == _U64.unpack_from(buf, HEAD_OFFSET)[0]:
+            return None
+        position = tail & self.mask
+        size = _U32.unpack_from(buf, DATA_OFFSET + position)[0]
+        if size == WRAP:
+            tail += self.capacity - position
+            position = 0
+            size = _U32.unpack_from(buf, DATA_OFFSET)[0]
+        start = DATA_OFFSET + position + 4
+        self._next_tail = tail + ((size + 11) & ~7)
+        view = buf[start:start + size]
+        self._views.append(view)
+        return view
+
+    def commit(self):
+        """Release every peeked frame to the producer"""
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        if self._next_tail != self._tail:
+            self._tail = self._next_tail
+            _U64.pack_into(self.buf, TAIL_OFFSET, self._tail)
+            self._signal(SPACE_SIGNAL_OFFSET, SPACE_WAITING_OFFSET)
+
+    def receive(self, limit: int) -> list:
+        """Copy out up to limit frames as bytes and commit them"""
+        frames = []
+        while len(frames) < limit:
+            view = self.peek()
+            if view is None:
+                break
+            frames.append(bytes(view))
+        self.commit()
+        return frames
+
+    def skip(self):
+        """Drop everything written so far (a new consumer ignoring an old one's backlog)"""
+        self.commit()
+        self._next_tail = _U64.unpack_from(self.buf, HEAD_OFFSET)[0]
+        self.commit()
+
+    def readable(self) -> bool:
+        return self._next_tail != _U64.unpack_from(self.buf, HEAD_OFFSET)[0]
+
+    def wait(self, timeout: float) -> bool:
+        """Block until a frame is readable (True) or timeout (False)"""
+        return self._wait(DATA_SIGNAL_OFFSET, DATA_WAITING_OFFSET, self.readable, timeout)
+
+    # --- signalling ---
+
+    def _signal(self, signal_offset: int, waiting_offset: int):
+        buf = self.buf
+        _U32.pack_into(buf, signal_offset, (_U32.unpack_from(buf, signal_offset)[0] + 1) & WRAP)
+        if HAVE_FUTEX and buf[waiting_offset]:
+            futex_wake(self._address + signal_offset)
+
+    def _wait(self, signal_offset: int, waiting_offset: int, ready, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        pause = 0.0001
+        while not ready():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.closed:
+                return False
+            if not HAVE_FUTEX:
+                time.sleep(min(pause, remaining))
+                pause = min(pause * 2, 0.005)
+                continue
+            buf = self.buf
+            buf[waiting_offset] = 1
+            expected = _U32.unpack_from(buf, signal_offset)[0]
+            try:
+                if ready():
+                    return True
+                futex_wait(self._address + signal_offset, expected, min(remaining, WAIT_SLICE))
+            finally:
+                buf[waiting_offset] = 0
+        return True
+
+    def close(self):
+        """Unmap; the owner also marks the ring closed and unlinks it"""
+        if self.buf is None:
+            return
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        if self.owner:
+            self.buf[CLOSED_OFFSET] = 1
+            self._signal(DATA_SIGNAL_OFFSET, DATA_WAITING_OFFSET)
+            self._signal(SPACE_SIGNAL_OFFSET, SPACE_WAITING_OFFSET)
+        self.buf = None
+        self.segment.close()
+        if self.owner:
+            _unlink(self.segment)
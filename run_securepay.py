@@ -1,14 +1,30 @@
 """
 SecurePay System Launcher
 Run this file to start both Vendor and Bank systems
+Use --headless to run the bank daemon and vendor API without any GUI
 """
 import os
 import sys
+import argparse
 import subprocess
 import time
 import json
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="SecurePay System Launcher")
+    parser.add_argument("--headless", action="store_true",
+                        help="start the bank daemon and vendor API instead of the GUIs")
+    parser.add_argument("--bank-workers", type=int, default=None,
+                        help="number of bank transaction worker threads")
+    parser.add_argument("--vendor-workers", type=int, default=None,
+                        help="number of vendor API worker threads")
+    parser.add_argument("--bus", choices=["file", "shm"], default=None,
+                        help="vendor <-> bank transport of the headless services")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    
     print("🚀 SecurePay System Launcher")
     print("=" * 40)
     
@@ -30,7 +46,12 @@ def main():
     
     try:
         # Start Bank system
-        bank_process = subprocess.Popen([sys.executable, "bank/bank_app.py"])
+        bank_command = [sys.executable, "bank/bank_daemon.py" if args.headless else "bank/bank_app.py"]
+        if args.bank_workers:
+            bank_command += ["--workers", str(args.bank_workers)]
+        if args.headless and args.bus:
+            bank_command += ["--bus", args.bus]
+        bank_process = subprocess.Popen(bank_command)
         
         print("⏳ Waiting for Bank system to initialize...")
         time.sleep(5)  # Give more time for bank to start
@@ -42,15 +63,25 @@ def main():
         
         print("\n2. Starting Vendor System...")
         # Start Vendor system
-        vendor_process = subprocess.Popen([sys.executable, "vendor/vendor_app.py"])
+        vendor_command = [sys.executable, "vendor/vendor_api.py" if args.headless else "vendor/vendor_app.py"]
+        if args.vendor_workers:
+            vendor_command += ["--workers", str(args.vendor_workers)]
+        if args.headless and args.bus:
+            vendor_command += ["--bus", args.bus]
+        vendor_process = subprocess.Popen(vendor_command)
         
         print("✅ Both systems started!")
-        print("💡 Close both windows to stop the systems")
+        if args.headless:
+            print("💡 Press Ctrl+C to stop the systems")
+        else:
+            print("💡 Close both windows to stop the systems")
         
         # Wait for processes
         bank_process.wait()
         vendor_process.wait()
         
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down...")
     except Exception as e:
         print(f"❌ Error starting systems: {e}")
     finally:
@@ -122,12 +153,8 @@ def create_sample_data():
             json.dump({}, f, indent=2)
         print("✅ Created empty tokens file")
     
-    # Create empty payment log
-    payment_log_file = os.path.join(vendor_data_dir, "payment_log.json")
-    if not os.path.exists(payment_log_file):
-        with open(payment_log_file, 'w') as f:
-            json.dump([], f, indent=2)
-        print("✅ Created payment log file")
+    # Payment journal (rotating JSON-lines segments, see PaymentProcessor)
+    os.makedirs(os.path.join(vendor_data_dir, "payments"), exist_ok=True)
     
     # Create empty transactions file for bank
     transactions_file = os.path.join(bank_data_dir, "transactions.json")
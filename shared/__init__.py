@@ -1,4 +1,34 @@
-from .encryption import EncryptionManager
-from .config import Config, CardValidator
+"""
+Shared building blocks for SecurePay
+Configuration, encryption, metrics and tracing
 
-__all__ = ['EncryptionManager', 'Config', 'CardValidator']
\ No newline at end of file
+Attributes are imported lazily (PEP 562): `from shared.config import Config`
+does not load the cryptography package.
+"""
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'EncryptionManager': '.encryption',
+    'Config': '.config',
+    'CardValidator': '.config',
+    'MetricsRegistry': '.metrics',
+    'MetricsExporter': '.metrics',
+    'metrics': '.metrics',
+    'tracer': '.tracing',
+    'RotatingLog': '.rotating_log',
+    'BloomFilter': '.bloom',
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value  # Later lookups skip __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
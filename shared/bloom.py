@@ -0,0 +1,85 @@
+"""
+Bloom filter
+Compact set membership with no false negatives and a configurable
+false-positive rate. Used to skip expensive lookups for keys that were
+definitely never seen.
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01, stable: bool = True):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate in (0, 1)")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # stable: keyed by blake2b, identical across processes (can be saved).
+        # Otherwise Python's per-process str hash is used, which is much faster.
+        self.stable = stable
+
+        # Optimal size for n items at false-positive rate p: m = -n ln p / (ln 2)^2, k = m/n ln 2
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _hashes(self, key: str):
+        """Two 64-bit hashes for double hashing (Kirsch-Mitzenmacher)"""
+        if not self.stable:
+            # str hashes are cached on the object: nearly free for a key seen before
+            h = hash(key) & 0xFFFFFFFFFFFFFFFF
+            return h, ((h >> 32) | (h << 32)) & 0xFFFFFFFFFFFFFFFF | 1
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def add(self, key: str):
+        bits, m = self.bits, self.num_bits
+        h1, h2 = self._hashes(key)
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % m
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits, m = self.bits, self.num_bits
+        h1, h2 = self._hashes(key)
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % m
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self) -> int:
+        return self.count
+
+    def load_bits(self, bits, count: int):
+        """Adopt saved bits (e.g. from a checkpoint) of a stable filter with the same size"""
+        if not self.stable or len(bits) != len(self.bits):
+            raise ValueError("bits do not belong to a stable filter of this capacity and error rate")
+        self.bits = bytearray(bits)
+        self.count = count
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    def estimated_false_positive_rate(self) -> float:
+        """(1 - e^(-kn/m))^k for the items added so far"""
+        k, m = self.num_hashes, self.num_bits
+        return (1 - math.exp(-k * self.count / m)) ** k
+
+    def stats(self) -> dict:
+        return {
+            'capacity': self.capacity,
+            'items': self.count,
+            'bits': self.num_bits,
+            'hashes': self.num_hashes,
+            'memory_bytes': self.memory_bytes,
+            'target_false_positive_rate': self.error_rate,
+            'estimated_false_positive_rate': round(self.estimated_false_positive_rate(), 6)
+        }
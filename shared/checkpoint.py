@@ -0,0 +1,154 @@
+"""
+Binary checkpoints of hot in-memory state
+A background thread periodically asks its owner for a dict of named
+sections, serializes them outside the owner's locks and atomically replaces
+the checkpoint file. At startup the file is mapped with mmap and the
+sections are read straight out of the mapping, so even multi-megabyte
+sections (Bloom filter bits) load in milliseconds.
+
+File layout (little-endian):
+    header   magic "SPCK", version, section count, saved_at (unix seconds)
+    section  name length, kind, payload length, crc32, name, payload
+Sections are raw bytes (kind 1) or UTF-8 JSON (kind 0). A file with a bad
+magic, version or checksum is ignored - the owner then starts cold.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from shared.metrics import metrics
+
+MAGIC = b"SPCK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHd")
+SECTION = struct.Struct("<HBII")
+KIND_JSON = 0
+KIND_BYTES = 1
+
+
+def write_checkpoint(path: str, sections: dict) -> int:
+    """Atomically write sections (bytes-like or JSON-serializable); returns the file size"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sections), time.time()))
+        for name, value in sections.items():
+            if isinstance(value, (bytes, bytearray, memoryview)):
+                kind, payload = KIND_BYTES, value
+            else:
+                kind, payload = KIND_JSON, json.dumps(value, separators=(",", ":")).encode()
+            encoded_name = name.encode()
+            f.write(SECTION.pack(len(encoded_name), kind, len(payload), zlib.crc32(payload)))
+            f.write(encoded_name)
+            f.write(payload)
+        size = f.tell()
+    os.replace(temp, path)
+    return size
+
+
+def read_checkpoint(path: str, max_age: float = None):
+    """
+    Sections of a checkpoint as a dict (bytes sections as bytearray), plus
+    'saved_at'. None if the file is missing, older than max_age seconds or
+    damaged.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None  # Empty file
+    with mapped:
+        try:
+            magic, version, count, saved_at = HEADER.unpack_from(mapped, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"not a version {VERSION} checkpoint")
+            if max_age is not None and time.time() - saved_at > max_age:
+                print(f"⚠️  Ignoring checkpoint {path}: {time.time() - saved_at:.0f}s old")
+                return None
+            sections = {'saved_at': saved_at}
+            offset = HEADER.size
+            for _ in range(count):
+                name_length, kind, length, crc = SECTION.unpack_from(mapped, offset)
+                offset += SECTION.size
+                name = mapped[offset:offset + name_length].decode()
+                offset += name_length
+                payload = memoryview(mapped)[offset:offset + length]
+                try:
+                    if len(payload) != length or zlib.crc32(payload) != crc:
+                        raise ValueError(f"section {name!r} is damaged")
+                    sections[name] = bytearray(payload) if kind == KIND_BYTES else json.loads(
+                        payload.tobytes())
+                finally:
+                    payload.release()
+                offset += length
+            return sections
+        except (ValueError, struct.error, UnicodeDecodeError) as e:
+            print(f"⚠️  Ignoring checkpoint {path}: {e}")
+            return None
+
+
+class Checkpointer:
+    """
+    Calls capture() every `interval` seconds on its own thread and writes
+    the returned sections. capture() should only copy state under its locks;
+    encoding and I/O happen after it returns.
+    """
+
+    def __init__(self, path: str, capture, interval: float, name: str):
+        self.path = path
+        self.capture = capture
+        self.interval = interval
+        self.name = name
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._write_lock = threading.Lock()
+
+        self.capture_latency = metrics.histogram('checkpoint_capture_us', {'name': name})
+        self.write_latency = metrics.histogram('checkpoint_write_us', {'name': name})
+        self.size = metrics.gauge('checkpoint_bytes', {'name': name})
+        self.failures = metrics.counter('checkpoint_failures_total', {'name': name})
+
+    def save(self):
+        """Capture and write one checkpoint now"""
+        with self._write_lock:
+            with self.capture_latency.time():
+                sections = self.capture()
+            with self.write_latency.time():
+                self.size.set(write_checkpoint(self.path, sections))
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                self.failures.inc()
+                print(f"⚠️  {self.name} checkpoint failed: {e}")
+
+    def start(self):
+        if self.interval and self.interval > 0:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-checkpoint",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, final: bool = True):
+        """Stop the thread; with final, write one last checkpoint of the state at shutdown"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if final:
+            try:
+                self.save()
+            except Exception as e:
+                self.failures.inc()
+                print(f"⚠️  {self.name} checkpoint failed: {e}")
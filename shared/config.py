@@ -16,6 +16,127 @@ class Config:
     # Security
     TOKEN_LENGTH = 16
     MAX_RETRY_ATTEMPTS = 3
+    
+    # Services (headless mode)
+    MERCHANT_ID = "VENDOR_001"  # Default merchant for payment requests
+    MERCHANTS = {"VENDOR_001": 1}  # merchant_id -> weight (share of bank workers under contention)
+    DEFAULT_MERCHANT_WEIGHT = 1  # Merchants the bank receives but MERCHANTS does not list
+    BULK_SHARE = 0.1  # Share of bank dequeues kept for bulk work while interactive requests wait
+    BANK_WORKERS = 1
+    VENDOR_WORKERS = 4
+    POLL_INTERVAL = 0.5  # Seconds between bus polls when idle
+    BANK_RESPONSE_TIMEOUT = 30
+    BANK_INTAKE_QUEUE_SIZE = 1000  # Admitted requests waiting for a bank worker
+    BANK_INTAKE_BATCH = 256  # Messages taken off the bus per poll
+    BANK_LATENCY_SLO_MS = 2000  # Requests that would wait longer are shed with RETRY_LATER
+    RETRY_AFTER_MS = 250  # Base back-off suggested to the vendor when shedding
+    STATUS_CACHE_SECONDS = 1.0  # Bank recomputes its STATUS_CHECK answer at most this often
+    STATUS_PROBE_TIMEOUT = 2.0  # Seconds the vendor waits for a STATUS_CHECK answer
+    CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive unanswered attempts that open the vendor's circuit
+    CIRCUIT_PROBE_INTERVAL = 1.0  # First health probe while open; doubles up to the maximum
+    CIRCUIT_MAX_PROBE_INTERVAL = 10.0
+    ADAPTIVE_TIMEOUT_MULTIPLIER = 3  # Attempt timeout = this x recent p99 bank latency...
+    ADAPTIVE_TIMEOUT_MIN = 1.0  # ...but never below this many seconds
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20  # Fewer recent answers: BANK_RESPONSE_TIMEOUT / MAX_RETRY_ATTEMPTS
+    VENDOR_API_HOST = "127.0.0.1"
+    VENDOR_API_PORT = 8080
+    
+    # Metrics
+    BANK_METRICS_PORT = 9100  # 0 disables the exporter
+    METRICS_WINDOW_SECONDS = 60  # Rolling window for TPS / percentile panels
+    
+    # Transaction history
+    HISTORY_MEMORY_SIZE = 1000  # Recent transactions kept in memory
+    HISTORY_DIR = "bank/data/history"
+    HISTORY_MAX_BYTES = 64 * 1024 * 1024  # Rotate the on-disk log at this size...
+    HISTORY_ROTATE_SECONDS = 24 * 60 * 60  # ...or after this long
+    HISTORY_COMPRESS = True  # gzip rotated segments
+    HISTORY_DB = "bank/data/history.db"  # SQLite index over the history log
+    HISTORY_SYNC_SECONDS = 2  # The bank indexes new history this often; lookups scan only the rest
+    HISTORY_PAGE_SIZE = 100
+    
+    # Replication (hot-standby follower, see bank.replica)
+    LEDGER_ENABLED = False  # Primary writes every balance change to LEDGER_DIR for followers
+    LEDGER_DIR = "bank/data/ledger"
+    REPLICA_DATA_DIR = "bank/data/replica"  # Follower's cards and history; its data dir once promoted
+    REPLICA_API_HOST = "127.0.0.1"
+    REPLICA_API_PORT = 8091  # Read-only queries (history, balances, reports) and POST /promote
+    REPLICA_POLL_INTERVAL = 0.2  # Seconds between ledger reads once caught up
+    REPLICA_CHECKPOINT_SECONDS = 5  # Follower saves cards + ledger position this often
+    
+    # Warm restart (shared.checkpoint): hot in-memory state snapshotted to <data dir>/checkpoint.bin
+    CHECKPOINT_SECONDS = 30  # Snapshot interval; 0 writes only at shutdown
+    CHECKPOINT_MAX_AGE_SECONDS = 24 * 60 * 60  # Older snapshots are ignored at startup
+    
+    # Reporting rollups (bank.rollups): saved to <data dir>/rollups.bin every CHECKPOINT_SECONDS
+    ROLLUP_RETENTION_DAYS = {'minute': 2, 'hour': 92, 'day': 3 * 366}  # Buckets kept per resolution
+    
+    # Idempotency (duplicate transaction_id -> original response)
+    IDEMPOTENCY_CACHE_SIZE = 10_000  # Responses kept in memory
+    IDEMPOTENCY_BLOOM_CAPACITY = 1_000_000  # Ids per Bloom filter generation
+    IDEMPOTENCY_BLOOM_ERROR_RATE = 0.001
+    IDEMPOTENCY_WINDOW_HOURS = 24  # Ids loaded from the history index at startup
+    
+    # Card store
+    CARD_TABLE = False  # Keep cards in compact typed arrays (bank.card_table) instead of dicts
+    CARDS_SAVE_SECONDS = 30  # valid_cards.json rewritten this often; payments only journal balances
+    
+    # Bank instances and routing
+    BANK_INSTANCE = None  # This bank process's name in the routing table (None: the only bank)
+    BANK_INSTANCES_DIR = "bank/data/instances"  # <instance>/ holds each instance's cards and history
+    COMM_DIR = "communication_data"  # Bus directory of this process's bank
+    ROUTING_FILE = "communication_data/routing.json"  # Absent: every card goes to the one bank
+    ROUTING_RELOAD_SECONDS = 1.0  # Routing file checked for changes at most this often
+    ROUTING_VNODES = 64  # Consistent-hash ring points per unit of instance weight
+    ROUTING_HANDOFF_SECONDS = 10  # New owner answers RETRY_LATER for cards still in transfer
+    
+    # Bus transport between the vendor and the bank
+    BUS_TRANSPORT = "file"  # "file" (JSON queue files) or "shm" (shared-memory rings, same host only)
+    SHM_RING_BYTES = 4 * 1024 * 1024  # Per direction; a power of two
+    SHM_RECHECK_SECONDS = 1.0  # Vendor looks for a restarted bank's new rings this often
+    SHM_SEND_TIMEOUT = 1.0  # Bank waits this long for ring space before answering via the files
+    SHM_TRACKED_REQUESTS = 65536  # Ring request ids remembered until answered
+
+    # Negative-lookup filter over issued cards
+    CARD_FILTER_ERROR_RATE = 0.001  # Unknown cards that still reach the card store
+    CARD_FILTER_HEADROOM = 1.5  # Capacity as a multiple of the cards loaded at startup
+    CARD_FILTER_MIN_CAPACITY = 10_000
+    
+    # Bulk token import (vendor.token_import)
+    TOKEN_IMPORT_BATCH = 5000  # Cards per worker task
+    TOKEN_IMPORT_CHECKPOINT_SECONDS = 10  # Progress saved this often; an interrupted import resumes
+    
+    # Vendor payment log
+    PAYMENT_LOG_DIR = "vendor/data/payments"
+    PAYMENT_LOG_MAX_BYTES = 64 * 1024 * 1024  # Rotate (and gzip) the journal at this size
+    PAYMENT_LOG_QUEUE_SIZE = 100_000  # Records waiting for the writer thread; payments wait when full
+    PAYMENT_LOG_BATCH = 1000  # Most records per write
+    
+    # Settlement
+    SETTLEMENT_DIR = "bank/data/settlement"
+    SETTLEMENT_GRACE_SECONDS = 300  # A day closes this long after midnight
+    SETTLEMENT_CHECKPOINT_EVERY = 100_000  # Records between checkpoints
+    
+    # Reconciliation
+    RECONCILE_SORT_CHUNK = 500_000  # Records sorted in memory per run file
+    RECONCILE_SLACK_SECONDS = 120  # Tolerated clock gap between vendor and bank records
+    
+    # Tracing
+    TRACE_ENABLED = False
+    TRACE_SAMPLE_RATE = 1.0  # Fraction of transactions traced when enabled
+    TRACE_DIR = "traces"
+    
+    # On-demand profiling (shared.profiler; SIGUSR1 / SIGUSR2 or profile_control messages)
+    PROFILE_DIR = "profiles"
+    PROFILE_SAMPLE_INTERVAL = 0.01  # Seconds between stack samples while the sampler runs
+    PROFILE_TOP = 30  # Entries per table in the dumps
+    PROFILE_TRACEMALLOC_FRAMES = 1  # Frames kept per allocation once tracemalloc is started
+    
+    # Traffic capture and replay (vendor.traffic_capture, python -m bench replay)
+    CAPTURE_DIR = "captures"
+    CAPTURE_MAX_BYTES = 64 * 1024 * 1024  # Rotate (and gzip) capture segments at this size
+    CAPTURE_PAN_CACHE = 1_000_000  # Synthetic PANs remembered per capture (recomputed after)
+    FRAUD_SEED = None  # Set: each fraud draw is seeded from (seed, transaction_id) - replays only
 
 class CardValidator:
     @staticmethod
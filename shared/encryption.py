@@ -1,14 +1,18 @@
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
+import hashlib
+import hmac
+import json
 import os
 from shared.config import Config
+from shared.metrics import metrics
 
 class EncryptionManager:
     def __init__(self):
         self.key = self._load_or_create_key()
         self.fernet = Fernet(self.key)
+        self.encrypt_latency = metrics.histogram('encryption_us', {'op': 'encrypt'})
+        self.decrypt_latency = metrics.histogram('encryption_us', {'op': 'decrypt'})
     
     def _load_or_create_key(self) -> bytes:
         """Load existing key or create new one"""
@@ -37,17 +41,21 @@ class EncryptionManager:
     
     def encrypt_data(self, data: dict) -> str:
         """Encrypt dictionary data"""
-        import json
-        json_data = json.dumps(data).encode()
-        encrypted = self.fernet.encrypt(json_data)
-        return base64.urlsafe_b64encode(encrypted).decode()
+        with self.encrypt_latency.time():
+            json_data = json.dumps(data).encode()
+            encrypted = self.fernet.encrypt(json_data)
+            return base64.urlsafe_b64encode(encrypted).decode()
     
     def decrypt_data(self, encrypted_data: str) -> dict:
         """Decrypt data back to dictionary"""
-        import json
         try:
-            encrypted_bytes = base64.urlsafe_b64decode(encrypted_data.encode())
-            decrypted = self.fernet.decrypt(encrypted_bytes)
-            return json.loads(decrypted.decode())
+            with self.decrypt_latency.time():
+                encrypted_bytes = base64.urlsafe_b64decode(encrypted_data.encode())
+                decrypted = self.fernet.decrypt(encrypted_bytes)
+                return json.loads(decrypted.decode())
         except Exception as e:
-            raise ValueError(f"Decryption failed: {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Decryption failed: {str(e)}")
+    
+    def fingerprint(self, value: str) -> str:
+        """Keyed (HMAC-SHA256) fingerprint of a card number - stable, not reversible"""
+        return hmac.new(self.key, value.encode(), hashlib.sha256).hexdigest()[:32]
@@ -0,0 +1,309 @@
+"""
+Lightweight in-process metrics for SecurePay
+Counters, gauges and HDR-style latency histograms with a local exporter
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class Counter:
+    """Monotonically increasing count"""
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> dict:
+        return {'type': 'counter', 'value': self.value}
+
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback"""
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+        self._value = 0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def set_function(self, function):
+        """Compute the value lazily on every read"""
+        self._function = function
+
+    @property
+    def value(self):
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                return None
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {'type': 'gauge', 'value': self.value}
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record((time.perf_counter_ns() - self.start) // 1000)
+        return False
+
+
+class Histogram:
+    """
+    Log-linear (HDR-style) histogram of integer values, normally microseconds.
+    Every power of two is split into 2**(SUB_BUCKET_BITS-1) linear sub-buckets,
+    which bounds the relative error of any percentile to about 3%.
+    A ring of one-second slices backs rolling-window queries (TPS, p99 now).
+    """
+    SUB_BUCKET_BITS = 6
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF_SUB_BUCKETS = SUB_BUCKETS // 2
+
+    def __init__(self, name: str, labels: Dict[str, str], window_seconds: int = 60):
+        self.name = name
+        self.labels = labels
+        self.window_seconds = window_seconds
+
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self._windows = deque(maxlen=window_seconds + 1)  # (second, counts)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _bucket_index(cls, value: int) -> int:
+        if value < cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        return shift * cls.HALF_SUB_BUCKETS + (value >> shift)
+
+    @classmethod
+    def _bucket_value(cls, index: int) -> int:
+        """Representative (midpoint) value of a bucket"""
+        if index < cls.SUB_BUCKETS:
+            return index
+        shift = index // cls.HALF_SUB_BUCKETS - 1
+        mantissa = index - shift * cls.HALF_SUB_BUCKETS
+        return (mantissa << shift) + (1 << (shift - 1))
+
+    def record(self, value):
+        value = max(0, int(value))
+        index = self._bucket_index(value)
+        second = int(time.monotonic())
+
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+            if not self._windows or self._windows[-1][0] != second:
+                self._windows.append((second, {}))
+            window = self._windows[-1][1]
+            window[index] = window.get(index, 0) + 1
+
+    def time(self) -> _Timer:
+        """Context manager recording the elapsed microseconds"""
+        return _Timer(self)
+
+    @classmethod
+    def _percentiles(cls, counts: dict, total: int, percentiles) -> dict:
+        result = {}
+        if not total:
+            return {p: None for p in percentiles}
+
+        ordered = sorted(counts.items())
+        for p in percentiles:
+            rank = max(1, int(round(total * p / 100.0)))
+            seen = 0
+            for index, count in ordered:
+                seen += count
+                if seen >= rank:
+                    result[p] = cls._bucket_value(index)
+                    break
+        return result
+
+    def percentile(self, p: float) -> Optional[int]:
+        with self._lock:
+            return self._percentiles(self.counts, self.count, [p])[p]
+
+    def window(self, seconds: int = None) -> dict:
+        """Count, rate and percentiles over the last `seconds` seconds"""
+        seconds = min(seconds or self.window_seconds, self.window_seconds)
+        cutoff = int(time.monotonic()) - seconds
+
+        merged = {}
+        with self._lock:
+            for second, counts in self._windows:
+                if second > cutoff:
+                    for index, count in counts.items():
+                        merged[index] = merged.get(index, 0) + count
+
+        total = sum(merged.values())
+        pct = self._percentiles(merged, total, [50, 99])
+        return {
+            'count': total,
+            'rate': total / float(seconds),
+            'p50': pct[50],
+            'p99': pct[99]
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            pct = self._percentiles(self.counts, self.count, [50, 90, 99, 99.9])
+            return {
+                'type': 'histogram',
+                'count': self.count,
+                'sum': self.total,
+                'min': self.min,
+                'max': self.max,
+                'p50': pct[50],
+                'p90': pct[90],
+                'p99': pct[99],
+                'p999': pct[99.9]
+            }
+
+
+class MetricsRegistry:
+    """Get-or-create registry of named, labelled metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, labels: Optional[Dict[str, str]], **kwargs):
+        labels = labels or {}
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, labels, **kwargs)
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name: str, labels: Dict[str, str] = None) -> Counter:
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name: str, labels: Dict[str, str] = None) -> Gauge:
+        return self._get(Gauge, name, labels)
+
+    def histogram(self, name: str, labels: Dict[str, str] = None) -> Histogram:
+        return self._get(Histogram, name, labels)
+
+    def metrics(self):
+        return list(self._metrics.values())
+
+    def snapshot(self) -> list:
+        """All metrics as plain dicts (JSON exporter format)"""
+        result = []
+        for metric in self.metrics():
+            entry = {'name': metric.name, 'labels': metric.labels}
+            entry.update(metric.snapshot())
+            result.append(entry)
+        return result
+
+    def to_text(self) -> str:
+        """Prometheus-style text exposition"""
+        lines = []
+        for entry in self.snapshot():
+            labels = ",".join(f'{k}="{v}"' for k, v in sorted(entry['labels'].items()))
+            suffix = "{" + labels + "}" if labels else ""
+            if entry['type'] == 'histogram':
+                for field in ('count', 'sum', 'max', 'p50', 'p90', 'p99', 'p999'):
+                    if entry[field] is not None:
+                        lines.append(f"{entry['name']}_{field}{suffix} {entry[field]}")
+            elif entry['value'] is not None:
+                lines.append(f"{entry['name']}{suffix} {entry['value']}")
+        return "\n".join(sorted(lines)) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._metrics = {}
+
+
+class MetricsExporter:
+    """Serves a registry on localhost: /metrics (text) and /metrics.json"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler  # Only processes that export pay for it
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.to_text().encode(), "text/plain"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-exporter",
+                         daemon=True).start()
+        print(f"📈 Metrics available at http://{self.host}:{self.server.server_port}/metrics")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# Process-wide default registry
+metrics = MetricsRegistry()
@@ -0,0 +1,259 @@
+"""
+On-demand profiling of a running service
+A statistical sampler reads every thread's stack (sys._current_frames)
+every PROFILE_SAMPLE_INTERVAL seconds while it is switched on. Stopping it
+writes collapsed stacks (<name>.folded, the input format of flamegraph.pl
+and speedscope) plus a summary of the hottest functions. Memory snapshots
+use tracemalloc, which is started by the first snapshot request. Each later
+snapshot lists the top allocating lines and the growth since the previous
+snapshot, plus the sizes of the structures the service registered as
+probes (e.g. the bank's recent-transaction history).
+
+Nothing runs until asked, and dumps are written by a background thread,
+so payments keep flowing. Triggers:
+
+    kill -USR1 <pid>                          # start / stop the sampler
+    kill -USR2 <pid>                          # memory snapshot
+    python -m shared.profiler bank start      # same, as a control message on the bank's bus
+    python -m shared.profiler vendor memory   # same, through the vendor API
+
+Dumps go to PROFILE_DIR as <service>-<pid>-<time>.{folded,txt} and
+<service>-<pid>-<time>-memory.txt.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from shared.config import Config
+
+ACTIONS = ("start", "stop", "memory", "memory_off")
+
+
+class RuntimeProfiler:
+    """Process-wide; services register memory probes and install the signal triggers"""
+
+    def __init__(self):
+        self.service = "securepay"
+        self.profile_dir = Config.PROFILE_DIR
+        self.probes = {}  # name -> callable() returning a size or count
+        self.lock = threading.Lock()
+        self._sampler = None
+        self._stop_sampling = threading.Event()
+        self._samples = Counter()  # (thread name, frame, frame, ...) -> samples
+        self._sampled_since = None
+        self._previous_snapshot = None
+
+    def configure(self, service: str, profile_dir: str = None):
+        self.service = service
+        self.profile_dir = profile_dir or Config.PROFILE_DIR
+
+    def add_probe(self, name: str, function):
+        self.probes[name] = function
+
+    @property
+    def sampling(self) -> bool:
+        return self._sampler is not None
+
+    def _dump_path(self, suffix: str) -> str:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.profile_dir, f"{self.service}-{os.getpid()}-{stamp}{suffix}")
+
+    # --- statistical sampler ---
+
+    def start(self, interval: float = None) -> dict:
+        with self.lock:
+            if self._sampler is not None:
+                return {'profile': 'already running', 'since': self._sampled_since}
+            self._samples = Counter()
+            self._sampled_since = datetime.now().isoformat()
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(
+                target=self._sample_loop, args=(interval or Config.PROFILE_SAMPLE_INTERVAL,),
+                name="profiler-sampler", daemon=True)
+            self._sampler.start()
+        print(f"🔬 Profiler sampling {self.service} (pid {os.getpid()})")
+        return {'profile': 'started', 'since': self._sampled_since}
+
+    def _sample_loop(self, interval: float):
+        own = threading.get_ident()
+        samples = self._samples
+        names = {}
+        while not self._stop_sampling.wait(interval):
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                 f"{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                samples[tuple(reversed(stack))] += 1
+
+    def stop(self) -> dict:
+        """Stop sampling; the dump is written in the background. Returns its file names."""
+        with self.lock:
+            sampler = self._sampler
+            if sampler is None:
+                return {'profile': 'not running'}
+            self._sampler = None
+            self._stop_sampling.set()
+        base = self._dump_path("")
+        threading.Thread(target=self._write_profile,
+                         args=(sampler, self._samples, self._sampled_since, base),
+                         name="profiler-dump", daemon=True).start()
+        return {'profile': 'stopped', 'files': [base + ".folded", base + ".txt"]}
+
+    def _write_profile(self, sampler: threading.Thread, samples: Counter, since: str, base: str):
+        sampler.join()
+        with open(base + ".folded", "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+        total = sum(samples.values())
+        own, inclusive, threads = Counter(), Counter(), Counter()
+        for stack, count in samples.items():
+            threads[stack[0]] += count
+            if len(stack) > 1:
+                own[stack[-1]] += count
+            for frame in set(stack[1:]):
+                inclusive[frame] += count
+        with open(base + ".txt", "w") as f:
+            f.write(f"{self.service} pid {os.getpid()}: {total} samples from {since} "
+                    f"to {datetime.now().isoformat()}\n")
+            for title, counter in (("Samples per thread", threads),
+                                   ("Top functions (self)", own),
+                                   ("Top functions (inclusive)", inclusive)):
+                f.write(f"\n{title}\n")
+                for name, count in counter.most_common(Config.PROFILE_TOP):
+                    f.write(f"{count:8d} {100 * count / max(total, 1):6.1f}%  {name}\n")
+        print(f"🔬 Profile written to {base}.txt ({total} samples)")
+
+    # --- memory ---
+
+    def memory_snapshot(self) -> dict:
+        """Start tracemalloc, or write a snapshot of what it traced (in the background)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(Config.PROFILE_TRACEMALLOC_FRAMES)
+            self._previous_snapshot = None
+            print(f"🧠 tracemalloc started in {self.service} - the next snapshot shows allocations")
+            return {'memory': 'tracing started'}
+        path = self._dump_path("-memory.txt")
+        threading.Thread(target=self._write_memory, args=(path,), name="profiler-memory",
+                         daemon=True).start()
+        return {'memory': 'snapshot', 'files': [path]}
+
+    def _write_memory(self, path: str):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>")))
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, "w") as f:
+            f.write(f"{self.service} pid {os.getpid()} at {datetime.now().isoformat()}: "
+                    f"{current / 1048576:.1f} MiB traced, peak {peak / 1048576:.1f} MiB\n")
+            f.write("\nProbes\n")
+            for name, function in sorted(self.probes.items()):
+                try:
+                    value = function()
+                except Exception as e:
+                    value = f"error: {e}"
+                f.write(f"{value!s:>14}  {name}\n")
+            f.write("\nTop allocating lines\n")
+            for stat in snapshot.statistics('lineno')[:Config.PROFILE_TOP]:
+                f.write(f"{stat.size / 1024:12.1f} KiB {stat.count:9d} blocks  {stat.traceback}\n")
+            if self._previous_snapshot is not None:
+                f.write("\nGrowth since the previous snapshot\n")
+                for stat in snapshot.compare_to(self._previous_snapshot, 'lineno')[:Config.PROFILE_TOP]:
+                    f.write(f"{stat.size_diff / 1024:+12.1f} KiB {stat.count_diff:+9d} blocks  "
+                            f"{stat.traceback}\n")
+        self._previous_snapshot = snapshot
+        print(f"🧠 Memory snapshot written to {path}")
+
+    def memory_off(self) -> dict:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._previous_snapshot = None
+        return {'memory': 'tracing stopped'}
+
+    # --- triggers ---
+
+    def control(self, action: str, interval: float = None) -> dict:
+        """Run one of ACTIONS; the answer names the files that will be written"""
+        if action == "start":
+            result = self.start(interval)
+        elif action == "stop":
+            result = self.stop()
+        elif action == "memory":
+            result = self.memory_snapshot()
+        elif action == "memory_off":
+            result = self.memory_off()
+        else:
+            raise ValueError(f"Unknown profiler action: {action}")
+        result.update(service=self.service, pid=os.getpid())
+        return result
+
+    def install_signal_handlers(self):
+        """SIGUSR1 toggles the sampler, SIGUSR2 takes a memory snapshot (main thread only)"""
+        if not hasattr(signal, "SIGUSR1"):
+            return  # Not on this platform
+        signal.signal(signal.SIGUSR1,
+                      lambda signum, frame: self.control("stop" if self.sampling else "start"))
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.control("memory"))
+
+
+profiler = RuntimeProfiler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a running bank or vendor process")
+    parser.add_argument("target", choices=["bank", "vendor"])
+    parser.add_argument("action", choices=ACTIONS)
+    parser.add_argument("--instance", help="bank instance of the routing table (default: the only bank)")
+    parser.add_argument("--interval", type=float, help="sampling interval in seconds")
+    parser.add_argument("--vendor-url",
+                        default=f"http://{Config.VENDOR_API_HOST}:{Config.VENDOR_API_PORT}")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    args = parser.parse_args()
+    request = {'action': args.action, 'interval': args.interval}
+
+    if args.target == "vendor":
+        from urllib.request import Request, urlopen
+        with urlopen(Request(f"{args.vendor_url}/debug/profile", data=json.dumps(request).encode(),
+                             headers={"Content-Type": "application/json"}),
+                     timeout=args.timeout) as response:
+            answer = json.load(response)
+    else:
+        from shared.encryption import EncryptionManager
+        from communication.message_bus import MessageBus
+        from communication.protocols import MessageType
+        from communication.routing import BankRouter
+
+        encryption = EncryptionManager()
+        router = BankRouter()
+        bus = MessageBus(router.comm_dir(args.instance or router.table.default))
+        request['request_id'] = str(uuid.uuid4())
+        bus.send_to_bank(encryption.encrypt_data(request),
+                         message_type=MessageType.PROFILE_CONTROL.value)
+        response = bus.receive_from_bank(timeout=args.timeout, correlation_id=request['request_id'])
+        if response is None:
+            print(f"❌ No answer from the bank within {args.timeout:g}s")
+            sys.exit(1)
+        answer = encryption.decrypt_data(response)
+    print(json.dumps(answer, indent=2))
+
+
+if __name__ == "__main__":
+    main()
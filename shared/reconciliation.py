@@ -0,0 +1,266 @@
+"""
+Vendor-bank reconciliation
+Joins the vendor payment log and the bank transaction history on
+transaction_id and reports records that disagree:
+
+    vendor_only      sent by the vendor, never recorded by the bank
+    bank_only        recorded by the bank, unknown to the vendor
+    amount_mismatch  both sides recorded the transaction with different amounts
+    status_mismatch  different outcomes (e.g. vendor timed out, bank approved)
+    duplicate        the same transaction_id recorded twice on one side
+
+Both logs are streamed. Records outside the time window are skipped
+without JSON decoding (whole segments are skipped where possible), and
+each side is put in transaction_id order with an external merge sort, so
+memory stays bounded by RECONCILE_SORT_CHUNK regardless of log size.
+
+    python -m shared.reconciliation --last-hours 1
+    python -m shared.reconciliation --since 2024-01-01 --until 2024-01-02 --output recon.csv
+"""
+import argparse
+import csv
+import heapq
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+from shared.config import Config
+from shared.rotating_log import RotatingLog
+
+TIMESTAMP_KEY = b'"timestamp": "'
+by_transaction_id = itemgetter(0)
+
+
+def raw_timestamp(line: bytes) -> str:
+    """Timestamp of a JSON-lines record without decoding the whole record"""
+    start = line.find(TIMESTAMP_KEY)
+    if start < 0:
+        return ""
+    start += len(TIMESTAMP_KEY)
+    return line[start:line.find(b'"', start)].decode()
+
+
+def first_timestamp(log: RotatingLog, seq: int) -> str:
+    for (record_seq, _), line in log.iter_raw_with_positions((seq, 0)):
+        return raw_timestamp(line) if record_seq == seq else None
+    return None
+
+
+def window_records(log: RotatingLog, low: str = None, high: str = None):
+    """
+    Records with low <= timestamp < high. Logs are appended in time order,
+    so segments that end before `low` are skipped and reading stops once
+    past `high`.
+    """
+    segments = [seq for seq, _ in log.segments()]
+    start = None
+    if low:
+        for seq, next_seq in zip(segments, segments[1:]):
+            next_first = first_timestamp(log, next_seq)
+            if next_first is None or next_first >= low:
+                break
+            start = (next_seq, 0)
+
+    for _, line in log.iter_raw_with_positions(start):
+        timestamp = raw_timestamp(line)
+        if low and timestamp < low:
+            continue
+        if high and timestamp >= high:
+            break
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def minor_units(amount):
+    try:
+        return int(round(float(amount) * 100))
+    except (TypeError, ValueError):
+        return None
+
+
+def join_rows(records):
+    """(transaction_id, amount_cents, status, timestamp) rows for the sorter"""
+    for record in records:
+        transaction_id = record.get('transaction_id')
+        if transaction_id:
+            yield (transaction_id, minor_units(record.get('amount')), record.get('status') or "",
+                   record.get('timestamp') or "")
+
+
+def _write_run(rows: list, temp_dir: str) -> str:
+    rows.sort(key=by_transaction_id)
+    fd, path = tempfile.mkstemp(suffix=".run", dir=temp_dir)
+    with os.fdopen(fd, "w") as f:
+        for transaction_id, cents, status, timestamp in rows:
+            f.write(f"{transaction_id}\t{'' if cents is None else cents}\t{status}\t{timestamp}\n")
+    return path
+
+
+def _read_run(path: str):
+    with open(path) as f:
+        for line in f:
+            transaction_id, cents, status, timestamp = line.rstrip("\n").split("\t")
+            yield transaction_id, int(cents) if cents else None, status, timestamp
+
+
+def external_sort(rows, chunk_size: int, temp_dir: str):
+    """Sort rows by transaction_id using sorted run files and a k-way merge"""
+    runs = []
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            runs.append(_write_run(chunk, temp_dir))
+            chunk = []
+    if not runs:
+        yield from sorted(chunk, key=by_transaction_id)  # Fits in memory: no run files at all
+        return
+    if chunk:
+        runs.append(_write_run(chunk, temp_dir))
+    try:
+        yield from heapq.merge(*[_read_run(path) for path in runs], key=by_transaction_id)
+    finally:
+        for path in runs:
+            os.remove(path)
+
+
+def merge_join(left, right):
+    """Yield (transaction_id, left_rows, right_rows) for two sorted row streams"""
+    def groups(rows):
+        current, bucket = None, []
+        for row in rows:
+            if row[0] != current and bucket:
+                yield current, bucket
+                bucket = []
+            current = row[0]
+            bucket.append(row)
+        if bucket:
+            yield current, bucket
+
+    left_groups, right_groups = groups(left), groups(right)
+    left_item, right_item = next(left_groups, None), next(right_groups, None)
+    while left_item or right_item:
+        if right_item is None or (left_item and left_item[0] < right_item[0]):
+            yield left_item[0], left_item[1], []
+            left_item = next(left_groups, None)
+        elif left_item is None or right_item[0] < left_item[0]:
+            yield right_item[0], [], right_item[1]
+            right_item = next(right_groups, None)
+        else:
+            yield left_item[0], left_item[1], right_item[1]
+            left_item, right_item = next(left_groups, None), next(right_groups, None)
+
+
+def compare(transaction_id, vendor_rows, bank_rows, in_scope):
+    """Discrepancies for one transaction_id as (kind, details) pairs"""
+    if not any(in_scope(row) for row in vendor_rows + bank_rows):
+        return []
+    issues = []
+    if len(vendor_rows) > 1:
+        issues.append(('duplicate', f"vendor recorded {len(vendor_rows)} times"))
+    if len(bank_rows) > 1:
+        issues.append(('duplicate', f"bank recorded {len(bank_rows)} times"))
+    if not bank_rows:
+        status = vendor_rows[0][2]
+        return issues + [('vendor_only', f"vendor status {status}")]
+    if not vendor_rows:
+        return issues + [('bank_only', f"bank status {bank_rows[0][2]}")]
+
+    _, vendor_cents, vendor_status, _ = vendor_rows[-1]
+    _, bank_cents, bank_status, _ = bank_rows[0]
+    if vendor_cents != bank_cents:
+        issues.append(('amount_mismatch', f"vendor {vendor_cents} / bank {bank_cents} (minor units)"))
+    if vendor_status != bank_status:
+        issues.append(('status_mismatch', f"vendor {vendor_status} / bank {bank_status}"))
+    return issues
+
+
+def reconcile(vendor_log: RotatingLog, bank_log: RotatingLog, since=None, until=None,
+              slack_seconds: float = None, chunk_size: int = None, temp_dir: str = None):
+    """
+    Yield (kind, transaction_id, details, vendor_row, bank_row) for every
+    discrepancy involving a record timestamped in [since, until)
+    """
+    slack = timedelta(seconds=Config.RECONCILE_SLACK_SECONDS if slack_seconds is None
+                      else slack_seconds)
+    chunk_size = chunk_size or Config.RECONCILE_SORT_CHUNK
+
+    # Read a little beyond the window so the other half of an edge transaction is found
+    low = (since - slack).isoformat() if since else None
+    high = (until + slack).isoformat() if until else None
+    since_iso = since.isoformat() if since else ""
+    until_iso = until.isoformat() if until else None
+
+    def in_scope(row):
+        return row[3] >= since_iso and (until_iso is None or row[3] < until_iso)
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as scratch:
+        vendor_sorted = external_sort(join_rows(window_records(vendor_log, low, high)),
+                                      chunk_size, scratch)
+        bank_sorted = external_sort(join_rows(window_records(bank_log, low, high)),
+                                    chunk_size, scratch)
+        for transaction_id, vendor_rows, bank_rows in merge_join(vendor_sorted, bank_sorted):
+            for kind, details in compare(transaction_id, vendor_rows, bank_rows, in_scope):
+                yield (kind, transaction_id, details, vendor_rows[0] if vendor_rows else None,
+                       bank_rows[0] if bank_rows else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile vendor payments against bank transactions")
+    parser.add_argument("--since", help="ISO timestamp (inclusive)")
+    parser.add_argument("--until", help="ISO timestamp (exclusive)")
+    parser.add_argument("--last-hours", type=float, help="shortcut for --since now-N hours")
+    parser.add_argument("--vendor-dir", default=Config.PAYMENT_LOG_DIR)
+    parser.add_argument("--bank-dir", default=Config.HISTORY_DIR)
+    parser.add_argument("--output", help="write every discrepancy to this CSV file")
+    parser.add_argument("--show", type=int, default=20, help="discrepancies to print")
+    args = parser.parse_args()
+
+    since = datetime.fromisoformat(args.since) if args.since else None
+    until = datetime.fromisoformat(args.until) if args.until else None
+    if args.last_hours:
+        since = datetime.now() - timedelta(hours=args.last_hours)
+        # Leave the newest records to the next run: the other side may not have logged them yet
+        until = datetime.now() - timedelta(seconds=Config.RECONCILE_SLACK_SECONDS)
+
+    vendor_log = RotatingLog(args.vendor_dir, "payments", read_only=True)
+    bank_log = RotatingLog(args.bank_dir, "transactions", read_only=True)
+
+    start = time.perf_counter()
+    counts = {}
+    writer = None
+    output = open(args.output, "w", newline="") if args.output else None
+    try:
+        if output:
+            writer = csv.writer(output)
+            writer.writerow(["kind", "transaction_id", "details", "vendor_timestamp", "bank_timestamp"])
+        for kind, transaction_id, details, vendor_row, bank_row in reconcile(vendor_log, bank_log,
+                                                                             since, until):
+            counts[kind] = counts.get(kind, 0) + 1
+            if writer:
+                writer.writerow([kind, transaction_id, details, vendor_row[3] if vendor_row else "",
+                                 bank_row[3] if bank_row else ""])
+            if sum(counts.values()) <= args.show:
+                print(f"⚠️  {kind:<16} {transaction_id}  {details}")
+    finally:
+        if output:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    if counts:
+        summary = ", ".join(f"{kind}: {count}" for kind, count in sorted(counts.items()))
+        print(f"❌ {sum(counts.values())} discrepancies ({summary}) in {elapsed:.1f}s")
+    else:
+        print(f"✅ Vendor and bank records agree ({elapsed:.1f}s)")
+    if args.output:
+        print(f"📄 Report written to {args.output}")
+    raise SystemExit(1 if counts else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Append-only JSON-lines log with size/time based rotation
+Segments are named <name>.<seq>.log; closed segments can be gzip-compressed
+in the background. Readers stream every segment in order. AsyncLogWriter
+moves encoding and writes of a log onto a background thread.
+"""
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+from shared.metrics import metrics
+
+
+class RotatingLog:
+    def __init__(self, directory: str, name: str, max_bytes: int = 64 * 1024 * 1024,
+                 rotate_seconds: float = None, compress: bool = True, read_only: bool = False):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.read_only = read_only  # Readers in other processes never write or compress
+
+        self._pattern = re.compile(rf"^{re.escape(name)}\.(\d+)\.log(\.gz)?$")
+        self._lock = threading.Lock()
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+
+        existing = self._segment_numbers()
+        self.seq = existing[-1] if existing else 1
+        if read_only:
+            return
+        self._open_segment()
+
+        # Finish compressing segments left behind by an earlier process
+        for seq in existing[:-1]:
+            if os.path.exists(self._path(seq)) and self.compress:
+                self._compress_async(seq)
+
+    def _path(self, seq: int, compressed: bool = False) -> str:
+        suffix = ".log.gz" if compressed else ".log"
+        return os.path.join(self.directory, f"{self.name}.{seq:08d}{suffix}")
+
+    def _segment_numbers(self) -> list:
+        numbers = set()
+        for filename in os.listdir(self.directory):
+            match = self._pattern.match(filename)
+            if match:
+                numbers.add(int(match.group(1)))
+        return sorted(numbers)
+
+    def _open_segment(self):
+        path = self._path(self.seq)
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+
+    def _should_rotate(self) -> bool:
+        if self._size >= self.max_bytes:
+            return True
+        if self.rotate_seconds and self._size and time.time() - self._opened_at >= self.rotate_seconds:
+            return True
+        return False
+
+    def _rotate(self):
+        self._file.close()
+        closed = self.seq
+        self.seq += 1
+        self._open_segment()
+        if self.compress:
+            self._compress_async(closed)
+
+    def _compress_async(self, seq: int):
+        threading.Thread(target=self._compress_segment, args=(seq,),
+                         name=f"{self.name}-compress", daemon=True).start()
+
+    def _compress_segment(self, seq: int):
+        source = self._path(seq)
+        target = self._path(seq, compressed=True)
+        temp = target + ".tmp"
+        try:
+            with open(source, "rb") as f_in, gzip.open(temp, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.replace(temp, target)
+            os.remove(source)
+        except OSError as e:
+            print(f"⚠️  Could not compress {source}: {e}")
+
+    def append(self, record: dict):
+        """Append one record - a single buffered write, no rewrite of old data"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        if not data:
+            return
+        if self.read_only:
+            raise IOError(f"{self.name} log was opened read-only")
+        with self._lock:
+            if self._file.closed:
+                self._open_segment()
+            elif self._should_rotate():
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data.encode("utf-8"))
+
+    def flush(self):
+        with self._lock:
+            if not self._file or self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file and not self._file.closed:
+                self._file.close()
+
+    def position(self):
+        """Position after the last record appended by this writer (see iter_with_positions)"""
+        with self._lock:
+            return None if self.read_only else (self.seq, self._size)
+
+    def segments(self) -> list:
+        """(seq, path) for every segment, oldest first"""
+        result = []
+        for seq in self._segment_numbers():
+            plain = self._path(seq)
+            # Prefer the plain file while compression of it is still running
+            result.append((seq, plain if os.path.exists(plain) else self._path(seq, compressed=True)))
+        return result
+
+    def iter_raw_with_positions(self, start=None):
+        """
+        Yield ((seq, offset), line) with the raw JSON bytes of every record
+        after `start`. The position after a record can be stored and passed
+        back as `start` to resume, even if the segment has been compressed since.
+        """
+        start_seq, start_offset = start or (0, 0)
+        for seq, path in self.segments():
+            if seq < start_seq:
+                continue
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                f = opener(path, "rb")
+            except FileNotFoundError:
+                # Compressed between listing and opening
+                f = gzip.open(self._path(seq, compressed=True), "rb")
+            with f:
+                offset = 0
+                if seq == start_seq and start_offset:
+                    f.seek(start_offset)
+                    offset = start_offset
+                for line in f:
+                    offset += len(line)
+                    if not line.endswith(b"\n"):
+                        break  # Record still being written
+                    yield (seq, offset), line
+
+    def iter_with_positions(self, start=None):
+        """Yield ((seq, offset), record) for every record after `start`"""
+        for position, line in self.iter_raw_with_positions(start):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            yield position, record
+
+    def iter_records(self, start=None):
+        """Stream every record, oldest first"""
+        for _, record in self.iter_with_positions(start):
+            yield record
+
+
+_CLOSE = object()
+
+
+class AsyncLogWriter:
+    """
+    Appends records to a RotatingLog from a background thread, so callers
+    only pay for a queue put. The writer takes everything that queued up
+    while it was writing the previous batch and writes it as one batch
+    (one encode, one write and one flush). When the queue is full, append()
+    waits: records are never dropped.
+    """
+
+    def __init__(self, log: RotatingLog, queue_size: int = 100_000, batch_size: int = 1000):
+        self.log = log
+        self.batch_size = batch_size
+        self.queue = queue.Queue(queue_size)
+        self.failures = 0
+
+        labels = {'log': log.name}
+        self.written = metrics.counter('log_writer_records_total', labels)
+        self.waits = metrics.counter('log_writer_full_waits_total', labels)
+        self.batch_latency = metrics.histogram('log_writer_batch_us', labels)
+        metrics.gauge('log_writer_queue_depth', labels).set_function(self.queue.qsize)
+
+        self._thread = threading.Thread(target=self._run, name=f"{log.name}-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, record: dict):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.waits.inc()
+            self.queue.put(record)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not _CLOSE]
+            closing = len(records) < len(batch)
+            try:
+                with self.batch_latency.time():
+                    self.log.append_many(records)
+                self.written.inc(len(records))
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ {self.log.name} log write failed ({len(records)} records): {e}")
+            for _ in batch:
+                self.queue.task_done()
+            if closing:
+                return
+
+    def flush(self):
+        """Wait until every record appended so far is written, then fsync"""
+        self.queue.join()
+        self.log.flush()
+
+    def close(self):
+        """Write what is queued and close the log"""
+        if self._thread.is_alive():
+            self.queue.put(_CLOSE)
+            self._thread.join()
+        self.log.close()
@@ -0,0 +1,138 @@
+"""
+Trace viewer for SecurePay span traces
+Turns traces/*.jsonl into a per-stage summary, a text waterfall,
+folded stacks (flamegraph.pl / speedscope) or Chrome trace JSON (Perfetto)
+
+Usage:
+    python -m shared.trace_viewer traces/bank.jsonl traces/vendor.jsonl --summary
+    python -m shared.trace_viewer traces/*.jsonl --waterfall <transaction_id>
+    python -m shared.trace_viewer traces/*.jsonl --folded > stacks.folded
+    python -m shared.trace_viewer traces/*.jsonl --chrome trace.json
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+
+def load_traces(paths):
+    """Yield trace records from one or more JSON-lines files"""
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partially written last line
+
+
+def summary(traces) -> str:
+    """Per service/stage count, mean and p50/p99 (microseconds)"""
+    stages = defaultdict(list)
+    for trace in traces:
+        for span in trace['spans']:
+            stages[(trace['service'], span['path'])].append(span['duration_us'])
+
+    lines = [f"{'service':<8} {'stage':<50} {'count':>7} {'mean':>9} {'p50':>9} {'p99':>9}"]
+    for (service, path), values in sorted(stages.items()):
+        values.sort()
+        count = len(values)
+        p50 = values[min(count - 1, int(count * 0.50))]
+        p99 = values[min(count - 1, int(count * 0.99))]
+        mean = sum(values) / count
+        lines.append(f"{service:<8} {path:<50} {count:>7} {mean:>9.0f} {p50:>9} {p99:>9}")
+    return "\n".join(lines)
+
+
+def waterfall(traces, transaction_id: str, width: int = 60) -> str:
+    """Text waterfall of every service's spans for one transaction"""
+    selected = [t for t in traces if t['transaction_id'] == transaction_id]
+    if not selected:
+        return f"No trace found for {transaction_id}"
+
+    origin = min(t['timestamp'] for t in selected)
+    rows = []
+    for trace in selected:
+        offset = int((trace['timestamp'] - origin) * 1e6)
+        for span in trace['spans']:
+            rows.append((offset + span['start_us'], span['duration_us'],
+                         trace['service'], span['path']))
+    rows.sort()
+
+    total = max(start + duration for start, duration, _, _ in rows) or 1
+    lines = [f"Transaction {transaction_id} - {total} µs total"]
+    for start, duration, service, path in rows:
+        depth = path.count(";")
+        name = "  " * depth + path.rsplit(";", 1)[-1]
+        begin = int(start * width / total)
+        length = max(1, int(duration * width / total))
+        bar = " " * begin + "█" * length
+        lines.append(f"{service:<7} {name:<30} {duration:>9} µs |{bar:<{width}}|")
+    return "\n".join(lines)
+
+
+def folded(traces) -> str:
+    """Folded stacks weighted by self time, for flamegraph.pl or speedscope"""
+    self_time = defaultdict(int)
+    for trace in traces:
+        children = defaultdict(int)
+        for span in trace['spans']:
+            if ";" in span['path']:
+                children[span['path'].rsplit(";", 1)[0]] += span['duration_us']
+        for span in trace['spans']:
+            own = span['duration_us'] - children.get(span['path'], 0)
+            self_time[f"{trace['service']};{span['path']}"] += max(0, own)
+    return "\n".join(f"{stack} {value}" for stack, value in sorted(self_time.items()))
+
+
+def chrome_trace(traces) -> dict:
+    """Chrome trace event format (open in chrome://tracing or ui.perfetto.dev)"""
+    events = []
+    pids = {}
+    for trace in traces:
+        pid = pids.setdefault(trace['service'], len(pids) + 1)
+        base = trace['timestamp'] * 1e6
+        for span in trace['spans']:
+            events.append({
+                'name': span['name'],
+                'cat': trace['service'],
+                'ph': 'X',
+                'ts': base + span['start_us'],
+                'dur': span['duration_us'],
+                'pid': pid,
+                'tid': trace['transaction_id'],
+                'args': {'transaction_id': trace['transaction_id'], 'path': span['path']}
+            })
+    for service, pid in pids.items():
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid,
+                       'args': {'name': service}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="View SecurePay span traces")
+    parser.add_argument("files", nargs="+", help="trace files (JSON lines)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--summary", action="store_true", help="per-stage latency table (default)")
+    group.add_argument("--waterfall", metavar="TRANSACTION_ID", help="waterfall for one transaction")
+    group.add_argument("--folded", action="store_true", help="folded stacks for flame graphs")
+    group.add_argument("--chrome", metavar="OUTPUT", help="write Chrome trace JSON to OUTPUT")
+    args = parser.parse_args()
+
+    traces = list(load_traces(args.files))
+    if args.waterfall:
+        print(waterfall(traces, args.waterfall))
+    elif args.folded:
+        print(folded(traces))
+    elif args.chrome:
+        with open(args.chrome, "w") as f:
+            json.dump(chrome_trace(traces), f)
+        print(f"✅ Wrote {len(traces)} traces to {args.chrome}")
+    else:
+        print(summary(traces))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
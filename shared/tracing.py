@@ -0,0 +1,168 @@
+"""
+Per-transaction span tracing for the authorization pipeline
+Traces are written as JSON lines; see shared/trace_viewer.py for views
+"""
+import json
+import os
+import threading
+import time
+import zlib
+
+
+class _NoopSpan:
+    """Returned when tracing is off - entering/exiting costs almost nothing"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.trace.stack.append(self.name)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        trace = self.trace
+        trace.stack.pop()
+        trace.add_span(self.name, self.start, end, error=exc_type is not None)
+        return False
+
+
+class Trace:
+    """Spans recorded for one transaction in one service"""
+
+    def __init__(self, service: str, transaction_id: str = None, start_ns: int = None):
+        self.service = service
+        self.transaction_id = transaction_id
+        self.start = start_ns or time.perf_counter_ns()
+        self.wall_start = time.time() - (time.perf_counter_ns() - self.start) / 1e9
+        self.stack = []
+        self.spans = []
+
+    def span(self, name: str) -> _Span:
+        return _Span(self, name)
+
+    def add_span(self, name: str, start_ns: int, end_ns: int, error: bool = False):
+        """Record a span measured elsewhere (e.g. before the trace existed)"""
+        self.spans.append({
+            'name': name,
+            'path': ";".join(self.stack + [name]),
+            'start_us': (start_ns - self.start) // 1000,
+            'duration_us': (end_ns - start_ns) // 1000,
+            'error': error
+        })
+
+    def to_dict(self) -> dict:
+        return {
+            'transaction_id': self.transaction_id,
+            'service': self.service,
+            'timestamp': self.wall_start,
+            'duration_us': (time.perf_counter_ns() - self.start) // 1000,
+            'spans': self.spans
+        }
+
+
+class Tracer:
+    """
+    Process-wide tracer. Disabled by default; when enabled, a deterministic
+    hash of the transaction id decides sampling so the vendor and the bank
+    keep traces for the same transactions.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.service = "securepay"
+        self.trace_file = None
+        self._file = None
+        self._file_lock = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, service: str, enabled: bool = True, sample_rate: float = 1.0,
+                  trace_dir: str = "traces"):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.trace_file = os.path.join(trace_dir, f"{service}.jsonl")
+        if enabled:
+            os.makedirs(trace_dir, exist_ok=True)
+        self.enabled = enabled
+
+    def is_sampled(self, transaction_id: str) -> bool:
+        if self.sample_rate >= 1.0:
+            return True
+        bucket = zlib.crc32(str(transaction_id).encode()) / 4294967296.0
+        return bucket < self.sample_rate
+
+    @property
+    def current(self):
+        return getattr(self._local, 'trace', None)
+
+    def start_trace(self, transaction_id: str = None, start_ns: int = None):
+        """
+        Begin a trace on this thread. The id may be filled in later (the bank
+        only learns it after decryption); sampling is decided at finish.
+        start_ns backdates the trace to include work done before it began.
+        """
+        if not self.enabled:
+            return None
+        if transaction_id is not None and not self.is_sampled(transaction_id):
+            return None
+        trace = Trace(self.service, transaction_id, start_ns)
+        self._local.trace = trace
+        return trace
+
+    def span(self, name: str):
+        """Time a stage of the current trace: `with tracer.span('decrypt'):`"""
+        if not self.enabled:
+            return NOOP_SPAN
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return NOOP_SPAN
+        return _Span(trace, name)
+
+    def set_transaction_id(self, transaction_id: str):
+        trace = self.current
+        if trace is not None:
+            trace.transaction_id = transaction_id
+
+    def finish_trace(self):
+        """Detach the current trace and write it if sampled"""
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return
+        self._local.trace = None
+        if trace.transaction_id is None or not self.is_sampled(trace.transaction_id):
+            return
+        self._write(trace.to_dict())
+
+    def _write(self, record: dict):
+        line = json.dumps(record) + "\n"
+        with self._file_lock:
+            if self._file is None:
+                self._file = open(self.trace_file, "a", buffering=1)
+            self._file.write(line)
+
+    def close(self):
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Process-wide tracer
+tracer = Tracer()